@@ -1,26 +1,83 @@
+import wave
 import numpy as np
 import pyaudio
 from scipy.signal import find_peaks, butter, filtfilt, iirnotch
 
+
+class WavStream:
+    """
+    Stand-in for a PyAudio input stream that plays back a WAV file.
+
+    Samples are converted to mono float32 once on load, so reads return the
+    same bytes a live paFloat32 stream would.
+    """
+
+    def __init__(self, path, loop=True):
+        with wave.open(str(path), "rb") as wav:
+            self.sample_rate = wav.getframerate()
+            channels = wav.getnchannels()
+            width = wav.getsampwidth()
+            raw = wav.readframes(wav.getnframes())
+
+        if width == 1:
+            samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+        elif width == 2:
+            samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+        elif width == 4:
+            samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+        else:
+            raise ValueError(f"Unsupported WAV sample width: {width} bytes")
+
+        self.samples = samples.reshape(-1, channels).mean(axis=1).astype(np.float32)
+        self.loop = loop
+        self.position = 0
+
+    def chunks(self, chunk_size):
+        """Yield consecutive full chunks of samples, ignoring the trailing remainder."""
+        for start in range(0, len(self.samples) - chunk_size + 1, chunk_size):
+            yield self.samples[start:start + chunk_size]
+
+    def read(self, num_frames, exception_on_overflow=False):
+        end = self.position + num_frames
+        if end > len(self.samples):
+            if not self.loop or num_frames > len(self.samples):
+                raise EOFError("End of WAV stream")
+            self.position, end = 0, num_frames
+        data = self.samples[self.position:end]
+        self.position = end
+        return data.tobytes()
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
 class AudioFrequencyDetector:
-    def __init__(self, sample_rate=44100, chunk_size=4096, display_range=(20, 2000), smoothing_factor=0.3):
+    def __init__(self, sample_rate=44100, chunk_size=4096, display_range=(20, 2000), smoothing_factor=0.3, stream=None):
         """
         Initialize the audio frequency detector.
+
+        Reads from the default microphone unless `stream` is given (e.g. a WavStream).
         """
-        self.sample_rate = sample_rate
+        self.sample_rate = getattr(stream, "sample_rate", sample_rate)
         self.chunk_size = chunk_size
         self.min_freq, self.max_freq = display_range
         self.smoothing_factor = smoothing_factor
 
-        # Initialize PyAudio
-        self.p = pyaudio.PyAudio()
-        self.stream = self.p.open(
-            format=pyaudio.paFloat32,
-            channels=1,
-            rate=self.sample_rate,
-            input=True,
-            frames_per_buffer=self.chunk_size
-        )
+        if stream is not None:
+            self.stream = stream
+        else:
+            # Initialize PyAudio
+            self.p = pyaudio.PyAudio()
+            self.stream = self.p.open(
+                format=pyaudio.paFloat32,
+                channels=1,
+                rate=self.sample_rate,
+                input=True,
+                frames_per_buffer=self.chunk_size
+            )
 
         # Frequency bins for FFT
         self.freq_bins = np.fft.rfftfreq(self.chunk_size, 1.0/self.sample_rate)
@@ -32,6 +89,9 @@ class AudioFrequencyDetector:
         # Smoothing buffer
         self.spectrum_buffer = None
 
+        # Newest chunk_size samples, for hops shorter than the analysis window
+        self.window = np.zeros(self.chunk_size, dtype=np.float32)
+
     def _apply_window(self, data):
         """Apply Hann window to reduce spectral leakage."""
         return data * np.hanning(len(data))
@@ -61,11 +121,32 @@ class AudioFrequencyDetector:
         peaks = [p for p in peaks if self.min_idx <= p <= self.max_idx]
         return peaks, norm_spectrum
 
+    def read_chunk(self):
+        """Read one chunk of samples from the audio input."""
+        return np.frombuffer(self.stream.read(self.chunk_size, exception_on_overflow=False), dtype=np.float32)
+
+    def read_hop(self, hop):
+        """
+        Read `hop` seconds of new samples and return the analysis window, the newest chunk_size of them.
+
+        Blocks for about `hop` seconds on a live stream. Hops longer than
+        the window leave the samples in between unanalysed, shorter ones
+        overlap consecutive windows.
+        """
+        frames = max(1, int(round(hop * self.sample_rate)))
+        samples = np.frombuffer(self.stream.read(frames, exception_on_overflow=False), dtype=np.float32)
+        if len(samples) >= self.chunk_size:
+            self.window = samples[-self.chunk_size:]
+        else:
+            self.window = np.concatenate((self.window[len(samples):], samples))
+        return self.window
+
     def get_frequency(self):
         """Detect and return the dominant frequency from the current audio input."""
-        # Read audio data
-        data = np.frombuffer(self.stream.read(self.chunk_size, exception_on_overflow=False), dtype=np.float32)
+        return self.analyze(self.read_chunk())
 
+    def analyze(self, data):
+        """Return the dominant frequency in a chunk of samples, or None."""
         # Apply preprocessing
         data = self._apply_window(data)
         data = self._noise_filter(data)
@@ -0,0 +1,246 @@
+import asyncio
+import datetime
+import json
+import platform
+import subprocess
+import time
+from pathlib import Path
+
+import cv2
+import psutil
+
+from .audio import AudioFrequencyDetector, WavStream
+from .bof import DATASET_PATH, load_bof_events
+from .pipeline import SensorPipeline
+from .main2 import detect_frame
+from .metrics import summarize_latencies
+
+
+class CapturedEmit:
+    """Stands in for the WebSocket: counts what the pipeline would have sent."""
+
+    def __init__(self):
+        self.sent_messages = 0
+        self.sent_bytes = 0
+
+    async def __call__(self, text):
+        self.sent_messages += 1
+        self.sent_bytes += len(text)
+
+
+class PipelineBenchmark:
+    """
+    Drive recorded media through the real detection, audio, BOF, scoring and
+    alert path as fast as possible, without cameras, microphones or network.
+
+    Sensor inputs are interleaved on a media clock: each video frame advances
+    time by 1/fps, audio chunks and BOF events whose media time has passed are
+    processed before the next assessment, just as the live tasks would.
+    Detection-to-alert latency is taken for sent alerts only, from the start
+    of the earliest detection since the previous assessment.
+    """
+
+    def __init__(self, videos=(), wavs=(), bof_csv=DATASET_PATH, bof_interval=40.0,
+                 max_frames=None, evaluate_every=1, cooldowns=True, sample_every=50):
+        self.videos = [Path(v) for v in videos]
+        self.wavs = [Path(w) for w in wavs]
+        self.bof_csv = Path(bof_csv) if bof_csv else None
+        self.bof_interval = bof_interval
+        self.max_frames = max_frames
+        self.evaluate_every = max(1, evaluate_every)
+        self.cooldowns = cooldowns
+        self.sample_every = sample_every
+
+        self.process = psutil.Process()
+        self.stage_times = {"capture": [], "inference": [], "audio_dsp": [], "evaluate": []}
+        self.detection_to_alert = []
+        self.counts = {"frames": 0, "audio_chunks": 0, "bof_events": 0, "assessments": 0, "alerts_sent": 0}
+        self.peak_rss = 0
+
+    def _sample_memory(self):
+        self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+    def _audio_chunks(self):
+        # Yields (media_time, detector, samples) across all WAV files back to back
+        media_time = 0.0
+        for path in self.wavs:
+            stream = WavStream(path, loop=False)
+            detector = AudioFrequencyDetector(stream=stream)
+            step = detector.chunk_size / detector.sample_rate
+            for chunk in stream.chunks(detector.chunk_size):
+                media_time += step
+                yield media_time, detector, chunk
+
+    def _frames(self):
+        # Yields (media_time, capture_seconds, frame) across all video files back to back
+        media_time = 0.0
+        for path in self.videos:
+            cap = cv2.VideoCapture(str(path))
+            if not cap.isOpened():
+                raise FileNotFoundError(f"Cannot open video {path}")
+            step = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+            try:
+                while True:
+                    start = time.perf_counter()
+                    ret, frame = cap.read()
+                    elapsed = time.perf_counter() - start
+                    if not ret:
+                        break
+                    media_time += step
+                    yield media_time, elapsed, frame
+            finally:
+                cap.release()
+
+    async def _run(self):
+        self.emitted = CapturedEmit()
+        pipeline = SensorPipeline(self.emitted)
+        if not self.cooldowns:
+            pipeline.threat_cooldown = pipeline.high_threat_cooldown = -1
+
+        bof_events = load_bof_events(self.bof_csv) if self.bof_csv else []
+        audio = self._audio_chunks()
+        pending_audio = next(audio, None)
+        next_bof = 0.0
+        bof_index = 0
+
+        def advance_sensors(until):
+            nonlocal pending_audio, next_bof, bof_index
+            while pending_audio is not None and pending_audio[0] <= until:
+                chunk_time, detector, chunk = pending_audio
+                start = time.perf_counter()
+                frequency = detector.analyze(chunk)
+                self.stage_times["audio_dsp"].append(time.perf_counter() - start)
+                self.counts["audio_chunks"] += 1
+                if frequency is not None and frequency > 0:
+                    pipeline.update_audio(frequency, at=chunk_time)
+                pending_audio = next(audio, None)
+            while bof_events and next_bof <= until:
+                pipeline.update_bof(dict(bof_events[bof_index % len(bof_events)]), at=next_bof)
+                bof_index += 1
+                self.counts["bof_events"] += 1
+                next_bof += self.bof_interval
+
+        async def assess(detected_at, media_time):
+            start = time.perf_counter()
+            _, sent = await pipeline.evaluate_once(upload=False, now=media_time)
+            end = time.perf_counter()
+            self.stage_times["evaluate"].append(end - start)
+            self.counts["assessments"] += 1
+            if sent:
+                self.counts["alerts_sent"] += 1
+                if detected_at is not None:
+                    self.detection_to_alert.append(end - detected_at)
+
+        iterations = 0
+        if self.videos:
+            # Start of the first detection since the last assessment. Every frame since then feeds the
+            # assessment, and an alert may be for a threat that first showed up in that one.
+            unassessed_at = None
+            for media_time, capture_seconds, frame in self._frames():
+                self.stage_times["capture"].append(capture_seconds)
+                detected_at = time.perf_counter()
+                result = detect_frame(frame)
+                self.stage_times["inference"].append(time.perf_counter() - detected_at)
+                self.counts["frames"] += 1
+                if result:
+                    pipeline.update_detection(result, frame, at=media_time)
+                    if unassessed_at is None:
+                        unassessed_at = detected_at
+
+                advance_sensors(media_time)
+                if self.counts["frames"] % self.evaluate_every == 0:
+                    await assess(unassessed_at, media_time)
+                    unassessed_at = None
+
+                iterations += 1
+                if iterations % self.sample_every == 0:
+                    self._sample_memory()
+                if self.max_frames and self.counts["frames"] >= self.max_frames:
+                    break
+        else:
+            # Audio/BOF only: assess once per audio chunk
+            while pending_audio is not None:
+                media_time = pending_audio[0]
+                advance_sensors(media_time)
+                await assess(None, media_time)
+                iterations += 1
+                if iterations % self.sample_every == 0:
+                    self._sample_memory()
+
+    def run(self):
+        """Run the benchmark and return the results as a JSON-serialisable dict."""
+        self._sample_memory()
+        cpu_before = self.process.cpu_times()
+        wall_start = time.perf_counter()
+
+        asyncio.run(self._run())
+
+        wall = time.perf_counter() - wall_start
+        cpu_after = self.process.cpu_times()
+        self._sample_memory()
+        cpu_seconds = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+
+        return {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "inputs": {
+                "videos": [str(v) for v in self.videos],
+                "wavs": [str(w) for w in self.wavs],
+                "bof_csv": str(self.bof_csv) if self.bof_csv else None,
+                "evaluate_every": self.evaluate_every,
+                "cooldowns": self.cooldowns,
+            },
+            "counts": dict(self.counts, bytes_sent=self.emitted.sent_bytes),
+            "wall_seconds": round(wall, 3),
+            "throughput": {
+                "frames_per_second": round(self.counts["frames"] / wall, 2) if wall else None,
+                "audio_chunks_per_second": round(self.counts["audio_chunks"] / wall, 2) if wall else None,
+                "assessments_per_second": round(self.counts["assessments"] / wall, 2) if wall else None,
+            },
+            "latency_ms": {
+                "detection_to_alert": summarize_latencies(self.detection_to_alert),
+                **{stage: summarize_latencies(samples) for stage, samples in self.stage_times.items()},
+            },
+            "cpu": {
+                "seconds": round(cpu_seconds, 3),
+                "percent": round(100 * cpu_seconds / wall, 1) if wall else None,
+            },
+            "memory": {"peak_rss_bytes": self.peak_rss},
+        }
+
+
+def compare(current, baseline):
+    """Return relative changes of the headline numbers between two result dicts."""
+    def ratio(new, old):
+        if not old or new is None:
+            return None
+        return round((new - old) / old * 100, 1)
+
+    changes = {}
+    for key, value in current["throughput"].items():
+        changes[f"throughput.{key}"] = ratio(value, baseline["throughput"].get(key))
+    for stage, stats in current["latency_ms"].items():
+        old = baseline["latency_ms"].get(stage, {})
+        for pct in ("p50", "p95", "p99"):
+            if pct in stats:
+                changes[f"latency_ms.{stage}.{pct}"] = ratio(stats[pct], old.get(pct))
+    changes["cpu.percent"] = ratio(current["cpu"]["percent"], baseline["cpu"].get("percent"))
+    changes["memory.peak_rss_bytes"] = ratio(current["memory"]["peak_rss_bytes"], baseline["memory"].get("peak_rss_bytes"))
+    return {key: value for key, value in changes.items() if value is not None}
+
+
+def write_results(results, output):
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    return output
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).resolve().parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -1,18 +1,25 @@
 import asyncio
+import functools
 import random
+from pathlib import Path
 import pandas as pd
 
+DATASET_PATH = Path(__file__).resolve().parent / "BOF_DAS_Dataset.csv"
+
+@functools.lru_cache(maxsize=None)
+def load_bof_events(file_path=DATASET_PATH):
+    """Load the BOF dataset once and keep its rows as plain dicts."""
+    return pd.read_csv(file_path).to_dict("records")
+
+def sample_bof_event(file_path=DATASET_PATH):
+    """Pick a random BOF event from the dataset."""
+    return dict(random.choice(load_bof_events(file_path)))
+
 # Asynchronous version of BOF simulation
 async def simulate_bof_response():
-    # Load the dataset (consider loading this once and storing it)
-    file_path = "Channel/BOF_DAS_Dataset.csv"
-    df = pd.read_csv(file_path)
-    
     # Random delay between 10 to 50 seconds
     delay = random.randint(10, 50)
     await asyncio.sleep(50)  # Non-blocking sleep
     
     # Randomly select a row
-    random_row = df.sample(n=1).iloc[0]
-    
-    return random_row.to_dict()
\ No newline at end of file
+    return sample_bof_event()
\ No newline at end of file
@@ -0,0 +1,478 @@
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAX_CLASSES = 128
+MAX_BOXES = 16
+
+# Record flags
+CROWDED = 1
+FIRE = 2
+SMOKE = 4
+
+# One frame's detections, 288 bytes
+RECORD = np.dtype([
+    ("t", "<f8"),                            # capture time, epoch seconds
+    ("seq", "<u4"),                          # frame number within the pipeline run
+    ("persons", "<u2"),
+    ("flags", "u1"),
+    ("n_boxes", "u1"),                       # person boxes stored, at most MAX_BOXES
+    ("fire_ratio", "<f4"),
+    ("audio_hz", "<f4"),                     # dominant audio frequency at the time, NaN if none
+    ("zones", "<u8"),                        # bit i: zone i of meta.json was breached
+    ("counts", "u1", (MAX_CLASSES,)),        # per class id of meta.json, saturating at 255
+    ("boxes", "<u2", (MAX_BOXES, 4)),        # person boxes, xyxy pixels
+])
+
+# One entry per completed block of records: where it starts and which classes occur in it
+INDEX = np.dtype([
+    ("t", "<f8"),
+    ("offset", "<u8"),
+    ("count", "<u4"),
+    ("classes", "<u8", (MAX_CLASSES // 64,)),
+])
+
+
+def segment_name(t):
+    """Segments hold one UTC hour each."""
+    return datetime.datetime.fromtimestamp(t, datetime.timezone.utc).strftime("%Y%m%d-%H")
+
+
+def segment_start(name):
+    return datetime.datetime.strptime(name, "%Y%m%d-%H").replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+class LogMeta:
+    """Class and zone names of one camera's log, numbered in order of first appearance."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        data = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self.classes = data.get("classes", [])
+        self.zones = data.get("zones", [])
+        self._class_ids = {name: i for i, name in enumerate(self.classes)}
+        self._zone_ids = {name: i for i, name in enumerate(self.zones)}
+        self.dirty = False
+
+    def _add(self, names, ids, name, limit):
+        if len(names) >= limit:
+            return None
+        ids[name] = len(names)
+        names.append(name)
+        self.dirty = True
+        return ids[name]
+
+    def snapshot(self):
+        """The names to save if any were added since the last snapshot, else None."""
+        if not self.dirty:
+            return None
+        self.dirty = False
+        return {"classes": list(self.classes), "zones": list(self.zones)}
+
+    def save(self, snapshot):
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(snapshot))
+        os.replace(tmp, self.path)
+
+    def class_id(self, name):
+        class_id = self._class_ids.get(name)
+        return class_id if class_id is not None else self._add(self.classes, self._class_ids, name, MAX_CLASSES)
+
+    def zone_id(self, name):
+        zone_id = self._zone_ids.get(name)
+        return zone_id if zone_id is not None else self._add(self.zones, self._zone_ids, name, 64)
+
+
+class DetectionLog:
+    """
+    Append-only log of every frame's detections for one camera.
+
+    Each frame becomes one fixed-size RECORD, appended to the segment file of
+    its UTC hour (<camera dir>/<YYYYMMDD-HH>.rec), so a segment is simply a
+    NumPy structured array on disk. Every `block` records an INDEX entry is
+    appended to the segment's .idx file. It holds the block's first time and
+    offset, plus a bitmask of the classes seen in it, so readers can skip
+    blocks by time or class without touching their records.
+
+    `append` only fills an in-memory buffer, so it is safe to call on the
+    event loop. A writer thread flushes the buffer, and any new class or zone
+    names, every `flush_every` seconds, which bounds what a crash can lose.
+    On each new hour, segments older than `retention_hours` are deleted.
+    """
+
+    def __init__(self, directory, camera_id, block=256, flush_every=1.0, retention_hours=168):
+        self.directory = Path(directory) / str(camera_id)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.camera_id = str(camera_id)
+        self.block = block
+        self.flush_every = flush_every
+        self.retention_hours = retention_hours
+        self.meta = LogMeta(self.directory / "meta.json")
+
+        self._buffer = np.zeros(256, dtype=RECORD)
+        self._pending = 0
+        self._full = []  # Filled buffers waiting for the writer
+        self._lock = threading.Lock()  # Buffers and meta, shared with the caller
+        self._write_lock = threading.Lock()  # Segment files
+        self._closed = threading.Event()
+        self._segment = None
+        self._records = None
+        self._index = None
+        self._count = 0
+        self._block_classes = np.zeros(MAX_CLASSES // 64, dtype=np.uint64)
+        self._block_start = None
+        self._last_t = -np.inf
+        self._writer = threading.Thread(target=self._run, name=f"detlog-{self.camera_id}", daemon=True)
+        self._writer.start()
+
+    def append(self, t, result, boxes=None, frequency=None, seq=0):
+        """Add one frame's detection result (as returned by detect_frame) captured at `t`."""
+        with self._lock:
+            if t < self._last_t:
+                return  # Out of order, segments and index stay sorted by time
+            self._last_t = t
+            if self._pending == len(self._buffer):
+                self._full.append(self._buffer)
+                self._buffer = np.zeros_like(self._buffer)
+                self._pending = 0
+            self._fill(self._buffer[self._pending], t, result, boxes, frequency, seq)
+            self._pending += 1
+
+    def _fill(self, record, t, result, boxes, frequency, seq):
+        record["t"] = t
+        record["seq"] = seq
+        record["persons"] = min(int(result.get("total persons", 0)), 65535)
+        record["flags"] = ((CROWDED if result.get("is crowded") else 0) | (FIRE if result.get("is fire") else 0)
+                           | (SMOKE if result.get("is smoke") else 0))
+        record["fire_ratio"] = result.get("fire ratio", 0.0)
+        record["audio_hz"] = frequency if frequency else np.nan
+        counts = record["counts"]
+        counts[:] = 0
+        for name, count in (result.get("detected objects") or {}).items():
+            class_id = self.meta.class_id(name)
+            if class_id is not None:
+                counts[class_id] = min(count, 255)
+        zones = 0
+        for zone in result.get("zone breaches") or {}:
+            zone_id = self.meta.zone_id(str(zone))
+            if zone_id is not None:
+                zones |= 1 << zone_id
+        record["zones"] = zones
+        n = 0
+        if boxes is not None and len(boxes):
+            boxes = np.asarray(boxes)[:MAX_BOXES]
+            n = len(boxes)
+            record["boxes"][:n] = np.clip(boxes, 0, 65535)
+        record["boxes"][n:] = 0
+        record["n_boxes"] = n
+
+    def _run(self):
+        while not self._closed.wait(self.flush_every):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Detection log flush failed", extra={"camera": self.camera_id})
+
+    def _open(self, name):
+        self._close_files()
+        self._segment = name
+        path = self.directory / f"{name}.rec"
+        index_path = self.directory / f"{name}.idx"
+        self._records = open(path, "ab")
+        self._index = open(index_path, "ab")
+        # Resume a segment written before a restart, dropping torn last entries
+        size = path.stat().st_size
+        self._count = size // RECORD.itemsize
+        if size % RECORD.itemsize:
+            self._records.truncate(self._count * RECORD.itemsize)
+        index_size = index_path.stat().st_size
+        if index_size % INDEX.itemsize:
+            self._index.truncate(index_size - index_size % INDEX.itemsize)
+        self._block_classes[:] = 0
+        self._block_start = None
+        # Records after the last indexed block continue as the current block
+        indexed = 0
+        if index_size >= INDEX.itemsize:
+            last = np.fromfile(index_path, dtype=INDEX, count=1, offset=(index_size // INDEX.itemsize - 1) * INDEX.itemsize)[0]
+            indexed = min(int(last["offset"]) + int(last["count"]), self._count)
+        if indexed < self._count:
+            tail = np.fromfile(path, dtype=RECORD, count=self._count - indexed, offset=indexed * RECORD.itemsize)
+            self._block_start = (float(tail["t"][0]), indexed)
+            self._add_classes(tail)
+        self._prune()
+
+    def flush(self):
+        """Write buffered records and new names to disk."""
+        with self._lock:
+            chunks = self._full
+            if self._pending:
+                chunks.append(self._buffer[:self._pending].copy())
+            self._full = []
+            self._pending = 0
+            meta = self.meta.snapshot()
+        with self._write_lock:
+            # Names first, so readers never see a class id they cannot resolve
+            if meta is not None:
+                self.meta.save(meta)
+            for records in chunks:
+                hours = (records["t"] // 3600).astype(np.int64)
+                bounds = np.concatenate(([0], np.flatnonzero(np.diff(hours)) + 1, [len(records)]))
+                for start, end in zip(bounds[:-1], bounds[1:]):
+                    name = segment_name(records["t"][start])
+                    if name != self._segment:
+                        self._open(name)
+                    self._write(records[start:end])
+            for handle in (self._records, self._index):
+                if handle is not None:
+                    handle.flush()
+
+    def _add_classes(self, records):
+        # 128 class presence bits as two words, bit i of word w is class 64 * w + i
+        present = (records["counts"] > 0).any(axis=0)
+        self._block_classes |= np.packbits(present, bitorder="little").view("<u8")
+
+    def _write(self, records):
+        self._records.write(records.tobytes())
+        start = 0
+        while start < len(records):
+            if self._block_start is None:
+                self._block_start = (float(records["t"][start]), self._count)
+            end = min(len(records), start + self.block - (self._count - self._block_start[1]))
+            self._add_classes(records[start:end])
+            self._count += end - start
+            start = end
+            if self._count - self._block_start[1] >= self.block:
+                self._end_block()
+
+    def _end_block(self):
+        entry = np.zeros(1, dtype=INDEX)
+        entry["t"], entry["offset"] = self._block_start
+        entry["count"] = self._count - self._block_start[1]
+        entry["classes"] = self._block_classes
+        self._index.write(entry.tobytes())
+        self._block_classes[:] = 0
+        self._block_start = None
+
+    def _prune(self):
+        if not self.retention_hours:
+            return
+        cutoff = time.time() - self.retention_hours * 3600
+        for path in self.directory.glob("*.rec"):
+            try:
+                expired = segment_start(path.stem) + 3600 < cutoff
+            except ValueError:
+                continue
+            if expired:
+                path.unlink(missing_ok=True)
+                path.with_suffix(".idx").unlink(missing_ok=True)
+
+    def _close_files(self):
+        for handle in (self._records, self._index):
+            if handle is not None:
+                handle.close()
+        self._records = self._index = None
+
+    def close(self):
+        """Stop the writer, write what is left and close the segment."""
+        self._closed.set()
+        self._writer.join()
+        self.flush()
+        with self._write_lock:
+            self._close_files()
+
+
+class DetectionLogReader:
+    """
+    Query one camera's detection log by time range and class.
+
+    Segments are opened as read-only memory maps and only the records of
+    index blocks overlapping the range, and containing one of the classes if
+    any are given, are read. Records still in a segment's last, unindexed
+    block are scanned directly. Safe to use while the log is being written.
+    """
+
+    def __init__(self, directory, camera_id):
+        self.directory = Path(directory) / str(camera_id)
+        self.camera_id = str(camera_id)
+        self.meta = LogMeta(self.directory / "meta.json")
+
+    def segments(self, start, end):
+        """Segment paths overlapping [start, end), oldest first."""
+        paths = []
+        for path in sorted(self.directory.glob("*.rec")):
+            try:
+                first = segment_start(path.stem)
+            except ValueError:
+                continue
+            if first < end and first + 3600 > start:
+                paths.append(path)
+        return paths
+
+    def _class_mask(self, classes):
+        mask = np.zeros(MAX_CLASSES // 64, dtype=np.uint64)
+        ids = []
+        for name in classes:
+            class_id = self.meta._class_ids.get(name)
+            if class_id is not None:
+                ids.append(class_id)
+                mask[class_id // 64] |= np.uint64(1) << np.uint64(class_id % 64)
+        return ids, mask
+
+    def scan(self, start, end, classes=None, limit=None):
+        """
+        Return the records with `start` <= t < `end` (and one of `classes`, if given) as one array.
+
+        With `limit`, only the oldest `limit` matches are returned and no
+        segment is read past the one that reaches it.
+        """
+        class_ids, class_mask = self._class_mask(classes) if classes else (None, None)
+        if classes and not class_ids:
+            return np.zeros(0, dtype=RECORD)
+        found = []
+        total = 0
+        for path in self.segments(start, end):
+            count = path.stat().st_size // RECORD.itemsize
+            if not count:
+                continue
+            records = np.memmap(path, dtype=RECORD, mode="r", shape=(count,))
+            index_path = path.with_suffix(".idx")
+            index = np.fromfile(index_path, dtype=INDEX) if index_path.exists() else np.zeros(0, dtype=INDEX)
+
+            # The records after the last indexed block are scanned as one more block
+            starts = index["offset"].astype(np.int64)
+            ends = starts + index["count"]
+            # A block can only hold times from its first time up to the next block's first time
+            keep = (index["t"] < end) & (np.append(index["t"][1:], np.inf) >= start)
+            if class_mask is not None:
+                keep &= ((index["classes"] & class_mask) != 0).any(axis=1)
+            ranges = [(int(a), int(b)) for a, b in zip(starts[keep], ends[keep])]
+            tail = int(ends[-1]) if len(index) else 0
+            if tail < count:
+                ranges.append((tail, count))
+            if not ranges:
+                continue
+
+            rows = np.concatenate([np.arange(a, b) for a, b in ranges])
+            selected = records[rows]
+            mask = (selected["t"] >= start) & (selected["t"] < end)
+            if class_ids:
+                mask &= (selected["counts"][:, class_ids] > 0).any(axis=1)
+            found.append(np.array(selected[mask]))
+            total += len(found[-1])
+            if limit is not None and total >= limit:
+                break
+        return np.concatenate(found)[:limit] if found else np.zeros(0, dtype=RECORD)
+
+    def to_result(self, record):
+        """Rebuild a detect_frame-style result from a record. Zone breaches come back as presence only."""
+        counts = record["counts"]
+        detected = {self.meta.classes[i]: int(counts[i]) for i in np.flatnonzero(counts) if i < len(self.meta.classes)}
+        flags = int(record["flags"])
+        zones = int(record["zones"])
+        result = {
+            "detected objects": detected,
+            "total persons": int(record["persons"]),
+            "is crowded": bool(flags & CROWDED),
+            "is fire": bool(flags & FIRE),
+            "is smoke": bool(flags & SMOKE),
+            "fire ratio": float(record["fire_ratio"]),
+        }
+        if zones:
+            result["zone breaches"] = {name: 1 for i, name in enumerate(self.meta.zones) if zones >> i & 1}
+        return result
+
+    def to_dict(self, record):
+        """A record as JSON-friendly data for the API."""
+        audio = float(record["audio_hz"])
+        return {
+            "t": float(record["t"]),
+            "seq": int(record["seq"]),
+            "detection": self.to_result(record),
+            "audio frequency": None if np.isnan(audio) else round(audio, 1),
+            "person boxes": record["boxes"][:record["n_boxes"]].tolist(),
+        }
+
+
+async def replay(reader, records, emit=None, evaluate_interval=0.5):
+    """
+    Feed recorded detections back through a fresh pipeline's assessment.
+
+    Records are applied in time order with their own timestamps, and every
+    `evaluate_interval` seconds of recorded time the pipeline runs
+    `evaluate_once` (the body of `evaluate_threats`) at that time. Cooldowns,
+    fusion horizons and dwell times therefore behave as they did live, but
+    under the current scoring rules and weights. Returns one entry per
+    assessment; alerts that would have been sent also go to `emit`.
+    """
+    from .pipeline import SensorPipeline
+
+    async def discard(text):
+        pass
+
+    pipeline = SensorPipeline(emit or discard, camera_id=reader.camera_id, with_audio=False, with_bof=False,
+                              with_thermal=False, with_vibration=False)
+    assessments = []
+    next_at = None
+    last_audio = None
+    for record in records:
+        t = float(record["t"])
+        pipeline.update_detection(reader.to_result(record), at=t, frame_id=f"{reader.camera_id}-{int(record['seq'])}")
+        audio = float(record["audio_hz"])
+        if not np.isnan(audio) and audio != last_audio:
+            pipeline.update_audio(audio, at=t)
+            last_audio = audio
+        if next_at is None or t >= next_at:
+            threat_data, sent = await pipeline.evaluate_once(upload=False, now=t)
+            alert = threat_data["alert"]
+            assessments.append({
+                "t": t,
+                "score": threat_data["threat_score"],
+                "type": alert["type"],
+                "severity": alert["severity"],
+                "critical": threat_data["has_critical_threat"],
+                "sent": sent,
+            })
+            next_at = t + evaluate_interval
+    return assessments
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def claim_detection_log(camera_id, owner):
+    """
+    Return the camera's log writer for `owner`, or None if logging is off or another pipeline already writes it.
+
+    With embedded pipelines every client runs its own pipeline for the same
+    camera; only the first one to claim the log records its frames.
+    """
+    from django.conf import settings
+
+    if not getattr(settings, "DETECTION_LOG_ENABLED", False):
+        return None
+    with _logs_lock:
+        entry = _logs.get(camera_id)
+        if entry is not None:
+            return entry[0] if entry[1] is owner else None
+        log = DetectionLog(settings.DETECTION_LOG_DIR, camera_id,
+                           retention_hours=settings.DETECTION_LOG_RETENTION_HOURS)
+        _logs[camera_id] = (log, owner)
+        return log
+
+
+def release_detection_log(camera_id, owner):
+    with _logs_lock:
+        entry = _logs.get(camera_id)
+        if entry is None or entry[1] is not owner:
+            return
+        del _logs[camera_id]
+    entry[0].close()
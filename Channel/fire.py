@@ -0,0 +1,121 @@
+import time
+
+import cv2
+import numpy as np
+
+# HSV ranges (OpenCV scale: H 0-179, S/V 0-255)
+FLAME_LOWER = np.array([0, 80, 190], dtype=np.uint8)
+FLAME_UPPER = np.array([35, 255, 255], dtype=np.uint8)
+SMOKE_LOWER = np.array([0, 0, 90], dtype=np.uint8)
+SMOKE_UPPER = np.array([179, 45, 225], dtype=np.uint8)
+
+
+class FireDetector:
+    """
+    Cheap per-camera fire and smoke detector run alongside YOLO on each frame.
+
+    Frames are shrunk to `width` pixels wide, then flame-coloured pixels
+    (bright, saturated red to yellow with R >= G >= B) and smoke-coloured
+    pixels (grey, mid brightness, differing from a slow running background)
+    are masked with vectorised colour thresholds. Flames flicker, so the
+    last `history` flame masks are kept and a pixel only counts once it has
+    switched on and off at least twice; a steady orange object (a vest, a
+    traffic cone, a sunset) never does. Smoke needs the same share of grey,
+    changed pixels over the whole history.
+
+    With `confirm_model` (a YOLO weights file trained on fire/smoke classes)
+    candidate frames are re-checked by the model, at most once every
+    `confirm_interval` seconds, and the verdict is reused in between.
+    """
+
+    def __init__(self, width=160, history=8, min_fire_ratio=0.002, min_flicker=0.2,
+                 min_smoke_ratio=0.05, confirm_model=None, confirm_conf=0.4, confirm_interval=1.0):
+        self.width = width
+        self.history = history
+        self.min_fire_ratio = min_fire_ratio
+        self.min_flicker = min_flicker
+        self.min_smoke_ratio = min_smoke_ratio
+        self.confirm_conf = confirm_conf
+        self.confirm_interval = confirm_interval
+
+        self._masks = None
+        self._smoke = np.zeros(history, dtype=np.float32)
+        self._index = 0
+        self._filled = 0
+        self._background = None
+
+        self._model = None
+        self._confirmed = None
+        self._confirmed_at = 0.0
+        if confirm_model:
+            from ultralytics import YOLO
+            self._model = YOLO(confirm_model)
+
+    def reset(self):
+        self._masks = None
+        self._background = None
+        self._index = self._filled = 0
+
+    def _shrink(self, frame):
+        h, w = frame.shape[:2]
+        if w <= self.width:
+            return frame
+        height = max(1, round(h * self.width / w))
+        return cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+
+    def analyze(self, frame):
+        """Return the fire/smoke keys to merge into a detection result."""
+        small = self._shrink(frame)
+        if self._masks is not None and self._masks.shape[1:] != small.shape[:2]:
+            # Resolution changed (camera reconnect, new file): start over
+            self.reset()
+        if self._masks is None:
+            self._masks = np.zeros((self.history,) + small.shape[:2], dtype=bool)
+
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        b, g, r = cv2.split(small)
+        flame = (cv2.inRange(hsv, FLAME_LOWER, FLAME_UPPER) > 0) & (r >= g) & (g >= b)
+
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+        if self._background is None:
+            self._background = gray
+        changed = np.abs(gray - self._background) > 10
+        cv2.accumulateWeighted(gray, self._background, 0.05)
+        smoke = (cv2.inRange(hsv, SMOKE_LOWER, SMOKE_UPPER) > 0) & changed
+
+        self._masks[self._index] = flame
+        self._smoke[self._index] = smoke.mean()
+        self._index = (self._index + 1) % self.history
+        self._filled = min(self._filled + 1, self.history)
+
+        fire_ratio = float(flame.mean())
+        flicker = 0.0
+        if self._filled == self.history:
+            # Oldest first, so toggles are counted between consecutive frames only
+            masks = np.roll(self._masks, -self._index, axis=0)
+            toggles = np.count_nonzero(masks[1:] != masks[:-1], axis=0)
+            seen = masks.any(axis=0)
+            if seen.any():
+                flicker = float(np.count_nonzero(toggles[seen] >= 2)) / np.count_nonzero(seen)
+
+        is_fire = fire_ratio >= self.min_fire_ratio and flicker >= self.min_flicker
+        is_smoke = self._filled == self.history and float(self._smoke.min()) >= self.min_smoke_ratio
+
+        if self._model is not None and (is_fire or is_smoke):
+            is_fire, is_smoke = self._confirm(frame, is_fire, is_smoke)
+
+        return {
+            'is fire': is_fire,
+            'is smoke': is_smoke,
+            'fire ratio': round(fire_ratio, 4),
+            'fire flicker': round(flicker, 3),
+        }
+
+    def _confirm(self, frame, is_fire, is_smoke):
+        now = time.monotonic()
+        if self._confirmed is None or now - self._confirmed_at >= self.confirm_interval:
+            result = self._model.predict(frame, conf=self.confirm_conf, verbose=False)[0]
+            names = {result.names[int(c)].lower() for c in result.boxes.cls}
+            self._confirmed = ('fire' in names or 'flame' in names, 'smoke' in names)
+            self._confirmed_at = now
+        return is_fire and self._confirmed[0], is_smoke and self._confirmed[1]
@@ -0,0 +1,192 @@
+import math
+from collections import deque
+
+import numpy as np
+
+# Seconds a reading keeps counting towards the assessment, per sensor
+HORIZONS = {
+    "knife": 3.0,
+    "scissors": 3.0,
+    "fire": 5.0,
+    "smoke": 5.0,
+    "crowd": 3.0,
+    "audio": 2.0,
+    "audio_impulse": 2.0,
+    "bof": 10.0,
+    "gunshot": 10.0,
+    "thermal": 10.0,
+    "thermal_rise": 10.0,
+    "vibration": 5.0,
+}
+
+# Correlated features: readings from both groups at most `gap` seconds apart
+CORRELATIONS = {
+    "weapon_audio": (("knife", "scissors"), ("audio_impulse",), 2.0),
+    "weapon_gunshot": (("knife", "scissors"), ("gunshot",), 5.0),
+    "crowd_audio": (("crowd",), ("audio_impulse",), 2.0),
+    "fire_thermal": (("fire", "smoke"), ("thermal", "thermal_rise"), 5.0),
+}
+
+# Frequencies above this count as an audio impulse, as in the audio alert threshold
+AUDIO_IMPULSE_HZ = 700
+
+
+class EventWindow:
+    """
+    Timestamped readings of one sensor over the last `horizon` seconds.
+
+    Readings live in fixed-size NumPy ring buffers. Count and max over the
+    window are updated as readings enter and expire (max through a monotonic
+    queue), so queries never rescan the window. Once `capacity` readings are
+    held, the oldest is dropped early.
+
+    Expiry walks from the oldest end, so times must not go backwards: a
+    reading older than the newest one is stored at the newest time, or
+    dropped if it is already more than `horizon` behind it.
+    """
+
+    def __init__(self, horizon, capacity=512):
+        self.horizon = horizon
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.payloads = [None] * capacity
+        self.head = 0
+        self.tail = 0
+        self._max = deque()
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def push(self, t, value=1.0, payload=None):
+        if len(self):
+            newest = self.times[(self.tail - 1) % self.capacity]
+            if t < newest:
+                # Late readings (e.g. client timestamps on ingest) would hold up expiry of everything after them
+                if t < newest - self.horizon:
+                    return
+                t = newest
+        if len(self) == self.capacity:
+            self._drop()
+        value = float(value)
+        i = self.tail % self.capacity
+        self.times[i] = t
+        self.values[i] = value
+        self.payloads[i] = payload
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((self.tail, value))
+        self.tail += 1
+
+    def _drop(self):
+        i = self.head % self.capacity
+        self.payloads[i] = None
+        if self._max and self._max[0][0] == self.head:
+            self._max.popleft()
+        self.head += 1
+
+    def expire(self, now):
+        cutoff = now - self.horizon
+        while len(self) and self.times[self.head % self.capacity] < cutoff:
+            self._drop()
+
+    @property
+    def max(self):
+        return self._max[0][1] if self._max else 0.0
+
+    def last(self):
+        """Return (time, value, payload) of the newest reading, or None."""
+        if not len(self):
+            return None
+        i = (self.tail - 1) % self.capacity
+        return float(self.times[i]), float(self.values[i]), self.payloads[i]
+
+
+class SensorFusion:
+    """
+    Time-aligned view of all sensors for one pipeline.
+
+    Every reading is pushed with the time it was observed into its sensor's
+    EventWindow. Correlations are checked only when a reading arrives,
+    against the other group's newest reading time. The assessment then reads
+    a fixed-size `snapshot()`, so a knife seen on one frame still counts for
+    the next few seconds, and a BOF event stops counting once it is older
+    than its horizon.
+    """
+
+    def __init__(self, horizons=HORIZONS, correlations=CORRELATIONS):
+        self.windows = {sensor: EventWindow(horizon) for sensor, horizon in horizons.items()}
+        self._last = {}
+        self._correlated = {}
+        self._hold = {}
+        self._partners = {}
+        for name, (left, right, gap) in correlations.items():
+            self._hold[name] = max(horizons[s] for s in left + right)
+            for sensor in left:
+                self._partners.setdefault(sensor, []).append((name, right, gap))
+            for sensor in right:
+                self._partners.setdefault(sensor, []).append((name, left, gap))
+
+    def push(self, sensor, t, value=1.0, payload=None):
+        self.windows[sensor].push(t, value, payload)
+        self._last[sensor] = t
+        for name, others, gap in self._partners.get(sensor, ()):
+            seen = max(self._last.get(other, -math.inf) for other in others)
+            if abs(t - seen) <= gap:
+                self._correlated[name] = max(t, seen)
+
+    def observe_detection(self, result, t):
+        objects = result.get("detected objects") or {}
+        for weapon in ("knife", "scissors"):
+            if objects.get(weapon):
+                self.push(weapon, t, objects[weapon])
+        if result.get("is crowded"):
+            self.push("crowd", t, result.get("total persons", 0))
+        if result.get("is fire"):
+            self.push("fire", t, result.get("fire ratio", 1.0))
+        if result.get("is smoke"):
+            self.push("smoke", t)
+
+    def observe_audio(self, frequency, t):
+        self.push("audio", t, frequency)
+        if frequency > AUDIO_IMPULSE_HZ:
+            self.push("audio_impulse", t, frequency)
+
+    def observe_bof(self, event, t):
+        self.push("bof", t, float(event.get("Intensity (dB)", 0) or 0), payload=event)
+        event_type = str(event.get("Event Type", "")).lower()
+        if "gunshot" in event_type or "explosion" in event_type:
+            self.push("gunshot", t)
+
+    def observe_thermal(self, results, t):
+        for sensor_id, result in results.items():
+            if result.get("is hotspot"):
+                self.push("thermal", t, result["max temp"], payload={"sensor": sensor_id, **result})
+            if result.get("is rising"):
+                self.push("thermal_rise", t, result["rise rate"], payload={"sensor": sensor_id, **result})
+
+    def observe_vibration(self, results, t):
+        for sensor_id, result in results.items():
+            if result.get("is exceeding"):
+                self.push("vibration", t, result["rms"], payload={"sensor": sensor_id, **result})
+
+    def active(self, sensor):
+        return len(self.windows[sensor]) > 0
+
+    def latest(self, sensor):
+        last = self.windows[sensor].last()
+        return last[2] if last else None
+
+    def snapshot(self, now):
+        """Expire old readings and return the fused features as of `now`."""
+        sensors = {}
+        for sensor, window in self.windows.items():
+            window.expire(now)
+            if len(window):
+                sensors[sensor] = {
+                    "count": len(window),
+                    "max": round(window.max, 3),
+                    "age": round(now - window.last()[0], 2),
+                }
+        correlated = sorted(name for name, t in self._correlated.items() if now - t <= self._hold[name])
+        return {"sensors": sensors, "correlated": correlated}
@@ -0,0 +1,390 @@
+import hmac
+import json
+import math
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from . import metrics
+from .fusion import EventWindow
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is optional, NDJSON always works
+    msgpack = None
+
+# Sensors third-party devices can report, and how long a report keeps counting towards the assessment
+INGEST_HORIZONS = {
+    "vibration": 5.0,
+    "thermal": 10.0,
+}
+SENSOR_TYPES = tuple(INGEST_HORIZONS)
+
+# Levels that raise the sensor's alarm: peak acceleration in g, temperature in °C
+ALARM_LEVELS = {
+    "vibration": 0.5,
+    "thermal": 60.0,
+}
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json", "text/plain")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# Device clocks may run a little ahead, readings further in the future are rejected
+MAX_CLOCK_SKEW = 5.0
+# Error details returned per batch, the rest are only counted
+MAX_ERRORS = 10
+
+READING_SCHEMA = {
+    "device": {"type": str, "required": True, "max_length": 64},
+    "sensor": {"enum": SENSOR_TYPES, "required": True},
+    # A single value or a short series of samples, e.g. one accelerometer window
+    "value": {"type": (int, float, list), "required": True, "max_length": 4096},
+    "ts": {"type": (int, float)},
+    "location": {"type": str, "max_length": 64},
+}
+
+
+class IngestError(ValueError):
+    """A batch that cannot be accepted at all, with the HTTP status to answer it with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def compile_schema(schema):
+    """
+    Compile a field spec like READING_SCHEMA into a validator, once.
+
+    The validator takes a decoded reading and returns None if it is valid,
+    otherwise a short error message. Each field's checks are resolved up
+    front into a flat tuple, so per reading there is no spec to interpret,
+    only dict lookups and isinstance calls. Unknown fields are ignored.
+    """
+    required = tuple(name for name, spec in schema.items() if spec.get("required"))
+    checks = []
+    for name, spec in schema.items():
+        types = spec.get("type")
+        if types is not None and not isinstance(types, tuple):
+            types = (types,)
+        enum = frozenset(spec["enum"]) if "enum" in spec else None
+        checks.append((
+            name,
+            types,
+            f"{name} must be {' or '.join(t.__name__ for t in types)}" if types else None,
+            enum,
+            f"{name} must be one of {', '.join(spec['enum'])}" if enum else None,
+            spec.get("max_length"),
+            f"{name} is longer than {spec.get('max_length')}",
+        ))
+    checks = tuple(checks)
+
+    def validate(reading):
+        if type(reading) is not dict:
+            return "reading must be a JSON object"
+        for name in required:
+            if reading.get(name) is None:
+                return f"{name} is required"
+        for name, types, type_error, enum, enum_error, max_length, length_error in checks:
+            value = reading.get(name)
+            if value is None:
+                continue
+            # bool is an int subclass, but true/false is never a valid reading
+            if types is not None and (not isinstance(value, types) or value is True or value is False):
+                return type_error
+            if enum is not None and value not in enum:
+                return enum_error
+            if max_length is not None and type(value) in (str, list) and len(value) > max_length:
+                return length_error
+        return None
+
+    return validate
+
+
+validate_reading = compile_schema(READING_SCHEMA)
+
+
+def decode_batch(body, content_type):
+    """
+    Decode a request body into a list of readings.
+
+    NDJSON bodies are parsed in one call by joining the lines into a JSON
+    array; only if that fails are lines parsed one by one, so a bad line
+    rejects that reading rather than the batch. A body that is itself a JSON
+    array is accepted as well. MessagePack bodies are either one array of
+    maps or a stream of maps.
+    """
+    media = (content_type or "").split(";")[0].strip().lower()
+    if media in MSGPACK_TYPES:
+        if msgpack is None:
+            raise IngestError("MessagePack needs the msgpack package, send NDJSON instead", status=415)
+        unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+        unpacker.feed(body)
+        try:
+            items = list(unpacker)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise IngestError(f"Invalid MessagePack: {e}")
+        return items[0] if len(items) == 1 and isinstance(items[0], list) else items
+    if media and media not in NDJSON_TYPES:
+        raise IngestError(f"Unsupported content type {media}", status=415)
+
+    body = body.strip()
+    if body.startswith(b"["):
+        try:
+            readings = json.loads(body)
+        except ValueError as e:
+            raise IngestError(f"Invalid JSON: {e}")
+        if not isinstance(readings, list):
+            raise IngestError("Expected an array of readings")
+        return readings
+
+    lines = [line for line in body.splitlines() if line.strip()]
+    try:
+        readings = json.loads(b"[" + b",".join(lines) + b"]")
+        if len(readings) == len(lines):
+            return readings
+    except ValueError:
+        pass
+    readings = []
+    for line in lines:
+        try:
+            readings.append(json.loads(line))
+        except ValueError:
+            readings.append(None)  # Rejected by validation like any other non-object
+    return readings
+
+
+def reading_level(value):
+    """Reduce a reading's value to one level: the value itself, or the peak magnitude of a series."""
+    try:
+        if type(value) is list:
+            samples = np.asarray(value, dtype=np.float64)
+            if samples.ndim != 1 or not len(samples):
+                raise ValueError
+            level = float(np.abs(samples).max())
+        else:
+            level = float(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("value must be a number or a flat list of numbers")
+    if not math.isfinite(level):
+        raise ValueError("value must be finite")
+    return level
+
+
+class DeviceRateLimiter:
+    """
+    Token bucket per device: `rate` readings per second, bursts of up to `burst`.
+
+    Tokens are taken per batch, so a device's readings cost one bucket update
+    however many arrive together. Buckets that have been idle long enough to
+    refill are dropped once more than `max_devices` are tracked.
+    """
+
+    def __init__(self, rate, burst=None, max_devices=100000):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self.max_devices = max_devices
+        self._buckets = {}
+
+    def take(self, device, n, now):
+        """Take up to `n` tokens from the device's bucket and return how many were granted."""
+        if self.rate <= 0:
+            return n
+        bucket = self._buckets.get(device)
+        if bucket is None:
+            if len(self._buckets) >= self.max_devices:
+                self._prune(now)
+            tokens = self.burst
+        else:
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        granted = min(n, int(tokens))
+        self._buckets[device] = (tokens - granted, now)
+        return granted
+
+    def _prune(self, now):
+        refill = self.burst / self.rate
+        self._buckets = {device: bucket for device, bucket in self._buckets.items() if now - bucket[1] < refill}
+
+
+class ExternalSensors:
+    """
+    Readings from third-party sensors, per location, as the threat assessment sees them.
+
+    Ingest reduces each batch to one report per location and sensor (count,
+    peak level, newest time), which is pushed into that sensor's EventWindow.
+    Reports without a location apply to every pipeline. `snapshot()` has the
+    same shape as SensorFusion's, so the assessment merges both.
+    """
+
+    def __init__(self, horizons=INGEST_HORIZONS):
+        self.horizons = horizons
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def record(self, summary):
+        """Push a batch summary: {location or "": {sensor: [count, level, time]}}."""
+        with self._lock:
+            for location, sensors in summary.items():
+                for sensor, (count, level, at) in sensors.items():
+                    window = self._windows.get((location, sensor))
+                    if window is None:
+                        window = self._windows[(location, sensor)] = EventWindow(self.horizons[sensor])
+                    window.push(at, level, payload=count)
+
+    def snapshot(self, now, location=None):
+        """Return {sensor: {"count", "max", "age"}} over site-wide reports and those for `location`."""
+        sensors = {}
+        with self._lock:
+            for key in ("", location) if location else ("",):
+                for sensor in self.horizons:
+                    window = self._windows.get((key, sensor))
+                    if window is None:
+                        continue
+                    window.expire(now)
+                    if not len(window):
+                        continue
+                    age = now - window.last()[0]
+                    held = sensors.get(sensor)
+                    if held is None:
+                        sensors[sensor] = {"count": len(window), "max": round(window.max, 3), "age": round(age, 2)}
+                    else:
+                        held["count"] += len(window)
+                        held["max"] = max(held["max"], round(window.max, 3))
+                        held["age"] = min(held["age"], round(age, 2))
+        return sensors
+
+
+external_sensors = ExternalSensors()
+
+
+class IngestService:
+    """
+    Validate, rate limit and summarise batches of readings from third-party sensors.
+
+    Readings are checked against the compiled READING_SCHEMA, then each
+    device's share of the batch goes through its token bucket in arrival
+    order. Accepted readings are folded into a per-location, per-sensor
+    summary, and only that summary is handed to `forward` (an async
+    callable) or, without one, recorded in `external_sensors` directly.
+    The cost per batch beyond parsing and validation therefore does not
+    grow with the number of readings.
+    """
+
+    def __init__(self, rate=100.0, burst=None, max_batch=10000, token="", forward=None, sensors=None):
+        self.limiter = DeviceRateLimiter(rate, burst)
+        self.max_batch = max_batch
+        self.token = token
+        self.forward = forward
+        self.sensors = sensors if sensors is not None else external_sensors
+
+    def authorised(self, token):
+        # Without a configured token ingest is closed, not open to anyone
+        if not self.token:
+            return False
+        return hmac.compare_digest((token or "").encode("utf-8"), self.token.encode("utf-8"))
+
+    def ingest(self, readings, now=None):
+        """Return (ack, summary) for a decoded batch."""
+        if len(readings) > self.max_batch:
+            raise IngestError(f"At most {self.max_batch} readings per batch, got {len(readings)}", status=413)
+        if now is None:
+            now = time.time()
+        latest = now + MAX_CLOCK_SKEW
+        errors = []
+        rejected = 0
+        valid = []
+
+        for i, reading in enumerate(readings):
+            error = validate_reading(reading)
+            if error is None:
+                at = reading.get("ts")
+                try:
+                    if at is None:
+                        at = now
+                    elif not isinstance(at, (int, float)) or not math.isfinite(at):
+                        # NaN would never expire from the sensor windows
+                        raise ValueError("ts must be a finite number")
+                    if at > latest:
+                        raise ValueError("ts is in the future")
+                    valid.append((reading["device"], reading.get("location") or "",
+                                  reading["sensor"], reading_level(reading["value"]), at))
+                    continue
+                except ValueError as e:
+                    error = str(e)
+            rejected += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append({"index": i, "error": error})
+
+        granted = {device: self.limiter.take(device, n, now)
+                   for device, n in Counter(r[0] for r in valid).items()}
+        limited = 0
+        summary = {}
+        for device, location, sensor, level, at in valid:
+            if not granted[device]:
+                limited += 1
+                continue
+            granted[device] -= 1
+            sensors = summary.setdefault(location, {})
+            report = sensors.get(sensor)
+            if report is None:
+                sensors[sensor] = [1, level, at]
+            else:
+                report[0] += 1
+                if level > report[1]:
+                    report[1] = level
+                if at > report[2]:
+                    report[2] = at
+
+        accepted = len(valid) - limited
+        metrics.INGEST_READINGS.labels("accepted").inc(accepted)
+        metrics.INGEST_READINGS.labels("rejected").inc(rejected)
+        metrics.INGEST_READINGS.labels("rate_limited").inc(limited)
+        ack = {"accepted": accepted, "rejected": rejected, "rate_limited": limited, "errors": errors}
+        return ack, summary
+
+    async def submit(self, body, content_type, now=None):
+        """Decode, ingest and deliver one batch; return the acknowledgement."""
+        with metrics.INGEST_LATENCY.time():
+            readings = decode_batch(body, content_type)
+            ack, summary = self.ingest(readings, now)
+        if summary:
+            if self.forward is not None:
+                await self.forward(summary)
+            else:
+                self.sensors.record(summary)
+        return ack
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_ingest_service():
+    """Return the process-wide ingest service, configured from Django settings on first use."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                from django.conf import settings
+
+                forward = None
+                if settings.SENSOR_PIPELINE == "service":
+                    from channels.layers import get_channel_layer
+                    from .pipeline import CONTROL_GROUP
+
+                    layer = get_channel_layer()
+
+                    async def forward(summary):
+                        # Assessment runs in the run_sensors process, hand it the batch summary
+                        await layer.group_send(CONTROL_GROUP, {"type": "sensor.readings", "summary": summary})
+
+                _service = IngestService(
+                    rate=settings.INGEST_RATE_LIMIT,
+                    burst=settings.INGEST_BURST,
+                    max_batch=settings.INGEST_MAX_BATCH,
+                    token=settings.INGEST_TOKEN,
+                    forward=forward,
+                )
+    return _service
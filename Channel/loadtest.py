@@ -0,0 +1,527 @@
+import asyncio
+import datetime
+import json
+import os
+import time
+
+import psutil
+
+from .metrics import summarize_latencies
+
+
+class ClientStats:
+    """Delivery statistics for one simulated dashboard client."""
+
+    def __init__(self, client_id, slow=False):
+        self.client_id = client_id
+        self.slow = slow
+        self.latencies = []
+        self.received = 0
+        self.first_seq = None
+        self.max_seq = -1
+        self.connected = False
+        self.error = None
+
+    def record(self, text):
+        message = json.loads(text)
+        if message.get("type") != "alert":
+            return
+        stamp = message["data"].get("loadtest")
+        if not stamp:
+            return
+        self.latencies.append(time.time() - stamp["emittedAt"])
+        self.received += 1
+        if self.first_seq is None:
+            self.first_seq = stamp["seq"]
+        self.max_seq = max(self.max_seq, stamp["seq"])
+
+    @property
+    def lost(self):
+        # Alerts are numbered consecutively per pipeline, so gaps since the first one seen are losses.
+        # With a shared sensor service a client may join mid-stream, hence counting from first_seq.
+        if self.first_seq is None:
+            return 0
+        return max(0, self.max_seq - self.first_seq + 1 - self.received)
+
+
+async def run_inprocess_client(application, stats, deadline, slow_delay):
+    """
+    Connect straight to the ASGI application, no sockets involved.
+
+    The communicator buffers everything the consumer sends in an unbounded
+    queue, so a slow reader here only delays its own receives: the server's
+    sends never block and no backpressure reaches it. Use socket mode to
+    measure that.
+    """
+    from channels.testing import WebsocketCommunicator
+
+    communicator = WebsocketCommunicator(application, "/ws/")
+    try:
+        connected, _ = await communicator.connect(timeout=10)
+        stats.connected = connected
+        while connected and time.monotonic() < deadline:
+            try:
+                text = await communicator.receive_from(timeout=max(0.01, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            stats.record(text)
+            if stats.slow:
+                await asyncio.sleep(slow_delay)
+    except Exception as e:
+        stats.error = repr(e)
+    finally:
+        try:
+            await communicator.disconnect()
+        except (Exception, asyncio.CancelledError):
+            # The application instance already finished, e.g. after a failed connect
+            pass
+
+
+async def run_socket_client(url, stats, deadline, slow_delay):
+    """Connect to a running server over a real WebSocket (e.g. Daphne on localhost)."""
+    from urllib.parse import urlparse
+    from autobahn.asyncio.websocket import WebSocketClientFactory, WebSocketClientProtocol
+
+    loop = asyncio.get_running_loop()
+    closed = loop.create_future()
+
+    class Protocol(WebSocketClientProtocol):
+        def onOpen(self):
+            stats.connected = True
+
+        def onMessage(self, payload, isBinary):
+            if not isBinary:
+                stats.record(payload.decode("utf-8"))
+            if stats.slow:
+                # Stop reading from the socket for a while so TCP backpressure reaches the server
+                self.transport.pause_reading()
+                loop.call_later(slow_delay, self.transport.resume_reading)
+
+        def onClose(self, wasClean, code, reason):
+            if not closed.done():
+                closed.set_result(reason)
+
+    parsed = urlparse(url)
+    factory = WebSocketClientFactory(url)
+    factory.protocol = Protocol
+    try:
+        transport, protocol = await loop.create_connection(factory, parsed.hostname, parsed.port or 80)
+        try:
+            await asyncio.wait_for(asyncio.shield(closed), timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            protocol.sendClose()
+            await asyncio.sleep(0.1)
+        finally:
+            transport.close()
+    except Exception as e:
+        stats.error = repr(e)
+
+
+def sampled_pid(mode, server_pid):
+    """The process to sample CPU from: the server in socket mode, this process in-process."""
+    if server_pid is not None:
+        return server_pid
+    if mode == "socket":
+        # Sampling ourselves would report the load generator's CPU as the server's
+        raise ValueError("server_pid is required in socket mode")
+    return os.getpid()
+
+
+class CpuSampler:
+    """Sample a process's CPU usage once per interval while the load test runs."""
+
+    def __init__(self, pid, interval=1.0):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.samples = []
+        self.peak_rss = 0
+
+    async def run(self):
+        self.process.cpu_percent(None)
+        while True:
+            await asyncio.sleep(self.interval)
+            self.samples.append(self.process.cpu_percent(None))
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+
+class FanoutLoadTest:
+    """
+    Open many concurrent dashboard clients against the `ws/` endpoint and
+    measure per-client delivery latency and loss while the server's stand-in
+    sensors (SENSOR_SOURCE=synthetic) emit alerts at a controlled rate.
+
+    `mode="inprocess"` drives Codecrafters.asgi.application directly;
+    `mode="socket"` connects to `url` and needs `server_pid`, the server
+    process whose CPU is sampled. A share of clients can be slow readers that
+    pause between messages; only in socket mode do they push back on the
+    server (see run_inprocess_client).
+    With `service=True` (in-process only) consumers subscribe to one shared
+    SensorPipeline publishing over the channel layer, as with run_sensors.
+    """
+
+    def __init__(self, clients=100, slow_clients=0, slow_delay=0.5, duration=30.0, ramp=5.0,
+                 mode="inprocess", url="ws://127.0.0.1:8000/ws/", server_pid=None, application=None,
+                 service=False):
+        self.clients = clients
+        self.slow_clients = slow_clients
+        self.slow_delay = slow_delay
+        self.duration = duration
+        self.ramp = ramp
+        self.mode = mode
+        self.url = url
+        self.server_pid = sampled_pid(mode, server_pid)
+        self.application = application
+        self.service = service
+        self.stats = []
+
+    async def _run(self):
+        if self.mode == "inprocess" and self.application is None:
+            from Codecrafters.asgi import application
+            self.application = application
+
+        publisher = None
+        if self.service:
+            from channels.layers import get_channel_layer
+            from .pipeline import ALERTS_GROUP, SensorPipeline
+
+            layer = get_channel_layer()
+
+            async def publish(text):
+                await layer.group_send(ALERTS_GROUP, {"type": "sensor.alert", "text": text})
+
+            publisher = SensorPipeline(publish)
+            await publisher.start()
+
+        sampler = CpuSampler(self.server_pid)
+        sampler_task = asyncio.create_task(sampler.run())
+        deadline = time.monotonic() + self.ramp + self.duration
+        tasks = []
+
+        for i in range(self.clients):
+            stats = ClientStats(i, slow=i < self.slow_clients)
+            self.stats.append(stats)
+            if self.mode == "inprocess":
+                coro = run_inprocess_client(self.application, stats, deadline, self.slow_delay)
+            else:
+                coro = run_socket_client(self.url, stats, deadline, self.slow_delay)
+            tasks.append(asyncio.create_task(coro))
+            # Spread connections over the ramp period instead of a thundering herd
+            if self.ramp and self.clients > 1:
+                await asyncio.sleep(self.ramp / self.clients)
+
+        # Client coroutines record their own connection errors, anything else is a harness bug
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            sampler_task.cancel()
+            if publisher is not None:
+                await publisher.stop()
+        return sampler
+
+    def _group(self, stats):
+        received = sum(s.received for s in stats)
+        lost = sum(s.lost for s in stats)
+        latencies = [l for s in stats for l in s.latencies]
+        return {
+            "clients": len(stats),
+            "connected": sum(1 for s in stats if s.connected),
+            "errors": sum(1 for s in stats if s.error),
+            "received": received,
+            "lost": lost,
+            "loss_ratio": round(lost / (received + lost), 4) if received + lost else 0.0,
+            "latency_ms": summarize_latencies(latencies),
+        }
+
+    def run(self):
+        """Run the load test and return the results as a JSON-serialisable dict."""
+        started = time.perf_counter()
+        sampler = asyncio.run(self._run())
+        wall = time.perf_counter() - started
+
+        normal = [s for s in self.stats if not s.slow]
+        slow = [s for s in self.stats if s.slow]
+        errors = sorted({s.error for s in self.stats if s.error})
+
+        return {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "mode": self.mode,
+            "url": self.url if self.mode != "inprocess" else None,
+            "config": {
+                "service": self.service,
+                "clients": self.clients,
+                "slow_clients": self.slow_clients,
+                "slow_delay": self.slow_delay,
+                "duration": self.duration,
+                "ramp": self.ramp,
+            },
+            "wall_seconds": round(wall, 3),
+            "all": self._group(self.stats),
+            "normal": self._group(normal),
+            "slow": self._group(slow),
+            "server": {
+                "pid": self.server_pid,
+                "cpu_percent": summarize_cpu(sampler.samples),
+                "peak_rss_bytes": sampler.peak_rss,
+            },
+            "error_samples": errors[:10],
+        }
+
+
+def summarize_cpu(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        "mean": round(sum(samples) / len(samples), 1),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+def make_ingest_batches(devices, batch, count=8, fmt="ndjson", seed=0):
+    """
+    Pre-encode `count` batches of synthetic readings so the generator's own cost stays out of the measurement.
+
+    Batches cycle through the devices, so each device sends an equal share
+    of the total rate.
+    """
+    import random
+
+    rng = random.Random(seed)
+    batches = []
+    n = 0
+    for _ in range(count):
+        readings = []
+        for _ in range(batch):
+            sensor = "vibration" if n % 2 else "thermal"
+            readings.append({
+                "device": f"loadtest-{n % devices}",
+                "sensor": sensor,
+                "value": round(rng.uniform(0.0, 0.4), 3) if sensor == "vibration" else round(rng.uniform(15.0, 40.0), 1),
+            })
+            n += 1
+        if fmt == "msgpack":
+            import msgpack
+            batches.append(msgpack.packb(readings))
+        else:
+            batches.append("\n".join(json.dumps(r, separators=(",", ":")) for r in readings).encode("utf-8"))
+    return batches
+
+
+class IngestStats:
+    """Totals and per-batch latency over all ingest senders."""
+
+    def __init__(self):
+        self.batches = 0
+        self.sent = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.rate_limited = 0
+        self.latencies = []
+        self.errors = []
+
+    def record(self, size, ack, latency):
+        self.batches += 1
+        self.sent += size
+        self.accepted += ack.get("accepted", 0)
+        self.rejected += ack.get("rejected", 0)
+        self.rate_limited += ack.get("rate_limited", 0)
+        self.latencies.append(latency)
+        if "error" in ack and len(self.errors) < 10:
+            self.errors.append(ack["error"])
+
+
+class IngestLoadTest:
+    """
+    Push pre-encoded batches of synthetic readings at the ingest endpoints and
+    measure the readings per second the server accepts and the latency of
+    each batch.
+
+    `transport` is "http" (POST /ingest) or "ws" (ws/ingest/), and `senders`
+    connections each send their next batch as soon as the previous one is
+    acknowledged. `mode="inprocess"` drives Codecrafters.asgi.application
+    directly; `mode="socket"` talks to the server at `url` and needs
+    `server_pid`, the server process whose CPU is sampled.
+    """
+
+    def __init__(self, transport="http", mode="inprocess", url="http://127.0.0.1:8000", senders=4,
+                 devices=1000, batch=1000, duration=10.0, fmt="ndjson", token="", server_pid=None,
+                 application=None):
+        self.transport = transport
+        self.mode = mode
+        self.url = url.rstrip("/")
+        self.senders = senders
+        self.devices = devices
+        self.batch = batch
+        self.duration = duration
+        self.fmt = fmt
+        self.token = token
+        self.server_pid = sampled_pid(mode, server_pid)
+        self.application = application
+        self.stats = IngestStats()
+
+    @property
+    def content_type(self):
+        return "application/msgpack" if self.fmt == "msgpack" else "application/x-ndjson"
+
+    async def _send_http_inprocess(self, batches, deadline):
+        from channels.testing import HttpCommunicator
+
+        headers = [(b"content-type", self.content_type.encode()), (b"host", b"localhost")]
+        if self.token:
+            headers.append((b"authorization", f"Bearer {self.token}".encode()))
+        i = 0
+        while time.monotonic() < deadline:
+            body = batches[i % len(batches)]
+            i += 1
+            start = time.perf_counter()
+            communicator = HttpCommunicator(self.application, "POST", "/ingest", body=body, headers=headers)
+            response = await communicator.get_response(timeout=30)
+            await communicator.wait()
+            self.stats.record(self.batch, json.loads(response["body"]), time.perf_counter() - start)
+
+    async def _send_http_socket(self, batches, deadline):
+        from urllib.parse import urlparse
+
+        parsed = urlparse(self.url)
+        reader, writer = await asyncio.open_connection(parsed.hostname, parsed.port or 80)
+        auth = f"Authorization: Bearer {self.token}\r\n" if self.token else ""
+        try:
+            i = 0
+            while time.monotonic() < deadline:
+                body = batches[i % len(batches)]
+                i += 1
+                start = time.perf_counter()
+                # Plain HTTP/1.1 keep-alive, one request in flight per connection
+                writer.write((f"POST /ingest HTTP/1.1\r\nHost: {parsed.hostname}\r\n{auth}"
+                              f"Content-Type: {self.content_type}\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body)
+                await writer.drain()
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                payload = await reader.readexactly(length)
+                self.stats.record(self.batch, json.loads(payload), time.perf_counter() - start)
+        finally:
+            writer.close()
+
+    async def _send_ws_inprocess(self, batches, deadline):
+        from channels.testing import WebsocketCommunicator
+
+        path = f"/ws/ingest/?token={self.token}" if self.token else "/ws/ingest/"
+        communicator = WebsocketCommunicator(self.application, path)
+        connected, _ = await communicator.connect(timeout=10)
+        if not connected:
+            raise RuntimeError("Ingest WebSocket refused the connection")
+        try:
+            i = 0
+            while time.monotonic() < deadline:
+                body = batches[i % len(batches)]
+                i += 1
+                start = time.perf_counter()
+                if self.fmt == "msgpack":
+                    await communicator.send_to(bytes_data=body)
+                else:
+                    await communicator.send_to(text_data=body.decode("utf-8"))
+                ack = json.loads(await communicator.receive_from(timeout=30))
+                self.stats.record(self.batch, ack, time.perf_counter() - start)
+        finally:
+            await communicator.disconnect()
+
+    async def _send_ws_socket(self, batches, deadline):
+        from urllib.parse import urlparse
+        from autobahn.asyncio.websocket import WebSocketClientFactory, WebSocketClientProtocol
+
+        loop = asyncio.get_running_loop()
+        opened = loop.create_future()
+        acks = asyncio.Queue()
+
+        class Protocol(WebSocketClientProtocol):
+            def onOpen(self):
+                opened.set_result(self)
+
+            def onMessage(self, payload, isBinary):
+                acks.put_nowait(payload)
+
+        parsed = urlparse(self.url)
+        scheme = "wss" if parsed.scheme == "https" else "ws"
+        query = f"?token={self.token}" if self.token else ""
+        factory = WebSocketClientFactory(f"{scheme}://{parsed.netloc}/ws/ingest/{query}")
+        factory.protocol = Protocol
+        transport, _ = await loop.create_connection(factory, parsed.hostname, parsed.port or 80)
+        try:
+            protocol = await asyncio.wait_for(opened, timeout=10)
+            i = 0
+            while time.monotonic() < deadline:
+                body = batches[i % len(batches)]
+                i += 1
+                start = time.perf_counter()
+                protocol.sendMessage(body, isBinary=self.fmt == "msgpack")
+                ack = json.loads(await asyncio.wait_for(acks.get(), timeout=30))
+                self.stats.record(self.batch, ack, time.perf_counter() - start)
+        finally:
+            transport.close()
+
+    async def _run(self):
+        if self.mode == "inprocess" and self.application is None:
+            from Codecrafters.asgi import application
+            self.application = application
+
+        batches = make_ingest_batches(self.devices, self.batch, fmt=self.fmt)
+        sender = {
+            ("http", "inprocess"): self._send_http_inprocess,
+            ("http", "socket"): self._send_http_socket,
+            ("ws", "inprocess"): self._send_ws_inprocess,
+            ("ws", "socket"): self._send_ws_socket,
+        }[(self.transport, self.mode)]
+
+        sampler = CpuSampler(self.server_pid)
+        sampler_task = asyncio.create_task(sampler.run())
+        deadline = time.monotonic() + self.duration
+        try:
+            results = await asyncio.gather(*(sender(batches, deadline) for _ in range(self.senders)),
+                                           return_exceptions=True)
+        finally:
+            sampler_task.cancel()
+        for result in results:
+            if isinstance(result, Exception) and len(self.stats.errors) < 10:
+                self.stats.errors.append(repr(result))
+        return sampler
+
+    def run(self):
+        """Run the load test and return the results as a JSON-serialisable dict."""
+        started = time.perf_counter()
+        sampler = asyncio.run(self._run())
+        wall = time.perf_counter() - started
+        stats = self.stats
+
+        return {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "mode": self.mode,
+            "transport": self.transport,
+            "url": self.url if self.mode != "inprocess" else None,
+            "config": {
+                "senders": self.senders,
+                "devices": self.devices,
+                "batch": self.batch,
+                "duration": self.duration,
+                "format": self.fmt,
+            },
+            "wall_seconds": round(wall, 3),
+            "readings": {
+                "sent": stats.sent,
+                "accepted": stats.accepted,
+                "rejected": stats.rejected,
+                "rate_limited": stats.rate_limited,
+                "accepted_per_second": round(stats.accepted / wall, 1) if wall else 0.0,
+            },
+            "batches": stats.batches,
+            "batch_latency_ms": summarize_latencies(stats.latencies),
+            "server": {
+                "pid": self.server_pid,
+                "cpu_percent": summarize_cpu(sampler.samples),
+                "peak_rss_bytes": sampler.peak_rss,
+            },
+            "error_samples": stats.errors,
+        }
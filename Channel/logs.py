@@ -0,0 +1,113 @@
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import multiprocessing.util
+import queue
+import sys
+import time
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including any `extra=` fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() formats the record on the logging thread and folds
+    the traceback into the message. Here the record is queued as it is,
+    except that the traceback is rendered to `exc_text` so no frames are
+    held by the queue; the listener's handler formats everything else.
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def make_queue_handler(json_output=True, stream=None):
+    """
+    Build a queue handler whose records are written by a background listener thread.
+
+    Loggers on the event loop only pay for a record copy and a queue put
+    (plus rendering the traceback, for exceptions); formatting and the
+    blocking stdout write happen on the listener thread. Used as a `()`
+    factory from the LOGGING dict in settings.
+    """
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stdout)
+    if json_output:
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    # Drain the queue at exit. Finalize also runs when a multiprocessing child exits, which skips atexit.
+    multiprocessing.util.Finalize(None, listener.stop, exitpriority=10)
+    return DeferredQueueHandler(log_queue)
+
+
+class SampledLogger:
+    """
+    Rate-limit log messages per key.
+
+    At most one message per key is emitted every `interval` seconds; the
+    number of messages dropped in between is attached as `suppressed`. When
+    the level is disabled the call returns after a single level check.
+    """
+
+    def __init__(self, logger, interval=5.0):
+        self.logger = logger
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+
+    def log(self, level, key, msg, *args, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        last = self._last.get(key)
+        if last is not None and now - last < self.interval:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return
+        self._last[key] = now
+        fields["key"] = key
+        fields["suppressed"] = self._suppressed.pop(key, 0)
+        self.logger.log(level, msg, *args, extra=fields)
+
+    def debug(self, key, msg, *args, **fields):
+        self.log(logging.DEBUG, key, msg, *args, **fields)
+
+    def info(self, key, msg, *args, **fields):
+        self.log(logging.INFO, key, msg, *args, **fields)
+
+    def warning(self, key, msg, *args, **fields):
+        self.log(logging.WARNING, key, msg, *args, **fields)
@@ -48,12 +48,21 @@
 
 #         return {'detected objects': detected_objects, 'total persons': personCount}
 
-import cv2
+import logging
+import threading
 from ultralytics import YOLO
+from . import metrics
+from .fire import FireDetector
+from .logs import SampledLogger
+from .preview import get_preview_hub
+from .profiles import DetectionProfile
+from .zones import ZoneMap
+
+logger = logging.getLogger(__name__)
+sampled = SampledLogger(logger, interval=1.0)
 
 # Load YOLO Model
 model = YOLO('yolov8n.pt')
-cap=cv2.VideoCapture(0)
 
 # COCO Classes
 classes = {0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 4: 'airplane', 5: 'bus', 6: 'train', 7: 'truck', 
@@ -69,33 +78,91 @@ classes = {0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 4: 'airplane',
            71: 'sink', 72: 'refrigerator', 73: 'book', 74: 'clock', 75: 'vase', 76: 'scissors', 77: 'teddy bear', 
            78: 'hair drier', 79: 'toothbrush'}
 
-def detection(cap):
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+# Fire/smoke state is per camera, flicker is tracked over each camera's own frames
+fire_detectors = {}
+
+# Serialises detect_frame() between threads of one process
+detect_lock = threading.Lock()
+
+def get_fire_detector(camera_id):
+    """Return the camera's FireDetector, or None when FIRE_DETECTION is off."""
+    if camera_id not in fire_detectors:
+        from django.conf import settings
+        detector = None
+        if getattr(settings, 'FIRE_DETECTION', True):
+            detector = FireDetector(
+                history=getattr(settings, 'FIRE_HISTORY', 8),
+                confirm_model=getattr(settings, 'FIRE_MODEL', '') or None,
+            )
+        fire_detectors[camera_id] = detector
+    return fire_detectors[camera_id]
+
+# Restricted zones per camera, rasterised on first use
+zone_maps = {}
+
+def get_zone_map(camera_id):
+    """Return the camera's ZoneMap, or None when it has no zones configured."""
+    if camera_id not in zone_maps:
+        from django.conf import settings
+        zones = settings.CAMERAS.get(camera_id, {}).get('zones') or []
+        zone_maps[camera_id] = ZoneMap(zones) if zones else None
+    return zone_maps[camera_id]
+
+# Detection profile per camera: class subset, confidences and input size
+detection_profiles = {}
+
+def get_detection_profile(camera_id):
+    if camera_id not in detection_profiles:
+        from django.conf import settings
+        config = settings.CAMERAS.get(camera_id, {}).get('detection')
+        detection_profiles[camera_id] = DetectionProfile.from_config(classes, config)
+    return detection_profiles[camera_id]
+
+def detect_frame(frame, camera_id="0", annotate=None, imgsz=None, fire=True):
+    # Pipelines call this from worker threads and the model and fire detectors are shared, so one frame at a time
+    with detect_lock:
+        profile = get_detection_profile(camera_id)
+
+        # Perform Object Detection, limited to the camera's classes so NMS does less work
+        results = model.predict(frame, **profile.predict_kwargs(imgsz))
+
+        # Annotate and encode for the live preview only while someone is watching
+        hub = get_preview_hub()
+        if annotate is None:
+            annotate = hub.wants(camera_id)
+        if annotate:
+            hub.publish(camera_id, results[0].plot())
+
+        # Per-class thresholds and counts in a few tensor operations, whatever the number of boxes
+        detected_objects, personCount, person_boxes = profile.filter_counts(results[0].boxes)
+
+        # Log detected objects, at most once a second and only when debug logging is on
+        sampled.debug("detection", "Detected objects", objects=detected_objects, persons=personCount)
 
-        personCount = 0
-        detected_objects = {}
+        isCrowded = False
+        if personCount > 1:
+            isCrowded = True
 
-        # Perform Object Detection
-        results = model.predict(frame, conf=0.5)
-        annotated_frame = results[0].plot()
+        # Person boxes are for the detection log, the pipeline keeps them out of alerts
+        result = {'detected objects': detected_objects, 'total persons': personCount, 'is crowded': isCrowded,
+                  'person boxes': person_boxes}
 
-        for box, cls in zip(results[0].boxes.xyxy, results[0].boxes.cls):
-            class_id = int(cls.item())
-            obj_name = classes.get(class_id, "Unknown")
+        zone_map = get_zone_map(camera_id)
+        if zone_map is not None:
+            result['zone breaches'] = zone_map.breaches(person_boxes, frame.shape)
 
-            if class_id == 0:
-                personCount += 1
-            detected_objects[obj_name] = detected_objects.get(obj_name, 0) + 1
+        # The detection pool runs the fire stage in the capture process, where frames are in order
+        fire_detector = get_fire_detector(camera_id) if fire else None
+        if fire_detector is not None:
+            with metrics.FIRE_LATENCY.time():
+                result.update(fire_detector.analyze(frame))
 
-        # Print all detected objects separately
-        print(f"\nDetected Objects: \n{detected_objects}")
-        print(f"Total Persons Detected: {personCount}")
+        return result
 
-        isCrowded = False
-        if personCount > 1:
-            isCrowded = True
+def detection(cap):
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
 
-        return {'detected objects': detected_objects, 'is crowded': isCrowded}
\ No newline at end of file
+        return detect_frame(frame)
\ No newline at end of file
@@ -0,0 +1,54 @@
+import datetime
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Channel.benchmark import PipelineBenchmark, compare, write_results
+from Channel.bof import DATASET_PATH
+
+
+class Command(BaseCommand):
+    help = "Benchmark the detection/audio/BOF/scoring/alert pipeline on recorded media"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--video", action="append", default=[], help="Video file to feed as the camera (repeatable)")
+        parser.add_argument("--wav", action="append", default=[], help="WAV file to feed as the microphone (repeatable)")
+        parser.add_argument("--bof-csv", default=str(DATASET_PATH), help="BOF dataset to replay, '' to disable")
+        parser.add_argument("--bof-interval", type=float, default=40.0, help="Media seconds between BOF events")
+        parser.add_argument("--max-frames", type=int, default=None, help="Stop after this many video frames")
+        parser.add_argument("--evaluate-every", type=int, default=1, help="Run a threat assessment every N frames")
+        parser.add_argument("--no-cooldown", action="store_true", help="Send every significant alert, ignoring cooldowns")
+        parser.add_argument("--output", default=None, help="Where to write the JSON results")
+        parser.add_argument("--compare", default=None, help="Previous results file to compare against")
+
+    def handle(self, *args, **options):
+        if not options["video"] and not options["wav"]:
+            raise CommandError("Give at least one --video or --wav input")
+
+        benchmark = PipelineBenchmark(
+            videos=options["video"],
+            wavs=options["wav"],
+            bof_csv=options["bof_csv"] or None,
+            bof_interval=options["bof_interval"],
+            max_frames=options["max_frames"],
+            evaluate_every=options["evaluate_every"],
+            cooldowns=not options["no_cooldown"],
+        )
+        results = benchmark.run()
+
+        output = options["output"] or f"bench_results/pipeline-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+        path = write_results(results, output)
+
+        self.stdout.write(json.dumps({
+            "throughput": results["throughput"],
+            "detection_to_alert_ms": results["latency_ms"]["detection_to_alert"],
+            "cpu": results["cpu"],
+            "memory": results["memory"],
+        }, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {path}"))
+
+        if options["compare"]:
+            baseline = json.loads(Path(options["compare"]).read_text())
+            self.stdout.write("Change vs baseline (%):")
+            self.stdout.write(json.dumps(compare(results, baseline), indent=2))
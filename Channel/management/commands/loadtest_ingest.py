@@ -0,0 +1,67 @@
+import datetime
+import json
+import secrets
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Channel.loadtest import IngestLoadTest
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the sensor ingest endpoints (/ingest and ws/ingest/) with batches of synthetic readings. "
+        "In-process mode drives Codecrafters.asgi.application; socket mode posts to a running server"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transport", choices=["http", "ws"], default="http")
+        parser.add_argument("--mode", choices=["inprocess", "socket"], default="inprocess")
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Socket mode: server base URL")
+        parser.add_argument("--senders", type=int, default=4, help="Concurrent connections, one batch in flight each")
+        parser.add_argument("--devices", type=int, default=1000, help="Distinct device ids the readings cycle through")
+        parser.add_argument("--batch", type=int, default=1000, help="Readings per batch")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds to send for")
+        parser.add_argument("--format", choices=["ndjson", "msgpack"], default="ndjson")
+        parser.add_argument("--token", default=None, help="Ingest token (default: INGEST_TOKEN)")
+        parser.add_argument("--rate-limit", type=float, default=None,
+                            help="In-process only: per-device readings/s, 0 to measure without limits")
+        parser.add_argument("--server-pid", type=int, default=None, help="Socket mode (required): server process to sample CPU from")
+        parser.add_argument("--output", default=None, help="Where to write the JSON results")
+
+    def handle(self, *args, **options):
+        if options["mode"] == "socket" and options["server_pid"] is None:
+            raise CommandError("--server-pid is required in socket mode, e.g. $(pgrep -f daphne)")
+        if options["mode"] == "inprocess":
+            # Record readings in this process, the service reads these on first use
+            settings.SENSOR_PIPELINE = "embedded"
+            if options["rate_limit"] is not None:
+                settings.INGEST_RATE_LIMIT = options["rate_limit"]
+            if options["token"]:
+                settings.INGEST_TOKEN = options["token"]
+            elif not settings.INGEST_TOKEN:
+                # Ingest is closed without a token, use a throwaway one for this run
+                settings.INGEST_TOKEN = secrets.token_hex(16)
+
+        test = IngestLoadTest(
+            transport=options["transport"],
+            mode=options["mode"],
+            url=options["url"],
+            senders=options["senders"],
+            devices=options["devices"],
+            batch=options["batch"],
+            duration=options["duration"],
+            fmt=options["format"],
+            token=settings.INGEST_TOKEN if options["token"] is None else options["token"],
+            server_pid=options["server_pid"],
+        )
+        results = test.run()
+
+        output = options["output"] or f"bench_results/loadtest-ingest-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+        path = Path(output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2))
+
+        self.stdout.write(json.dumps({key: results[key] for key in ("readings", "batch_latency_ms", "server")}, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {path}"))
@@ -0,0 +1,60 @@
+import datetime
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Channel.loadtest import FanoutLoadTest
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test WebSocket fan-out on ws/. In-process mode drives Codecrafters.asgi.application "
+        "with synthetic sensors; socket mode needs a server started with SENSOR_SOURCE=synthetic"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=100, help="Concurrent WebSocket clients")
+        parser.add_argument("--slow-clients", type=int, default=0, help="How many of the clients read slowly (backpressure only in socket mode)")
+        parser.add_argument("--slow-delay", type=float, default=0.5, help="Seconds a slow client pauses after each message")
+        parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run after the ramp")
+        parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which clients connect")
+        parser.add_argument("--rate", type=float, default=None, help="In-process only: alerts/s per connection")
+        parser.add_argument("--mode", choices=["inprocess", "socket"], default="inprocess")
+        parser.add_argument("--service", action="store_true",
+                            help="In-process only: fan out one shared sensor pipeline over the channel layer")
+        parser.add_argument("--url", default="ws://127.0.0.1:8000/ws/", help="Socket mode: server URL")
+        parser.add_argument("--server-pid", type=int, default=None, help="Socket mode (required): server process to sample CPU from")
+        parser.add_argument("--output", default=None, help="Where to write the JSON results")
+
+    def handle(self, *args, **options):
+        if options["mode"] == "socket" and options["server_pid"] is None:
+            raise CommandError("--server-pid is required in socket mode, e.g. $(pgrep -f daphne)")
+        if options["mode"] == "inprocess":
+            # The consumer reads these at connect time
+            settings.SENSOR_SOURCE = "synthetic"
+            settings.SENSOR_PIPELINE = "service" if options["service"] else "embedded"
+            if options["rate"]:
+                settings.SYNTHETIC_ALERT_RATE = options["rate"]
+
+        test = FanoutLoadTest(
+            clients=options["clients"],
+            slow_clients=options["slow_clients"],
+            slow_delay=options["slow_delay"],
+            duration=options["duration"],
+            ramp=options["ramp"],
+            mode=options["mode"],
+            url=options["url"],
+            server_pid=options["server_pid"],
+            service=options["service"],
+        )
+        results = test.run()
+
+        output = options["output"] or f"bench_results/loadtest-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+        path = Path(output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2))
+
+        self.stdout.write(json.dumps({key: results[key] for key in ("all", "normal", "slow", "server")}, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {path}"))
@@ -0,0 +1,70 @@
+import asyncio
+import datetime
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Channel.detlog import DetectionLogReader, replay
+from Channel.weighting import weighting
+
+
+def parse_time(value):
+    """Epoch seconds or an ISO 8601 date/time (local time unless it has an offset)."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise CommandError(f"Not a time: {value}")
+
+
+class Command(BaseCommand):
+    help = "Scan a camera's detection log, or replay it through threat assessment under the current rules"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--camera", default=None, help="Camera id, defaults to the first configured camera")
+        parser.add_argument("--start", required=True, help="Start time, epoch seconds or ISO 8601")
+        parser.add_argument("--end", default=None, help="End time, defaults to now")
+        parser.add_argument("--classes", default="", help="Comma-separated classes to scan for (scan only)")
+        parser.add_argument("--scan", action="store_true", help="Only list the matching records, do not replay")
+        parser.add_argument("--interval", type=float, default=0.5, help="Recorded seconds between assessments")
+        parser.add_argument("--conditions", default=None, help="Weather conditions to score under, e.g. Foggy")
+        parser.add_argument("--alerts-only", action="store_true", help="Print only assessments that sent an alert")
+
+    def handle(self, *args, **options):
+        camera = options["camera"] or next(iter(settings.CAMERAS))
+        if camera not in settings.CAMERAS:
+            raise CommandError(f"Unknown camera {camera}")
+        start = parse_time(options["start"])
+        end = parse_time(options["end"]) if options["end"] else time.time()
+        classes = [name for name in options["classes"].split(",") if name]
+        reader = DetectionLogReader(settings.DETECTION_LOG_DIR, camera)
+
+        started = time.perf_counter()
+        records = reader.scan(start, end, classes if options["scan"] and classes else None)
+        scanned_ms = (time.perf_counter() - started) * 1000
+        self.stderr.write(f"{len(records)} records in {scanned_ms:.1f} ms")
+
+        if options["scan"]:
+            for record in records:
+                self.stdout.write(json.dumps(reader.to_dict(record)))
+            return
+
+        if options["conditions"]:
+            weighting.set_override(options["conditions"])
+        alerts = []
+        assessments = asyncio.run(replay(reader, records, emit=self._collect(alerts), evaluate_interval=options["interval"]))
+        for assessment in assessments:
+            if assessment["sent"] or not options["alerts_only"]:
+                self.stdout.write(json.dumps(assessment))
+        self.stdout.write(self.style.SUCCESS(f"{len(assessments)} assessments, {len(alerts)} alerts sent"))
+
+    @staticmethod
+    def _collect(alerts):
+        async def emit(text):
+            alerts.append(text)
+        return emit
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Channel import metrics
+from Channel.ingest import external_sensors
+from Channel.pipeline import ALERTS_GROUP, CONTROL_GROUP, SensorPipeline, stay_in_group
+from Channel.preview import BOUNDARY, get_preview_hub, mjpeg_part
+from Channel.profiling import start_profile
+from Channel.rollups import rollups
+from Channel.tracing import tracer
+from Channel.weighting import weighting
+
+logger = logging.getLogger(__name__)
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """Serve /metrics, /rollups, /tracing and /preview/<camera> from the sensor service's own process."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/preview/"):
+            self.stream_preview(url.path[len("/preview/"):])
+            return
+        if url.path == "/metrics":
+            body = metrics.REGISTRY.render().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif url.path == "/rollups":
+            query = parse_qs(url.query)
+            try:
+                data = rollups.query(query.get("resolution", ["1m"])[0], location=query.get("location", [None])[0])
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            body = json.dumps(data).encode("utf-8")
+            content_type = "application/json"
+        elif url.path == "/tracing":
+            query = parse_qs(url.query)
+            try:
+                limit = int(query.get("limit", ["500"])[0])
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            data = {"enabled": tracer.enabled, "spans": tracer.recent(query.get("trace", [None])[0], limit)}
+            body = json.dumps(data).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_preview(self, camera_id):
+        if not settings.PREVIEW_ENABLED or camera_id not in settings.CAMERAS:
+            self.send_error(404)
+            return
+        hub = get_preview_hub()
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache, no-store")
+        self.end_headers()
+        with hub.viewer(camera_id):
+            seq = 0
+            try:
+                while True:
+                    entry = hub.wait(camera_id, seq)
+                    if entry is None:
+                        continue
+                    seq, jpeg = entry
+                    self.wfile.write(mjpeg_part(jpeg))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Run the sensor pipelines as a long-lived service publishing alerts over the channel layer"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--camera", action="append", default=[],
+                            help="Camera id from settings.CAMERAS to run (repeatable, default: all)")
+        parser.add_argument("--http-port", type=int, default=None,
+                            help="Serve /metrics, /rollups, /tracing and /preview/<camera> for this process on this port")
+        parser.add_argument("--http-host", default="127.0.0.1",
+                            help="Address for --http-port. The endpoints have no auth and include live camera "
+                                 "video, so only bind beyond localhost on a trusted network")
+
+    def handle(self, *args, **options):
+        camera_ids = options["camera"] or list(settings.CAMERAS)
+        unknown = [c for c in camera_ids if c not in settings.CAMERAS]
+        if unknown:
+            raise CommandError(f"Unknown camera(s): {', '.join(unknown)}")
+        if get_channel_layer() is None:
+            raise CommandError("No channel layer configured, see CHANNEL_LAYERS in settings")
+
+        if options["http_port"]:
+            server = ThreadingHTTPServer((options["http_host"], options["http_port"]), StatusHandler)
+            threading.Thread(target=server.serve_forever, name="sensor-status", daemon=True).start()
+
+        asyncio.run(self.serve(camera_ids))
+
+    async def serve(self, camera_ids):
+        layer = get_channel_layer()
+
+        async def publish(text):
+            # Serialised once here, every subscribed consumer forwards the same text
+            await layer.group_send(ALERTS_GROUP, {"type": "sensor.alert", "text": text})
+
+        # The microphone, BOF feed and thermal/vibration sensors are site-wide, attach them to the first camera only
+        pipelines = [
+            SensorPipeline(publish, camera_id=camera_id, with_audio=i == 0, with_bof=i == 0,
+                           with_thermal=i == 0, with_vibration=i == 0)
+            for i, camera_id in enumerate(camera_ids)
+        ]
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass
+
+        control = await layer.new_channel()
+        await layer.group_add(CONTROL_GROUP, control)
+        # The service runs for longer than the layer keeps a group membership
+        membership = asyncio.create_task(stay_in_group(layer, CONTROL_GROUP, control))
+
+        for pipeline in pipelines:
+            await pipeline.start()
+        logger.info("Sensor service running", extra={"cameras": camera_ids})
+        self.stdout.write(self.style.SUCCESS(f"Sensor service running for cameras: {', '.join(camera_ids)}"))
+
+        control_task = asyncio.create_task(self.handle_control(layer, control))
+        await stop.wait()
+
+        control_task.cancel()
+        membership.cancel()
+        await asyncio.gather(control_task, membership, return_exceptions=True)
+        await layer.group_discard(CONTROL_GROUP, control)
+        for pipeline in pipelines:
+            await pipeline.stop()
+
+    async def handle_control(self, layer, channel):
+        """Apply control messages sent by the web workers: ingested readings, weather overrides and debugging."""
+        while True:
+            message = await layer.receive(channel)
+            try:
+                apply_control(message)
+            except Exception:
+                # One bad message must not end the loop, later control traffic would be ignored
+                logger.exception("Failed to apply control message", extra={"message_type": message.get("type")})
+
+
+def apply_control(message):
+    """Apply one control message in this process."""
+    if message.get("type") == "sensor.readings":
+        external_sensors.record(message["summary"])
+    elif message.get("type") == "debug.profile":
+        try:
+            paths = start_profile(settings.PROFILE_DIR, message["seconds"])
+            logger.info("Profiling sensor service", extra={"seconds": message["seconds"], **paths})
+        except RuntimeError as e:
+            logger.warning("Ignoring profile request: %s", e)
+    elif message.get("type") == "debug.tracing":
+        if message.get("enabled"):
+            tracer.enable(message.get("seconds"))
+        else:
+            tracer.disable()
+        logger.info("Tracing switched", extra={"enabled": tracer.enabled})
+    elif message.get("type") == "weather.override":
+        try:
+            table = weighting.set_override(message.get("conditions"))
+            logger.info("Weather weighting switched", extra=table.to_dict())
+        except ValueError as e:
+            logger.warning("Ignoring weather override: %s", e)
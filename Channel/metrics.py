@@ -0,0 +1,300 @@
+import bisect
+import os
+import threading
+import time
+
+import numpy as np
+import psutil
+
+# Latency buckets in seconds, from sub-millisecond DSP up to slow uploads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def summarize_latencies(samples):
+    """Return count, mean and tail percentiles (in milliseconds) for latencies in seconds."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": len(samples),
+        "mean": round(float(ms.mean()), 3),
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(ms.max()), 3),
+    }
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        """Return the child for a label set. Cache the result on hot paths."""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        self._children.pop(tuple(str(v) for v in values), None)
+
+    def _default(self):
+        # Metrics without labels behave like their own single child
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        # += is a read-modify-write, updates from worker threads would otherwise get lost
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def render(self, name, labelnames, key):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, ('le', _format_value(float(bound))))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {total!r}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._process = psutil.Process(os.getpid())
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def _process_lines(self):
+        # Sampled at scrape time only, so the hot path pays nothing for these
+        with self._process.oneshot():
+            cpu = self._process.cpu_times()
+            rss = self._process.memory_info().rss
+            threads = self._process.num_threads()
+        return [
+            "# HELP process_cpu_seconds_total Total user and system CPU time spent in seconds.",
+            "# TYPE process_cpu_seconds_total counter",
+            f"process_cpu_seconds_total {cpu.user + cpu.system!r}",
+            "# HELP process_resident_memory_bytes Resident memory size in bytes.",
+            "# TYPE process_resident_memory_bytes gauge",
+            f"process_resident_memory_bytes {rss}",
+            "# HELP process_threads Number of OS threads in the process.",
+            "# TYPE process_threads gauge",
+            f"process_threads {threads}",
+        ]
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = self._process_lines()
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "codecrafters_stage_latency_seconds",
+    "Time spent in each pipeline stage.",
+    ["stage"],
+))
+CAMERA_FPS = REGISTRY.register(Gauge(
+    "codecrafters_camera_fps",
+    "Achieved frames processed per second, per camera.",
+    ["camera"],
+))
+FRAMES_PROCESSED = REGISTRY.register(Counter(
+    "codecrafters_frames_processed_total",
+    "Frames that went through detection, per camera.",
+    ["camera"],
+))
+FRAMES_SKIPPED = REGISTRY.register(Counter(
+    "codecrafters_frames_skipped_total",
+    "Frames that could not be read or processed, per camera.",
+    ["camera"],
+))
+FRAMES_DROPPED = REGISTRY.register(Counter(
+    "codecrafters_frames_dropped_total",
+    "Frames deliberately dropped because detection had not caught up, per camera.",
+    ["camera"],
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "codecrafters_queue_depth",
+    "Items waiting in internal queues (uploads, detection_tasks, detection_results).",
+    ["queue"],
+))
+CONNECTED_CLIENTS = REGISTRY.register(Gauge(
+    "codecrafters_connected_clients",
+    "Open WebSocket connections.",
+))
+PREVIEW_VIEWERS = REGISTRY.register(Gauge(
+    "codecrafters_preview_viewers",
+    "Open live-preview streams, per camera.",
+    ["camera"],
+))
+SCHEDULER_SETTING = REGISTRY.register(Gauge(
+    "codecrafters_scheduler_setting",
+    "Current adaptive scheduler settings (fps, imgsz, audio_hop, overloaded), per camera.",
+    ["camera", "setting"],
+))
+INGEST_READINGS = REGISTRY.register(Counter(
+    "codecrafters_ingest_readings_total",
+    "External sensor readings received, per result (accepted, rejected, rate_limited).",
+    ["result"],
+))
+ALERTS_SENT = REGISTRY.register(Counter(
+    "codecrafters_alerts_total",
+    "Alerts sent to clients, per alert type.",
+    ["type"],
+))
+
+# Pre-bound children for the hot paths
+CAPTURE_LATENCY = STAGE_LATENCY.labels("capture")
+INFERENCE_LATENCY = STAGE_LATENCY.labels("inference")
+FIRE_LATENCY = STAGE_LATENCY.labels("fire")
+PREVIEW_LATENCY = STAGE_LATENCY.labels("preview")
+AUDIO_DSP_LATENCY = STAGE_LATENCY.labels("audio_dsp")
+THERMAL_LATENCY = STAGE_LATENCY.labels("thermal")
+VIBRATION_LATENCY = STAGE_LATENCY.labels("vibration")
+SCORING_LATENCY = STAGE_LATENCY.labels("scoring")
+SERIALISE_LATENCY = STAGE_LATENCY.labels("serialise")
+SEND_LATENCY = STAGE_LATENCY.labels("send")
+UPLOAD_LATENCY = STAGE_LATENCY.labels("upload")
+INGEST_LATENCY = STAGE_LATENCY.labels("ingest")
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(max_length=8)),
+                ('location', models.CharField(max_length=128)),
+                ('start', models.BigIntegerField()),
+                ('assessments', models.PositiveIntegerField(default=0)),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('alerts', models.JSONField(default=dict)),
+                ('severities', models.JSONField(default=dict)),
+                ('person_total', models.FloatField(default=0)),
+                ('person_samples', models.PositiveIntegerField(default=0)),
+                ('peak_frequency', models.FloatField(null=True)),
+                ('peak_bof_intensity', models.FloatField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resolution', 'start'], name='Channel_ale_resolut_aad2b9_idx')],
+                'constraints': [models.UniqueConstraint(fields=('resolution', 'location', 'start'), name='unique_alert_bucket')],
+            },
+        ),
+    ]
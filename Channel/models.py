@@ -1,3 +1,35 @@
 from django.db import models
 
-# Create your models here.
+
+class AlertBucket(models.Model):
+    """One location's threat assessments over one rollup bucket, merged in by AlertRollup.flush()."""
+
+    resolution = models.CharField(max_length=8)
+    location = models.CharField(max_length=128)
+    start = models.BigIntegerField()  # Bucket start, epoch seconds
+    assessments = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    alerts = models.JSONField(default=dict)  # {alert type: count}
+    severities = models.JSONField(default=dict)  # {severity: count}
+    person_total = models.FloatField(default=0)
+    person_samples = models.PositiveIntegerField(default=0)
+    peak_frequency = models.FloatField(null=True)
+    peak_bof_intensity = models.FloatField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["resolution", "location", "start"], name="unique_alert_bucket"),
+        ]
+        indexes = [models.Index(fields=["resolution", "start"])]
+
+    def to_dict(self):
+        return {
+            "start": self.start,
+            "assessments": self.assessments,
+            "sent": self.sent,
+            "alerts": dict(self.alerts),
+            "severities": dict(self.severities),
+            "avgPersons": round(self.person_total / self.person_samples, 2) if self.person_samples else None,
+            "peakFrequency": self.peak_frequency,
+            "peakBofIntensity": self.peak_bof_intensity,
+        }
@@ -0,0 +1,928 @@
+import json
+import logging
+import asyncio
+import datetime
+import random
+import time
+from django.conf import settings
+from .main2 import detect_frame
+from .bof import simulate_bof_response
+from .audio import AudioFrequencyDetector
+from .upload import uploadImage
+from .rollups import rollups
+from .weighting import weighting
+from . import metrics
+from .logs import SampledLogger
+from .tracing import tracer
+from .video import open_video_source
+from .workers import get_detection_pool
+from .scheduler import scheduler_for_camera
+from .fusion import SensorFusion
+from .ingest import ALARM_LEVELS, external_sensors
+from .thermal import thermal_stage_from_settings
+from .vibration import vibration_stage_from_settings
+from .zones import ZoneDwell
+from .detlog import claim_detection_log, release_detection_log
+from api.weather import WeatherUnavailable, get_weather_service
+
+logger = logging.getLogger(__name__)
+sampled = SampledLogger(logger)
+
+# Channel layer groups used when the pipelines run as a separate service
+ALERTS_GROUP = "sensor_alerts"
+CONTROL_GROUP = "sensor_control"
+
+
+async def stay_in_group(layer, group, channel):
+    """
+    Keep `channel` in `group`, which it has already joined, until cancelled.
+
+    Channel layers drop a membership `group_expiry` seconds (a day by
+    default) after it was added, so long-lived members re-add themselves
+    every half expiry.
+    """
+    interval = getattr(layer, "group_expiry", 86400) / 2
+    while True:
+        await asyncio.sleep(interval)
+        await layer.group_add(group, channel)
+
+# The running pipeline that records each camera's rollups. Embedded pipelines run one per client
+# and camera, so only one of them counts each assessment; another takes over when it stops.
+_rollup_owners = {}
+
+class SensorPipeline:
+    """
+    Sensor capture, detection and threat assessment for one camera.
+
+    Independent of any WebSocket connection: every alert is serialised once
+    and handed to `emit`, an async callable taking the JSON text. A consumer
+    can run one for itself, or the run_sensors command can run them as a
+    separate service that publishes to the channel layer.
+    """
+
+    def __init__(self, emit, camera_id=None, camera_config=None, with_audio=True, with_bof=True,
+                 with_thermal=True, with_vibration=True):
+        self.emit = emit
+        self.alert_counter = 0
+        self.frequency = None
+        self.bof_data = None
+        self.camera_data = None
+        self.imgCount = 1
+        self.last_alert_time = None
+        self.last_alert_type = None
+        self.threat_cooldown = 30  # Seconds to wait before sending another alert of the same type
+        self.high_threat_cooldown = 10  # Shorter cooldown for high threats
+        self.pending_threats = []  # Queue to store pending threats for evaluation
+        self.camera = None
+        # Defaults to the first configured camera
+        if camera_id is None:
+            camera_id, camera_config = next(iter(settings.CAMERAS.items()))
+        self.camera_id = camera_id
+        self.camera_config = camera_config if camera_config is not None else settings.CAMERAS[camera_id]
+        self.location = self.camera_config.get("location", "West Gate")
+        self.with_audio = with_audio
+        self.with_bof = with_bof
+        self.with_thermal = with_thermal
+        self.with_vibration = with_vibration
+        self.thermal_data = None  # Latest result per thermal sensor
+        self.vibration_data = None  # Latest result per accelerometer
+        self.last_frame = None  # Most recent frame that went through detection
+        self.detected_at = None  # When that detection's frame was captured
+        self.detected_frame = None  # Trace id of that frame, "<camera>-<seq>"
+        self.zone_dwell = ZoneDwell(self.camera_config.get("zones") or [])
+        self.scheduler = scheduler_for_camera(self.camera_id, self.camera_config)
+        self.fusion = SensorFusion()
+        self.detection_pool = None  # Set when detection runs in worker processes
+        self.detection_log = None  # Set while this pipeline records the camera's detection log
+        self.tasks = []
+
+    async def start(self):
+        """Open the sensors and start the capture, detection and evaluation tasks"""
+        if settings.SENSOR_SOURCE == "synthetic":
+            # Stand-in sensors for load testing, no hardware is opened
+            self.tasks.append(asyncio.create_task(self.process_synthetic()))
+            return
+        
+        # Only the first pipeline of a camera records its detections
+        self.detection_log = await asyncio.to_thread(claim_detection_log, self.camera_id, self)
+        
+        if settings.DETECTION_WORKERS > 0:
+            # Capture and inference run in worker processes, this pipeline only reads results
+            self.detection_pool = await asyncio.to_thread(get_detection_pool)
+            self.tasks.append(asyncio.create_task(self.process_pool_results()))
+        else:
+            await self.initialize_camera()
+            self.tasks.append(asyncio.create_task(self.process_camera_feed()))
+        
+        if self.with_bof:
+            self.tasks.append(asyncio.create_task(self.process_bof()))
+        if self.with_audio:
+            self.tasks.append(asyncio.create_task(self.process_micro()))
+        if self.with_thermal and settings.THERMAL_SENSORS:
+            self.tasks.append(asyncio.create_task(self.process_thermal()))
+        if self.with_vibration and settings.VIBRATION_SENSORS:
+            self.tasks.append(asyncio.create_task(self.process_vibration()))
+        
+        self.tasks.append(asyncio.create_task(self.evaluate_threats()))
+        self.tasks.append(asyncio.create_task(self.process_weather()))
+
+    async def stop(self):
+        """Cancel all tasks and release the camera"""
+        for task in self.tasks:
+            try:
+                task.cancel()
+            except Exception as e:
+                logger.error("Error cancelling task: %s", e)
+        
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        
+        await self.release_camera()
+        self.tasks.clear()
+        if _rollup_owners.get(self.camera_id) is self:
+            del _rollup_owners[self.camera_id]
+        self.scheduler.close()
+        if self.detection_log is not None:
+            # Joins the log's writer thread and writes what is left
+            await asyncio.to_thread(release_detection_log, self.camera_id, self)
+            self.detection_log = None
+
+    async def initialize_camera(self):
+        max_attempts = 3
+        for attempt in range(max_attempts):
+            try:
+                if self.camera:
+                    await asyncio.to_thread(self.camera.release)
+                
+                # Opening a device or stream can take seconds, keep it off the event loop
+                self.camera = await asyncio.to_thread(
+                    open_video_source,
+                    self.camera_config["source"],
+                    name=self.camera_id,
+                    pacing=self.camera_config.get("pacing", "realtime"),
+                    fps=self.camera_config.get("fps", 10.0),
+                    loop=self.camera_config.get("loop", False),
+                )
+                if not self.camera.isOpened():
+                    raise Exception("Failed to open camera")
+                
+                ret, _ = await asyncio.to_thread(self.camera.read, 5.0)
+                if not ret:
+                    raise Exception("Camera opened but can't read frames")
+                    
+                logger.info("Camera initialized successfully")
+                return True
+            except Exception as e:
+                logger.warning("Camera initialization error (attempt %d/%d): %s", attempt + 1, max_attempts, e)
+                if self.camera:
+                    await asyncio.to_thread(self.camera.release)
+                    self.camera = None
+                await asyncio.sleep(1)
+        
+        logger.error("Failed to initialize camera after multiple attempts")
+        return False
+
+    async def release_camera(self):
+        if self.camera:
+            try:
+                await asyncio.to_thread(self.camera.release)
+                result = not self.camera.isOpened()
+                if result:
+                    logger.info("Camera successfully released")
+                else:
+                    logger.warning("Camera may not have been properly released")
+                self.camera = None
+                return result
+            except Exception as e:
+                logger.error("Camera release error: %s", e)
+                return False
+        return True
+
+    def update_detection(self, result, frame=None, at=None, frame_id=None):
+        """Take a new detection result for this camera, track zone dwell times and log it"""
+        boxes = result.get("person boxes")
+        if boxes is not None:
+            # A copy, pool results are shared by every pipeline of the camera
+            result = {key: value for key, value in result.items() if key != "person boxes"}
+        self.camera_data = result
+        self.detected_frame = frame_id
+        if frame is not None:
+            self.last_frame = frame
+        self.detected_at = time.time() if at is None else at
+        if self.detection_log is not None:
+            seq = int(frame_id.rsplit("-", 1)[1]) if frame_id else 0
+            self.detection_log.append(self.detected_at, result, boxes, self.frequency, seq)
+        self.zone_dwell.update(result.get("zone breaches") or {}, self.detected_at)
+        self.fusion.observe_detection(result, self.detected_at)
+
+    def update_audio(self, frequency, at=None):
+        """Take a new dominant audio frequency"""
+        self.frequency = frequency
+        self.fusion.observe_audio(frequency, time.time() if at is None else at)
+
+    def update_bof(self, event, at=None):
+        """Take a new BOF event"""
+        self.bof_data = event
+        self.fusion.observe_bof(event, time.time() if at is None else at)
+
+    def update_thermal(self, results, at=None):
+        """Take new results from the thermal sensors, keyed by sensor id"""
+        self.thermal_data = results
+        self.fusion.observe_thermal(results, time.time() if at is None else at)
+
+    def update_vibration(self, results, at=None):
+        """Take new results from the accelerometers, keyed by sensor id"""
+        self.vibration_data = results
+        self.fusion.observe_vibration(results, time.time() if at is None else at)
+
+    def calculate_threat_score(self, alert_data, weights=None):
+        """Calculate a numerical threat score to prioritize alerts, weighted for current weather"""
+        if weights is None:
+            weights = weighting.current
+        score = 0
+        
+        # Base score from overall severity
+        severity_scores = {"none": 0, "low": 20, "medium": 50, "high": 80}
+        score += severity_scores.get(alert_data["severity"], 0)
+        
+        # Readings held in the fusion windows, not just the latest frame
+        fusion = alert_data["sensorData"]["fusion"]
+        held = fusion["sensors"]
+        
+        # Add points for specific threats - INCREASED WEIGHTAGE FOR WEAPONS
+        if "knife" in held:
+            score += 150 * weights["weapon"]  # Highest priority for knife detection
+        
+        if "scissors" in held:
+            score += 120 * weights["weapon"]  # High priority for scissors
+            
+        if "fire" in held:
+            score += 130 * weights["fire"]  # High priority for fire
+        elif "smoke" in held:
+            score += 60 * weights["fire"]  # Smoke without visible flames
+            
+        # Restricted zones, more the longer someone stays inside
+        for breach in alert_data["sensorData"]["video"].get("zones", []):
+            score += (100 if breach["dwell"] >= 30 else 70) * weights["zone"]
+        
+        # Thermal hot spots, more when they are heating up fast
+        if "thermal" in held:
+            score += 70 * weights["thermal"]
+        if "thermal_rise" in held:
+            score += 40 * weights["thermal"]
+        
+        if "vibration" in held:
+            score += 40 * weights["vibration"]
+        
+        # MEDIUM PRIORITY FOR CROWD
+        if "crowd" in held:
+            score += 60 * weights["crowd"]  # Medium priority for crowding
+        
+        # Sensors agreeing within seconds of each other are far more telling than either alone
+        if "weapon_audio" in fusion["correlated"]:
+            score += 60 * weights["weapon"]
+        if "weapon_gunshot" in fusion["correlated"]:
+            score += 80 * weights["bof"]
+        if "crowd_audio" in fusion["correlated"]:
+            score += 30 * weights["crowd"]
+        if "fire_thermal" in fusion["correlated"]:
+            score += 50 * weights["thermal"]
+        
+        # LOWER PRIORITY FOR BOF
+        if alert_data["sensorData"]["bof"]:
+            bof_type = alert_data["sensorData"]["bof"].get("Event Type", "")
+            bof_intensity = float(alert_data["sensorData"]["bof"].get("Intensity (dB)", 0))
+            
+            if "explosion" in bof_type.lower():
+                score += 70 * weights["bof"]  # Still relatively high for explosions
+            elif "gunshot" in bof_type.lower():
+                score += 70 * weights["bof"]  # Still relatively high for gunshots
+            elif bof_intensity > 70:
+                score += 40 * weights["bof"]  # Medium-low priority
+            elif bof_intensity > 40:
+                score += 20 * weights["bof"]  # Low priority
+        
+        # Audio frequency detection
+        # Audio frequency detection in calculate_threat_score method
+        if alert_data["sensorData"]["audio"]["frequency"]:
+            try:
+                freq = float(alert_data["sensorData"]["audio"]["frequency"])
+                if freq > 2000:
+                    score += 30 * weights["audio"]  # Higher impact for very high frequencies
+                elif freq > 1200:
+                    score += 20 * weights["audio"]  # Medium-high impact
+                elif freq > 700:  # LOWERED THRESHOLD FROM 1500 to 700
+                    score += 15 * weights["audio"]  # Medium impact for frequencies above 700 Hz
+            except (ValueError, TypeError):
+                pass
+
+        
+        return round(score, 1)
+
+    def create_threat_alert(self, now=None):
+        """Create an alert with threat assessment from the sensor readings fused up to `now`"""
+        # Read the active weight table once so the whole assessment uses one consistent set
+        weights = weighting.current
+        weather = {
+            "temp": weights.temp,
+            "conditions": weights.condition,
+            "source": weights.source
+        }
+        
+        # Every reading counts for its sensor's horizon, so stale readings drop out and short ones are not missed
+        if now is None:
+            now = time.time()
+        fused = self.fusion.snapshot(now)
+        held = fused["sensors"]
+        # Readings pushed through the ingest endpoints count like the local stages once they reach the alarm level
+        external = external_sensors.snapshot(now, self.location)
+        for sensor, reading in external.items():
+            if reading["max"] >= ALARM_LEVELS[sensor]:
+                local = held.get(sensor)
+                held[sensor] = reading if local is None else {
+                    "count": local["count"] + reading["count"],
+                    "max": max(local["max"], reading["max"]),
+                    "age": min(local["age"], reading["age"]),
+                }
+        frequency = held["audio"]["max"] if "audio" in held else None
+        bof_data = self.fusion.latest("bof")
+        
+        alert_types, descriptions, severities = [], [], []
+        frame = None
+        threat_details = []
+        zone_breaches = []
+        
+        # Reuse the last analysed frame for potential upload instead of reading the camera again.
+        # Pooled frames stay in shared memory until an alert is actually uploaded.
+        frame = self.last_frame
+        
+        # Process camera data
+        if self.camera_data:
+            is_crowded = "crowd" in held
+            is_fire = "fire" in held
+            is_smoke = "smoke" in held
+            
+            if is_crowded:
+                alert_types.append("crowd")
+                descriptions.append("Crowd detected. ")
+                severities.append("medium")
+                threat_details.append({"type": "crowd", "severity": "medium"})
+
+            if is_fire:
+                alert_types.append("fire")
+                descriptions.append("Fire detected. ")
+                severities.append("high")
+                threat_details.append({"type": "fire", "severity": "high"})
+            elif is_smoke:
+                alert_types.append("fire")
+                descriptions.append("Smoke detected. ")
+                severities.append("medium")
+                threat_details.append({"type": "fire", "severity": "medium", "object": "smoke"})
+            
+            # Dwell is measured up to the latest detection, not to now
+            zone_breaches = self.zone_dwell.active(self.detected_at) if self.detected_at is not None else []
+            for breach in zone_breaches:
+                alert_types.append("zone_breach")
+                descriptions.append(f"Restricted zone {breach['zone']} breached for {breach['dwell']:.0f}s. ")
+                severities.append(breach["severity"])
+                threat_details.append({"type": "zone_breach", **breach})
+            
+            if "knife" in held:
+                alert_types.append("weapon")
+                descriptions.append("Knife detected. ")
+                severities.append("high")
+                threat_details.append({"type": "weapon", "severity": "high", "object": "knife"})
+                
+            if "scissors" in held:
+                alert_types.append("weapon")
+                descriptions.append("Scissors detected. ")
+                severities.append("high")
+                threat_details.append({"type": "weapon", "severity": "high", "object": "scissors"})
+        
+        # Process thermal data
+        if "thermal" in held or "thermal_rise" in held:
+            hotspot = self.fusion.latest("thermal") or self.fusion.latest("thermal_rise") or {}
+            rising = "thermal_rise" in held
+            alert_types.append("thermal")
+            if "thermal" in held:
+                temperature = held["thermal"]["max"]
+                descriptions.append(f"Hot spot of {temperature:.0f} °C{', rising fast' if rising else ''}. ")
+                severity = "high"
+            else:
+                temperature = hotspot.get("max temp")
+                descriptions.append(f"Temperature rising at {held['thermal_rise']['max']:.1f} °C/s. ")
+                severity = "medium"
+            severities.append(severity)
+            threat_details.append({
+                "type": "thermal",
+                "severity": severity,
+                "temperature": temperature,
+                "rising": rising,
+                "sensor": hotspot.get("sensor"),
+            })
+        
+        # Process vibration data
+        if "vibration" in held:
+            shaking = self.fusion.latest("vibration") or {}
+            alert_types.append("vibration")
+            descriptions.append(f"Vibration of {held['vibration']['max']:.2f} g RMS. ")
+            severities.append("medium")
+            threat_details.append({
+                "type": "vibration",
+                "severity": "medium",
+                "rms": held["vibration"]["max"],
+                "bands": shaking.get("exceeded bands", []),
+                "sensor": shaking.get("sensor"),
+            })
+        
+        # Process BOF data
+        if bof_data:
+            bof_type = bof_data.get("Event Type", "unknown")
+            bof_intensity = float(bof_data.get("Intensity (dB)", 0))
+            
+            alert_types.append("anomaly")
+            descriptions.append(f"BOF {bof_type} detected. ")
+            
+            if bof_intensity > 70:
+                severity = "high"
+            elif bof_intensity > 20:
+                severity = "medium"
+            else:
+                severity = "low"
+                
+            severities.append(severity)
+            threat_details.append({
+                "type": "bof", 
+                "event": bof_type, 
+                "intensity": bof_intensity,
+                "severity": severity
+            })
+        
+        # Process audio frequency data
+        if frequency and frequency > 0:
+            try:
+                freq = float(frequency)
+                if freq > 700:  # LOWERED THRESHOLD FROM 1500 to 700
+                    alert_types.append("audio_anomaly")
+                    descriptions.append(f"Unusual audio frequency: {freq:.1f} Hz. ")
+                    
+                    if freq > 2000:  # Kept high threshold for "high" severity
+                        severity = "high"
+                    elif freq > 1200:  # Medium-high severity
+                        severity = "medium-high"
+                    else:  # Medium severity for frequencies between 700-1200
+                        severity = "medium"
+                        
+                    severities.append(severity)
+                    threat_details.append({
+                        "type": "audio", 
+                        "frequency": freq,
+                        "severity": severity
+                    })
+            except ValueError:
+                pass
+        
+        audio_severity = "none"
+        if frequency and frequency > 0:
+            freq = float(frequency) if isinstance(frequency, (int, float, str)) else 0
+            if freq > 2000:
+                audio_severity = "high"
+            elif freq > 1200:
+                audio_severity = "medium-high"
+            elif freq > 700:  # LOWERED THRESHOLD FROM 1500 to 700
+                audio_severity = "medium"
+            elif freq > 0:
+                audio_severity = "low"
+
+        # Calculate overall severity
+        severity_weights = {"none": 0, "low": 0.3, "medium": 0.6, "high": 0.9}
+        
+        if not severities:
+            overall_severity = "none"
+        else:
+            avg_weight = sum(severity_weights.get(s.lower(), 0) for s in severities) / len(severities)
+            
+            if avg_weight >= 0.7:
+                overall_severity = "high"
+            elif avg_weight >= 0.4:
+                overall_severity = "medium"
+            elif avg_weight > 0:
+                overall_severity = "low"
+            else:
+                overall_severity = "none"
+        
+        # Determine audio severity for the sensor data section
+        audio_severity = "none"
+        if frequency and frequency > 0:
+            freq = float(frequency) if isinstance(frequency, (int, float, str)) else 0
+            if freq > 2500:
+                audio_severity = "high"
+            elif freq > 1500:
+                audio_severity = "medium"
+            elif freq > 0:
+                audio_severity = "low"
+        
+        # Create the alert object
+        alert = {
+            "type": alert_types or ["none"],
+            "severity": overall_severity,
+            "timestamp": datetime.datetime.now().isoformat(),
+            "location": self.location,
+            "description": "".join(descriptions) or "No alerts detected.",
+            "sensorData": {
+                "video": {"active": self.detection_pool is not None or (self.camera is not None and self.camera.isOpened()), "detection": self.camera_data, "zones": zone_breaches},
+                "bof": bof_data,
+                "audio": {"frequency": frequency, "severity": audio_severity},
+                "vibration": "vibration" in held,
+                "thermal": "thermal" in held or "thermal_rise" in held,
+                "external": external,
+                "weather": weather,
+                "fusion": fused
+            },
+            "status": "unresolved",
+            "thumbnail": "/api/placeholder/300/200",
+            "threatDetails": threat_details
+        }
+        
+        # Calculate threat score
+        threat_score = self.calculate_threat_score(alert, weights)
+        
+        # Check for weapons and fire as critical threats
+        has_weapon = "knife" in held or "scissors" in held
+        has_fire = "fire" in held or ("thermal" in held and "thermal_rise" in held)
+        
+        return {
+            "alert": alert,
+            "frame": frame,
+            "threat_score": threat_score,
+            "has_critical_threat": has_weapon or has_fire or overall_severity == "high",
+            "threat_type": "+".join(alert_types) if alert_types else "none"
+        }
+
+    def should_send_alert(self, threat_data, current_time):
+        """Decide whether an assessment is worth sending, honouring the cooldowns"""
+        threat_score = threat_data["threat_score"]
+        threat_type = threat_data["threat_type"]
+        
+        # Always send critical threats (but respect cooldown)
+        if threat_data["has_critical_threat"]:
+            if self.last_alert_time is None or (current_time - self.last_alert_time).total_seconds() > self.high_threat_cooldown:
+                logger.warning("Critical threat detected", extra={"score": threat_score, "threat_type": threat_type})
+                return True
+        # For non-critical, use a higher threshold and longer cooldown
+        elif threat_score >= 50:  # Medium or higher threat
+            if (self.last_alert_time is None or 
+                (current_time - self.last_alert_time).total_seconds() > self.threat_cooldown or
+                (threat_type != self.last_alert_type)):  # Different type of threat
+                logger.info("Significant threat detected", extra={"score": threat_score, "threat_type": threat_type})
+                return True
+        return False
+
+    async def dispatch_alert(self, threat_data, current_time, upload=True):
+        """Upload the evidence frame and send the alert to the client"""
+        alert = threat_data["alert"]
+        frame = threat_data["frame"]
+        threat_score = threat_data["threat_score"]
+        threat_type = threat_data["threat_type"]
+        trace_id = threat_data.get("trace_id")
+        
+        # Upload image for significant threats, only critical ones while the host is overloaded
+        upload = upload and self.scheduler.upload_allowed(threat_data["has_critical_threat"])
+        if upload and frame is None and self.detection_pool is not None:
+            frame = self.detection_pool.snapshot(self.camera_id)
+        if upload and frame is not None:
+            logger.info("Uploading image for threat", extra={"score": threat_score})
+            # Upload on a worker thread so the event loop keeps serving other clients
+            upload_depth = metrics.QUEUE_DEPTH.labels("uploads")
+            upload_depth.inc()
+            try:
+                with tracer.span("upload", alert=trace_id, camera=self.camera_id):
+                    wc_url = await asyncio.to_thread(uploadImage, frame, f"threat_{self.imgCount}")
+            finally:
+                upload_depth.dec()
+            self.imgCount += 1
+            if wc_url:
+                alert['thumbnail'] = wc_url
+                logger.info("Image uploaded: %s", wc_url)
+        
+        # Add threat score to the alert
+        alert['threatScore'] = threat_score
+        
+        # Send the alert
+        with metrics.SERIALISE_LATENCY.time(), tracer.span("serialise", alert=trace_id, camera=self.camera_id):
+            payload = json.dumps({
+                'type': 'alert',
+                'data': alert
+            })
+        with metrics.SEND_LATENCY.time(), tracer.span("send", alert=trace_id, camera=self.camera_id):
+            await self.emit(payload)
+        for alert_type in alert["type"]:
+            metrics.ALERTS_SENT.labels(alert_type).inc()
+        
+        # Update tracking variables
+        self.last_alert_time = current_time
+        self.last_alert_type = threat_type
+        logger.info("Alert sent", extra={"score": threat_score, "threat_type": threat_type})
+
+    async def evaluate_once(self, upload=True, now=None):
+        """Run one assessment through scoring, the send decision and the rollups"""
+        # Create a threat assessment, traced back to the frame whose detection it used
+        trace_id = tracer.new_id() if tracer.enabled else None
+        with metrics.SCORING_LATENCY.time(), tracer.span("scoring", alert=trace_id, frame=self.detected_frame,
+                                                         camera=self.camera_id):
+            threat_data = self.create_threat_alert(now)
+        if trace_id is not None:
+            threat_data["trace_id"] = threat_data["alert"]["traceId"] = trace_id
+        self.scheduler.set_critical(threat_data["has_critical_threat"])
+        
+        # Cooldowns follow the assessment's clock, so replays of recorded time behave as live
+        current_time = datetime.datetime.now() if now is None else datetime.datetime.fromtimestamp(now)
+        should_send = self.should_send_alert(threat_data, current_time)
+        
+        # Send the alert if it meets our criteria
+        if should_send:
+            await self.dispatch_alert(threat_data, current_time, upload=upload)
+        elif threat_data["threat_score"] > 0:
+            # For debugging - show what was detected but not sent
+            threat_type = threat_data["threat_type"]
+            sampled.debug(f"unsent:{threat_type}", "Threat detected but not sent",
+                          score=threat_data["threat_score"], threat_type=threat_type)
+        
+        # Fold this assessment into the dashboard rollups, once per camera and only for live pipelines
+        if self.tasks and _rollup_owners.setdefault(self.camera_id, self) is self:
+            rollups.record(threat_data["alert"], sent=should_send)
+        return threat_data, should_send
+
+    async def evaluate_threats(self):
+        """Continuously evaluate threats and only send the most severe ones"""
+        try:
+            while True:
+                start = time.perf_counter()
+                await self.evaluate_once()
+                self.scheduler.observe("evaluate", time.perf_counter() - start)
+                self.scheduler.tick()
+                
+                # Wait before next evaluation, sooner while a critical threat is active
+                await asyncio.sleep(self.scheduler.evaluate_interval())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Threat evaluation error: %s", e)
+
+    async def process_camera_feed(self):
+        try:
+            frame_count = 0
+            frame_seq = 0
+            consecutive_errors = 0
+            max_consecutive_errors = 5
+            
+            capture_latency = metrics.CAPTURE_LATENCY
+            inference_latency = metrics.INFERENCE_LATENCY
+            frames_processed = metrics.FRAMES_PROCESSED.labels(self.camera_id)
+            frames_skipped = metrics.FRAMES_SKIPPED.labels(self.camera_id)
+            camera_fps = metrics.CAMERA_FPS.labels(self.camera_id)
+            fps_window_start = time.perf_counter()
+            fps_window_frames = 0
+            
+            while True:
+                loop_start = time.perf_counter()
+                if not self.camera:
+                    sampled.warning("camera-missing", "Camera not initialized")
+                    await asyncio.sleep(1)
+                    await self.initialize_camera()
+                    continue
+                    
+                if not self.camera.isOpened():
+                    sampled.warning("camera-closed", "Camera not opened")
+                    if not await self.initialize_camera():
+                        await asyncio.sleep(2)
+                        continue
+                
+                try:
+                    start = time.perf_counter()
+                    # Waits for the decode thread's next frame without blocking the event loop
+                    ret, frame = await asyncio.to_thread(self.camera.read)
+                    elapsed = time.perf_counter() - start
+                    capture_latency.observe(elapsed)
+                    frame_seq += 1
+                    frame_id = f"{self.camera_id}-{frame_seq}"
+                    tracer.record("capture", elapsed, frame=frame_id, camera=self.camera_id)
+                    if not ret:
+                        frames_skipped.inc()
+                        consecutive_errors += 1
+                        logger.warning("Failed to read frame. Consecutive errors: %d", consecutive_errors)
+                        
+                        if consecutive_errors >= max_consecutive_errors:
+                            logger.warning("Too many consecutive errors, reinitializing camera...")
+                            await self.release_camera()
+                            await asyncio.sleep(1)
+                            await self.initialize_camera()
+                            consecutive_errors = 0
+                        
+                        await asyncio.sleep(1)
+                        continue
+                    
+                    consecutive_errors = 0
+                    
+                    start = time.perf_counter()
+                    # Inference on a worker thread so the event loop keeps serving clients meanwhile
+                    result = await asyncio.to_thread(detect_frame, frame, self.camera_id, imgsz=self.scheduler.imgsz)
+                    now = time.perf_counter()
+                    inference_latency.observe(now - start)
+                    tracer.record("inference", now - start, frame=frame_id, camera=self.camera_id)
+                    self.scheduler.observe("inference", now - start)
+                    self.scheduler.tick()
+                    frame_count += 1
+                    frames_processed.inc()
+                    
+                    fps_window_frames += 1
+                    if now - fps_window_start >= 1.0:
+                        camera_fps.set(round(fps_window_frames / (now - fps_window_start), 2))
+                        fps_window_start, fps_window_frames = now, 0
+                    
+                    if result:
+                        self.update_detection(result, frame, frame_id=frame_id)
+                
+                except Exception as e:
+                    logger.error("Error processing frame: %s", e)
+                    frames_skipped.inc()
+                    consecutive_errors += 1
+                    if consecutive_errors >= max_consecutive_errors:
+                        logger.warning("Too many errors, reinitializing camera...")
+                        await self.release_camera()
+                        await asyncio.sleep(1)
+                        await self.initialize_camera()
+                        consecutive_errors = 0
+                
+                # Pace to the scheduler's frame rate, counting the time this frame already took
+                await asyncio.sleep(max(0.0, self.scheduler.camera_interval() - (time.perf_counter() - loop_start)))
+        except asyncio.CancelledError:
+            await self.release_camera()
+            raise
+        except Exception as e:
+            logger.exception("Camera feed error: %s", e)
+
+    async def process_pool_results(self):
+        """Pick up the newest detection for this camera from the worker pool"""
+        try:
+            last_seq = None
+            while True:
+                latest = self.detection_pool.latest(self.camera_id)
+                if latest is not None and latest[0] != last_seq:
+                    last_seq, captured_at, result = latest
+                    self.update_detection(result, at=captured_at, frame_id=f"{self.camera_id}-{last_seq}")
+                
+                await asyncio.sleep(0.1)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Detection pool error: %s", e)
+
+    async def process_bof(self):
+        try:
+            last_bof_time = datetime.datetime.now() - datetime.timedelta(seconds=40)  # Start ready to generate
+            bof_interval = 40  # seconds between BOF responses
+            
+            while True:
+                current_time = datetime.datetime.now()
+                time_since_last_bof = (current_time - last_bof_time).total_seconds()
+                
+                if time_since_last_bof >= bof_interval:
+                    result = await simulate_bof_response()
+                    
+                    if result:
+                        # Ages out of the assessment through the fusion window, no clearing needed
+                        self.update_bof(result)
+                        last_bof_time = current_time
+                        logger.info("BOF data updated", extra={"bof": result})
+                
+                await asyncio.sleep(1)  # Check every second, but only update every 40 seconds
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("BOF processing error: %s", e)
+
+    async def process_micro(self):
+        try:
+            # Initialize the audio detector
+            logger.info("Initializing audio detector...")
+            audio_detector = AudioFrequencyDetector()
+            logger.info("Audio detector initialized successfully")
+            
+            audio_dsp_latency = metrics.AUDIO_DSP_LATENCY
+            
+            while True:
+                try:
+                    # The read blocks for one hop, longer while the host is overloaded, so off the event loop
+                    samples = await asyncio.to_thread(audio_detector.read_hop, self.scheduler.audio_interval())
+                    start = time.perf_counter()
+                    frequency = audio_detector.analyze(samples)
+                    elapsed = time.perf_counter() - start
+                    audio_dsp_latency.observe(elapsed)
+                    tracer.record("audio_dsp", elapsed, camera=self.camera_id)
+                    self.scheduler.observe("audio_dsp", elapsed)
+                    
+                    if frequency is not None and frequency > 0:
+                        self.update_audio(frequency)
+                        sampled.debug("audio", "Detected audio frequency: %.1f Hz", frequency)
+                    else:
+                        # If no significant frequency detected, log occasionally
+                        sampled.debug("audio-silent", "No significant audio frequency detected")
+                except Exception as e:
+                    logger.error("Error detecting audio frequency: %s", e)
+                    # Try to reinitialize the audio detector if it fails
+                    try:
+                        logger.info("Reinitializing audio detector...")
+                        audio_detector = AudioFrequencyDetector()
+                    except Exception as reinit_error:
+                        logger.error("Failed to reinitialize audio detector: %s", reinit_error)
+                    await asyncio.sleep(self.scheduler.audio_interval())
+                
+        except asyncio.CancelledError:
+            # Clean up audio resources if needed
+            if 'audio_detector' in locals() and hasattr(audio_detector, 'close'):
+                audio_detector.close()
+            raise
+        except Exception as e:
+            logger.exception("Audio processing error: %s", e)
+
+    async def process_thermal(self):
+        """Analyse all thermal sensors together, THERMAL_FPS times per second"""
+        try:
+            stage = await asyncio.to_thread(thermal_stage_from_settings)
+            thermal_latency = metrics.THERMAL_LATENCY
+            
+            while True:
+                start = time.perf_counter()
+                results = stage.poll()
+                thermal_latency.observe(time.perf_counter() - start)
+                if results:
+                    self.update_thermal(results)
+                await asyncio.sleep(stage.interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Thermal processing error: %s", e)
+
+    async def process_vibration(self):
+        """Analyse all accelerometers together, one window at a time"""
+        try:
+            stage = await asyncio.to_thread(vibration_stage_from_settings)
+            vibration_latency = metrics.VIBRATION_LATENCY
+            
+            while True:
+                start = time.perf_counter()
+                results = stage.poll()
+                vibration_latency.observe(time.perf_counter() - start)
+                if results:
+                    self.update_vibration(results)
+                await asyncio.sleep(stage.interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Vibration processing error: %s", e)
+
+    async def process_synthetic(self):
+        """Emit assessments from stand-in sensor readings at SYNTHETIC_ALERT_RATE per second"""
+        try:
+            interval = 1.0 / settings.SYNTHETIC_ALERT_RATE
+            next_at = time.perf_counter()
+            seq = 0
+            
+            while True:
+                persons = random.randint(0, 6)
+                self.update_detection({
+                    "detected objects": {"person": persons, **({"knife": 1} if random.random() < 0.1 else {})},
+                    "total persons": persons,
+                    "is crowded": persons > 1
+                })
+                self.update_audio(random.uniform(200, 2500))
+                
+                threat_data = self.create_threat_alert()
+                # Sequence numbers let the load generator measure loss, emittedAt its delivery latency
+                threat_data["alert"]["loadtest"] = {"seq": seq, "emittedAt": time.time()}
+                await self.dispatch_alert(threat_data, datetime.datetime.now(), upload=False)
+                seq += 1
+                
+                next_at += interval
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Synthetic sensor error: %s", e)
+
+    async def process_weather(self):
+        """Keep the weather weighting in sync with the cached weather feed"""
+        try:
+            while True:
+                try:
+                    data, _, _ = await get_weather_service().get(settings.WEATHER_DEFAULT_LOCATION)
+                    weighting.update_from_feed(data)
+                except WeatherUnavailable as e:
+                    logger.warning("Weather feed unavailable, keeping %s weights: %s", weighting.current.condition, e)
+                
+                await asyncio.sleep(settings.WEATHER_REFRESH_INTERVAL)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Weather processing error: %s", e)
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+
+import cv2
+
+from . import metrics
+
+# multipart/x-mixed-replace boundary for MJPEG over HTTP
+BOUNDARY = "frame"
+
+# With SENSOR_PIPELINE=service the web process has no frames to preview
+SERVICE_PREVIEW_MOVED = ("Preview runs in the run_sensors service, "
+                         "open /preview/{camera_id} on its --http-port instead")
+
+
+def mjpeg_part(jpeg):
+    """Wrap one JPEG as a part of an MJPEG multipart stream."""
+    header = f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode("ascii")
+    return header + jpeg + b"\r\n"
+
+
+class PreviewHub:
+    """
+    Latest annotated JPEG per camera, shared by every preview viewer.
+
+    Detection asks `wants(camera_id)` before drawing anything, so with no
+    viewers a frame costs nothing extra. Otherwise the frame is annotated,
+    resized to `width` and JPEG encoded once, and the same bytes are handed
+    to all viewers. Viewers always get the newest frame: a slow one skips
+    frames instead of queueing them.
+    """
+
+    def __init__(self, width=640, quality=70):
+        self.width = width
+        self.quality = quality
+        self._cond = threading.Condition()
+        self._viewers = {}
+        self._frames = {}
+        self._waiters = {}
+
+    def wants(self, camera_id):
+        return self._viewers.get(camera_id, 0) > 0
+
+    def encode(self, image):
+        h, w = image.shape[:2]
+        if w > self.width:
+            image = cv2.resize(image, (self.width, max(1, round(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return buffer.tobytes()
+
+    def publish(self, camera_id, image):
+        """Encode an annotated frame and make it the camera's current preview."""
+        with metrics.PREVIEW_LATENCY.time():
+            jpeg = self.encode(image)
+        self.publish_jpeg(camera_id, jpeg)
+
+    def publish_jpeg(self, camera_id, jpeg):
+        with self._cond:
+            seq = self._frames.get(camera_id, (0, None))[0] + 1
+            self._frames[camera_id] = (seq, jpeg)
+            waiters = list(self._waiters.get(camera_id, ()))
+            self._cond.notify_all()
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def take(self, camera_id):
+        """Remove and return the camera's current JPEG, or None."""
+        with self._cond:
+            entry = self._frames.pop(camera_id, None)
+        return entry[1] if entry else None
+
+    @contextmanager
+    def viewer(self, camera_id):
+        """Count a viewer for the duration of the block."""
+        gauge = metrics.PREVIEW_VIEWERS.labels(camera_id)
+        with self._cond:
+            self._viewers[camera_id] = self._viewers.get(camera_id, 0) + 1
+        gauge.inc()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._viewers[camera_id] -= 1
+            gauge.dec()
+
+    def wait(self, camera_id, after_seq=0, timeout=5.0):
+        """Block until a frame newer than `after_seq` exists; return (seq, jpeg) or None."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frames.get(camera_id, (0, None))[0] > after_seq, timeout):
+                return None
+            return self._frames[camera_id]
+
+    async def frames(self, camera_id):
+        """Yield the camera's JPEGs as they are published, for as long as the caller iterates."""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = (loop, event)
+        with self.viewer(camera_id):
+            with self._cond:
+                self._waiters.setdefault(camera_id, set()).add(waiter)
+            try:
+                last_seq = 0
+                while True:
+                    await event.wait()
+                    event.clear()
+                    seq, jpeg = self._frames.get(camera_id, (0, None))
+                    if seq > last_seq and jpeg is not None:
+                        last_seq = seq
+                        yield jpeg
+            finally:
+                with self._cond:
+                    self._waiters[camera_id].discard(waiter)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_preview_hub():
+    """Return the process-wide preview hub, configured from Django settings on first use."""
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                from django.conf import settings
+
+                _hub = PreviewHub(width=getattr(settings, "PREVIEW_WIDTH", 640),
+                                  quality=getattr(settings, "PREVIEW_QUALITY", 70))
+    return _hub
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class DetectionProfile:
+    """
+    What one camera detects: a class subset, per-class confidence and input size.
+
+    `classes` are class names (None for every class the model knows) and are
+    passed to the model so NMS only considers those classes. The model runs
+    at the lowest configured confidence. `filter_counts` then applies each
+    class's own threshold and counts every class with one bincount over the
+    result tensors, so post-processing cost does not grow with the number of
+    boxes.
+    """
+
+    def __init__(self, names, classes=None, conf=0.5, class_conf=None, imgsz=640):
+        self.names = names
+        ids = {name: class_id for class_id, name in names.items()}
+        class_conf = class_conf or {}
+        unknown = [name for name in list(classes or []) + list(class_conf) if name not in ids]
+        if unknown:
+            raise ValueError(f"Unknown detection classes: {', '.join(unknown)}")
+
+        self.class_ids = sorted(ids[name] for name in classes) if classes else None
+        self.conf = conf
+        self.min_conf = min([conf] + list(class_conf.values()))
+        self.imgsz = imgsz
+        self.num_classes = max(names) + 1
+
+        thresholds = np.full(self.num_classes, conf, dtype=np.float32)
+        for name, value in class_conf.items():
+            thresholds[ids[name]] = value
+        self.thresholds = thresholds
+        self._device_thresholds = {}
+
+    @classmethod
+    def from_config(cls, names, config):
+        config = config or {}
+        return cls(names, classes=config.get("classes"), conf=config.get("conf", 0.5),
+                   class_conf=config.get("class_conf"), imgsz=config.get("imgsz", 640))
+
+    def predict_kwargs(self, imgsz=None):
+        """Keyword arguments for model.predict under this profile."""
+        kwargs = {"conf": self.min_conf, "imgsz": imgsz or self.imgsz, "verbose": False}
+        if self.class_ids is not None:
+            kwargs["classes"] = self.class_ids
+        return kwargs
+
+    def _thresholds_on(self, device):
+        thresholds = self._device_thresholds.get(device)
+        if thresholds is None:
+            import torch
+            thresholds = self._device_thresholds[device] = torch.as_tensor(self.thresholds, device=device)
+        return thresholds
+
+    def filter_counts(self, boxes):
+        """
+        Apply per-class thresholds to a result's boxes.
+
+        Returns ({class name: count}, person count, person boxes as an N x 4 xyxy array).
+        """
+        import torch
+
+        cls = boxes.cls.long()
+        keep = boxes.conf >= self._thresholds_on(boxes.conf.device)[cls]
+        counts = torch.bincount(cls[keep], minlength=self.num_classes)
+        person_boxes = boxes.xyxy[keep & (cls == 0)]
+        # Counts and person boxes come back in one device-to-host copy; counts are far below 2**24, exact as float32
+        packed = torch.cat((counts.float(), person_boxes.float().flatten())).cpu().numpy()
+        counts = packed[:self.num_classes].astype(np.int64).tolist()
+        detected = {self.names.get(class_id, "Unknown"): n for class_id, n in enumerate(counts) if n}
+        return detected, counts[0], packed[self.num_classes:].reshape(-1, 4)
@@ -0,0 +1,124 @@
+import datetime
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """
+    Statistical CPU profiler for a running process.
+
+    Every `interval` seconds a background thread reads the Python stack of
+    every other thread through `sys._current_frames()` and counts each stack.
+    Nothing is installed in the profiled code, so the event loop, detection
+    threads and audio DSP keep running at their usual speed. The overhead is
+    one stack walk per thread per sample. Stacks are written in the collapsed
+    ("folded") format read by flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def sample(self, skip=()):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident in skip:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def run(self, seconds):
+        """Sample from the calling thread for `seconds`."""
+        me = {threading.get_ident()}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            self.sample(skip=me)
+            time.sleep(self.interval)
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def profile_paths(directory, prefix="profile"):
+    """Where a profile started now will be written."""
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    base = Path(directory) / f"{prefix}-{os.getpid()}-{stamp}"
+    return {
+        "cpu": str(base.with_suffix(".folded")),
+        "memory": str(base.with_suffix(".tracemalloc")),
+        "memory_top": str(base) + "-top.txt",
+    }
+
+
+def take_profile(paths, seconds=30.0, interval=0.005, memory=True, top=50):
+    """
+    Profile this process for `seconds` and write the results to `paths`.
+
+    The CPU profile samples every thread. For memory, tracemalloc is started
+    for the same window unless it is already tracing. Its snapshot
+    (loadable with tracemalloc.Snapshot.load) and the `top` allocation sites
+    therefore cover what was allocated during the window and is still alive.
+    """
+    Path(paths["cpu"]).parent.mkdir(parents=True, exist_ok=True)
+    started_tracing = False
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start(25)
+        started_tracing = True
+    try:
+        profiler = SamplingProfiler(interval)
+        profiler.run(seconds)
+        profiler.write_folded(paths["cpu"])
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            snapshot.dump(paths["memory"])
+            with open(paths["memory_top"], "w", encoding="utf-8") as f:
+                for stat in snapshot.statistics("lineno")[:top]:
+                    f.write(f"{stat}\n")
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+    logger.info("Profile written", extra={"samples": profiler.samples, **paths})
+    return paths
+
+
+_running = None
+_running_lock = threading.Lock()
+
+
+def start_profile(directory, seconds=30.0, interval=0.005, memory=True):
+    """
+    Profile this process in a background thread; return the output paths.
+
+    Only one profile runs at a time, starting another while one is running
+    raises RuntimeError.
+    """
+    global _running
+    with _running_lock:
+        if _running is not None and _running.is_alive():
+            raise RuntimeError("A profile is already running")
+        paths = profile_paths(directory)
+        _running = threading.Thread(target=take_profile, args=(paths, seconds, interval, memory),
+                                    name="profiler", daemon=True)
+        _running.start()
+    return paths
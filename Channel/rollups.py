@@ -0,0 +1,181 @@
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bucket width (seconds) and how many buckets to keep for each resolution
+RESOLUTIONS = {
+    "1m": (60, 24 * 60),     # one day of minutes
+    "1h": (3600, 7 * 24),    # one week of hours
+    "1d": (86400, 90),       # ninety days
+}
+
+
+class RollupBucket:
+    """Pre-aggregated counters for one location and one time bucket."""
+    __slots__ = ("start", "assessments", "sent", "alerts", "severities",
+                 "person_total", "person_samples", "peak_frequency", "peak_bof_intensity")
+
+    def __init__(self, start):
+        self.start = start
+        self.assessments = 0
+        self.sent = 0
+        self.alerts = {}
+        self.severities = {}
+        self.person_total = 0
+        self.person_samples = 0
+        self.peak_frequency = None
+        self.peak_bof_intensity = None
+
+    def add(self, alert_types, severity, persons, frequency, bof_intensity, sent):
+        self.assessments += 1
+        if sent:
+            self.sent += 1
+        for alert_type in alert_types:
+            self.alerts[alert_type] = self.alerts.get(alert_type, 0) + 1
+        if alert_types:
+            self.severities[severity] = self.severities.get(severity, 0) + 1
+        if persons is not None:
+            self.person_total += persons
+            self.person_samples += 1
+        if frequency is not None and (self.peak_frequency is None or frequency > self.peak_frequency):
+            self.peak_frequency = frequency
+        if bof_intensity is not None and (self.peak_bof_intensity is None or bof_intensity > self.peak_bof_intensity):
+            self.peak_bof_intensity = bof_intensity
+
+
+class AlertRollup:
+    """
+    Time-bucketed rollups of threat assessments, persisted as AlertBucket rows.
+
+    Every assessment updates an in-memory bucket per resolution holding only
+    what has not been flushed yet. A background thread merges those into
+    the table every `flush_interval` seconds, adding to the stored counters,
+    so the process recording assessments and the processes serving the read
+    API share the same rollups. Rows outside a resolution's retention are
+    deleted at flush. Reads lag recording by up to one flush interval.
+    """
+
+    def __init__(self, resolutions=RESOLUTIONS, flush_interval=None):
+        self.resolutions = resolutions
+        self.flush_interval = flush_interval
+        self._pending = {}  # (resolution, location, start) -> RollupBucket
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+
+    def record(self, alert, sent=False, now=None):
+        """Fold one assessment (the alert dict built by the pipeline) into the rollups."""
+        now = time.time() if now is None else now
+        location = alert.get("location", "unknown")
+        alert_types = [t for t in alert.get("type", []) if t != "none"]
+        severity = alert.get("severity", "none")
+
+        sensor_data = alert.get("sensorData", {})
+        detection = (sensor_data.get("video") or {}).get("detection") or {}
+        persons = detection.get("total persons")
+        frequency = _to_float((sensor_data.get("audio") or {}).get("frequency"))
+        bof_intensity = _to_float((sensor_data.get("bof") or {}).get("Intensity (dB)"))
+
+        with self._lock:
+            for name, (width, _) in self.resolutions.items():
+                start = int(now // width) * width
+                bucket = self._pending.get((name, location, start))
+                if bucket is None:
+                    bucket = self._pending[(name, location, start)] = RollupBucket(start)
+                bucket.add(alert_types, severity, persons, frequency, bof_intensity, sent)
+            if self._flusher is None:
+                if self.flush_interval is None:
+                    from django.conf import settings
+
+                    self.flush_interval = getattr(settings, "ROLLUP_FLUSH_INTERVAL", 10.0)
+                self._flusher = threading.Thread(target=self._run, name="rollup-flush", daemon=True)
+                self._flusher.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Rollup flush failed")
+
+    def flush(self, now=None):
+        """Merge the pending buckets into the table and drop rows past retention."""
+        from django.db import transaction
+        from .models import AlertBucket
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        now = time.time() if now is None else now
+        with transaction.atomic():
+            for (resolution, location, start), bucket in pending.items():
+                row, _ = AlertBucket.objects.select_for_update().get_or_create(
+                    resolution=resolution, location=location, start=start)
+                _merge(row, bucket)
+                row.save()
+            for name, (width, retention) in self.resolutions.items():
+                cutoff = (int(now // width) - retention + 1) * width
+                AlertBucket.objects.filter(resolution=name, start__lt=cutoff).delete()
+
+    def close(self):
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Rollup flush failed")
+
+    def query(self, resolution="1m", location=None, since=None, limit=None):
+        """Return stored buckets as plain dicts, oldest first, keyed by location."""
+        if resolution not in self.resolutions:
+            raise ValueError(f"Unknown resolution '{resolution}', expected one of {list(self.resolutions)}")
+        from .models import AlertBucket
+
+        retention = self.resolutions[resolution][1]
+        limit = retention if limit is None else max(1, min(limit, retention))
+        rows = AlertBucket.objects.filter(resolution=resolution)
+        if location is not None:
+            rows = rows.filter(location=location)
+        if since is not None:
+            rows = rows.filter(start__gte=since)
+
+        result = {} if location is None else {location: []}
+        for row in rows.order_by("location", "-start"):
+            buckets = result.setdefault(row.location, [])
+            if len(buckets) < limit:
+                buckets.append(row.to_dict())
+        for buckets in result.values():
+            buckets.reverse()
+        return result
+
+
+def _merge(row, bucket):
+    """Add an in-memory bucket's counts to its stored row."""
+    row.assessments += bucket.assessments
+    row.sent += bucket.sent
+    for field in ("alerts", "severities"):
+        merged = dict(getattr(row, field))
+        for key, count in getattr(bucket, field).items():
+            merged[key] = merged.get(key, 0) + count
+        setattr(row, field, merged)
+    row.person_total += bucket.person_total
+    row.person_samples += bucket.person_samples
+    for field in ("peak_frequency", "peak_bof_intensity"):
+        value = getattr(bucket, field)
+        if value is not None and (getattr(row, field) is None or value > getattr(row, field)):
+            setattr(row, field, value)
+
+
+def _to_float(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# Process-wide rollup, recorded by the pipelines and read back from the table by the API
+rollups = AlertRollup()
@@ -0,0 +1,190 @@
+import threading
+import time
+
+import psutil
+
+from . import metrics
+
+# Inference input sizes to step between, smallest first (YOLO wants multiples of 32)
+INPUT_SIZES = (320, 416, 512, 640)
+
+
+class HostLoad:
+    """Host-wide CPU utilisation, sampled at most once per `interval` however many pipelines ask."""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._value = 0.0
+        self._at = 0.0
+        psutil.cpu_percent(None)
+
+    def cpu(self):
+        now = time.monotonic()
+        if now - self._at >= self.interval:
+            with self._lock:
+                if now - self._at >= self.interval:
+                    self._value = psutil.cpu_percent(None)
+                    self._at = now
+        return self._value
+
+
+host_load = HostLoad()
+
+# The scheduler that publishes each camera's setting gauges. Embedded pipelines run one scheduler
+# per client and camera, so only one of them reports; another takes over when it closes.
+_publishers = {}
+
+
+class AdaptiveScheduler:
+    """
+    Pacing for one pipeline's periodic stages, driven by measured cost and host load.
+
+    Stages report their run time through `observe()`, which keeps an
+    exponentially weighted average per stage. Once per `adjust_every`
+    seconds the scheduler compares host CPU and inference cost against its
+    budget. Half of `slo` is the budget for inference. The rest covers the
+    wait for the next frame and the next assessment, so that a detection
+    reaches an alert within `slo`.
+
+    - Overloaded (CPU above `cpu_high` or inference over budget): the audio
+      hop (seconds of new audio per analysis) doubles first, then camera fps
+      drops by a quarter. If inference alone is over budget, the input size
+      steps down. While a critical threat is active the camera keeps its
+      rate and only audio is shed.
+    - Idle (CPU below `cpu_low`): audio hop halves, fps rises by one and
+      input size steps back up, as long as the larger size still fits the
+      inference budget.
+
+    Critical threats are also assessed at the shortest interval, and only
+    critical evidence frames are uploaded while overloaded. With
+    `enabled=False` the scheduler keeps the fixed rates it started with.
+    """
+
+    def __init__(self, name="0", slo=1.0, cpu_high=85.0, cpu_low=50.0, fps=10.0, min_fps=2.0, max_fps=15.0,
+                 max_imgsz=640, audio_hop=(0.5, 2.0), evaluate_interval=(0.2, 1.0), alpha=0.3,
+                 adjust_every=1.0, enabled=True):
+        self.name = name
+        self.slo = slo
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.fps = min(max(fps, min_fps), max_fps)
+        self.sizes = [s for s in INPUT_SIZES if s < max_imgsz] + [max_imgsz]
+        self.size_index = len(self.sizes) - 1
+        self.min_audio_hop, self.max_audio_hop = audio_hop
+        self.audio_hop = self.min_audio_hop
+        self.min_evaluate, self.max_evaluate = evaluate_interval
+        self.alpha = alpha
+        self.adjust_every = adjust_every
+        self.enabled = enabled
+
+        self.costs = {}
+        self.cpu = 0.0
+        self.overloaded = False
+        self.critical = False
+        self._adjusted_at = time.monotonic()
+        self._gauges = {setting: metrics.SCHEDULER_SETTING.labels(name, setting)
+                        for setting in ("fps", "imgsz", "audio_hop", "overloaded")}
+        self._publish()
+
+    @property
+    def imgsz(self):
+        return self.sizes[self.size_index]
+
+    def observe(self, stage, seconds):
+        """Fold one measured run of a stage into its running cost."""
+        previous = self.costs.get(stage)
+        self.costs[stage] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+
+    def cost(self, stage):
+        return self.costs.get(stage, 0.0)
+
+    def set_critical(self, critical):
+        self.critical = bool(critical)
+
+    def camera_interval(self):
+        return 1.0 / self.fps
+
+    def audio_interval(self):
+        """Seconds of new audio per analysis, the hop read_hop() is called with."""
+        return self.audio_hop
+
+    def evaluate_interval(self):
+        if not self.enabled:
+            return self.max_evaluate
+        if self.critical:
+            return self.min_evaluate
+        spare = self.slo - self.camera_interval() - self.cost("inference") - self.cost("evaluate")
+        return min(self.max_evaluate, max(self.min_evaluate, spare))
+
+    def upload_allowed(self, critical):
+        """Evidence uploads compete for CPU and bandwidth, keep them for critical threats under load."""
+        return critical or not self.overloaded
+
+    def tick(self):
+        """Re-plan if the adjustment interval has passed. Cheap enough to call every iteration."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now - self._adjusted_at >= self.adjust_every:
+            self._adjusted_at = now
+            self._adjust()
+
+    def _adjust(self):
+        self.cpu = host_load.cpu()
+        inference = self.cost("inference")
+        budget = self.slo / 2
+        over_budget = inference > budget
+        self.overloaded = self.cpu >= self.cpu_high or over_budget
+
+        if self.overloaded:
+            if self.audio_hop < self.max_audio_hop:
+                self.audio_hop = min(self.max_audio_hop, self.audio_hop * 2)
+            elif not self.critical:
+                self.fps = max(self.min_fps, self.fps * 0.75)
+            if over_budget and self.size_index > 0 and not self.critical:
+                self.size_index -= 1
+        elif self.cpu < self.cpu_low:
+            self.audio_hop = max(self.min_audio_hop, self.audio_hop / 2)
+            if self.camera_interval() + inference < budget or self.fps < self.max_fps / 2:
+                self.fps = min(self.max_fps, self.fps + 1)
+            if self.size_index < len(self.sizes) - 1:
+                # Inference cost grows roughly with the input area
+                scale = (self.sizes[self.size_index + 1] / self.imgsz) ** 2
+                if inference * scale < budget * 0.8:
+                    self.size_index += 1
+
+        self._publish()
+
+    def close(self):
+        """Hand the camera's gauges over to another of its schedulers, if any."""
+        if _publishers.get(self.name) is self:
+            del _publishers[self.name]
+
+    def _publish(self):
+        if _publishers.setdefault(self.name, self) is not self:
+            return
+        self._gauges["fps"].set(round(self.fps, 2))
+        self._gauges["imgsz"].set(self.imgsz)
+        self._gauges["audio_hop"].set(self.audio_hop)
+        self._gauges["overloaded"].set(int(self.overloaded))
+
+
+def scheduler_for_camera(camera_id, camera_config):
+    """Build a camera pipeline's scheduler from Django settings."""
+    from django.conf import settings
+
+    detection = camera_config.get("detection") or {}
+    return AdaptiveScheduler(
+        name=camera_id,
+        slo=settings.SCHEDULER_LATENCY_SLO,
+        cpu_high=settings.SCHEDULER_CPU_HIGH,
+        cpu_low=settings.SCHEDULER_CPU_LOW,
+        fps=camera_config.get("fps", 10.0),
+        min_fps=settings.SCHEDULER_MIN_FPS,
+        max_fps=settings.SCHEDULER_MAX_FPS,
+        max_imgsz=detection.get("imgsz", 640),
+        enabled=settings.SCHEDULER_ENABLED,
+    )
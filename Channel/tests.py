@@ -1,3 +1,771 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
 
-# Create your tests here.
+import numpy as np
+import torch
+from channels.layers import InMemoryChannelLayer
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from .detlog import DetectionLog, DetectionLogReader
+from .fire import FireDetector
+from .fusion import EventWindow, SensorFusion
+from .ingest import ExternalSensors, IngestError, IngestService, decode_batch, external_sensors, reading_level
+from .loadtest import IngestLoadTest, sampled_pid
+from .management.commands.run_sensors import Command as RunSensorsCommand
+from .logs import make_queue_handler
+from .metrics import SCHEDULER_SETTING, Counter, Gauge, Histogram, summarize_latencies
+from .pipeline import stay_in_group
+from .preview import PreviewHub
+from .profiles import DetectionProfile
+from .profiling import profile_paths, take_profile
+from .rollups import AlertRollup
+from .scheduler import AdaptiveScheduler
+from .thermal import ThermalAnalyzer, ThermalFileSource
+from .tracing import Tracer
+from .vibration import VibrationAnalyzer, VibrationFileSource
+from .video import VideoSource
+from .views import preview_view, tracing_view
+from .weighting import WeatherWeighting, normalize_condition
+from .workers import DetectionPool
+from .zones import ZoneDwell, ZoneMap
+
+
+class IngestTests(SimpleTestCase):
+    def setUp(self):
+        self.sensors = ExternalSensors()
+        self.service = IngestService(rate=0, token="secret", sensors=self.sensors)
+
+    def test_valid_readings_are_summarised_per_location(self):
+        ack, summary = self.service.ingest([
+            {"device": "a", "sensor": "thermal", "value": 40.0, "ts": 100.0, "location": "Gate"},
+            {"device": "b", "sensor": "thermal", "value": 70.0, "ts": 101.0, "location": "Gate"},
+            {"device": "c", "sensor": "vibration", "value": [0.1, -0.9, 0.2], "ts": 99.0},
+        ], now=101.0)
+        self.assertEqual(ack["accepted"], 3)
+        self.assertEqual(summary["Gate"]["thermal"], [2, 70.0, 101.0])
+        self.assertEqual(summary[""]["vibration"], [1, 0.9, 99.0])
+
+    def test_non_finite_ts_is_rejected(self):
+        readings = json.loads('[{"device": "a", "sensor": "thermal", "value": 90, "ts": NaN},'
+                              ' {"device": "a", "sensor": "thermal", "value": 90, "ts": Infinity}]')
+        ack, summary = self.service.ingest(readings, now=100.0)
+        self.assertEqual(ack["accepted"], 0)
+        self.assertEqual(ack["rejected"], 2)
+        self.assertEqual(summary, {})
+
+    def test_future_ts_is_rejected(self):
+        ack, _ = self.service.ingest([{"device": "a", "sensor": "thermal", "value": 1, "ts": 200.0}], now=100.0)
+        self.assertEqual(ack["errors"], [{"index": 0, "error": "ts is in the future"}])
+
+    def test_malformed_value_rejects_only_that_reading(self):
+        ack, _ = self.service.ingest([
+            {"device": "a", "sensor": "vibration", "value": [{}]},
+            {"device": "a", "sensor": "vibration", "value": [[1, 2]]},
+            {"device": "a", "sensor": "vibration", "value": [0.3]},
+        ], now=100.0)
+        self.assertEqual((ack["accepted"], ack["rejected"]), (1, 2))
+
+    def test_reading_level_errors_are_value_errors(self):
+        for value in ([{}], [], [[1.0]], float("nan"), 10 ** 400):
+            with self.assertRaises(ValueError):
+                reading_level(value)
+
+    def test_no_token_configured_refuses_everyone(self):
+        self.assertFalse(IngestService(token="").authorised(""))
+        self.assertFalse(self.service.authorised("wrong"))
+        self.assertTrue(self.service.authorised("secret"))
+
+    def test_rate_limit_is_per_device(self):
+        service = IngestService(rate=1.0, burst=2, token="secret", sensors=self.sensors)
+        readings = [{"device": "a", "sensor": "thermal", "value": 1}] * 3 + [{"device": "b", "sensor": "thermal", "value": 1}]
+        ack, _ = service.ingest(readings, now=100.0)
+        self.assertEqual((ack["accepted"], ack["rate_limited"]), (3, 1))
+
+    def test_ndjson_with_a_bad_line_keeps_the_others(self):
+        readings = decode_batch(b'{"device": "a"}\nnot json\n{"device": "b"}\n', "application/x-ndjson")
+        self.assertEqual(readings, [{"device": "a"}, None, {"device": "b"}])
+        with self.assertRaises(IngestError):
+            decode_batch(b"{}", "image/png")
+
+    def test_recorded_reports_expire(self):
+        self.sensors.record({"": {"thermal": [1, 80.0, 100.0]}})
+        self.assertEqual(self.sensors.snapshot(105.0)["thermal"]["max"], 80.0)
+        self.assertEqual(self.sensors.snapshot(100.0 + 11.0), {})
+
+
+class FusionTests(SimpleTestCase):
+    def test_window_max_follows_expiry(self):
+        window = EventWindow(horizon=2.0, capacity=4)
+        for t, value in ((0.0, 5.0), (1.0, 3.0), (1.5, 4.0)):
+            window.push(t, value)
+        self.assertEqual((len(window), window.max), (3, 5.0))
+        window.expire(2.5)
+        self.assertEqual((len(window), window.max), (2, 4.0))
+        for t in (2.0, 2.1, 2.2):
+            window.push(t, 1.0)
+        # Over capacity, the oldest reading goes first
+        self.assertEqual((len(window), window.max), (4, 4.0))
+        self.assertEqual(window.last()[:2], (2.2, 1.0))
+
+    def test_late_readings_do_not_hold_up_expiry(self):
+        window = EventWindow(horizon=2.0)
+        window.push(10.0, 1.0)
+        window.push(9.0, 7.0)
+        window.push(5.0, 9.0)
+        self.assertEqual((len(window), window.max), (2, 7.0))
+        window.expire(12.5)
+        self.assertEqual(len(window), 0)
+
+    def test_readings_count_until_their_horizon(self):
+        fusion = SensorFusion()
+        fusion.observe_detection({"detected objects": {"knife": 1}}, t=100.0)
+        fusion.observe_audio(900.0, t=101.0)
+        snapshot = fusion.snapshot(102.0)
+        self.assertEqual(snapshot["sensors"]["knife"], {"count": 1, "max": 1.0, "age": 2.0})
+        self.assertEqual(snapshot["correlated"], ["weapon_audio"])
+        self.assertIn("audio_impulse", fusion.snapshot(103.0)["sensors"])
+        self.assertNotIn("knife", fusion.snapshot(103.5)["sensors"])
+
+    def test_readings_too_far_apart_do_not_correlate(self):
+        fusion = SensorFusion()
+        fusion.observe_detection({"is crowded": True, "total persons": 4}, t=100.0)
+        fusion.observe_audio(900.0, t=102.5)
+        self.assertEqual(fusion.snapshot(102.5)["correlated"], [])
+
+
+class FireDetectorTests(SimpleTestCase):
+    def frame(self, lit, size=40):
+        frame = np.full((size, size, 3), 60, dtype=np.uint8)
+        if lit:
+            frame[10:20, 10:20] = (0, 128, 255)  # BGR orange
+        return frame
+
+    def test_still_orange_patch_is_not_fire(self):
+        detector = FireDetector(history=8)
+        for _ in range(12):
+            result = detector.analyze(self.frame(True))
+        self.assertGreater(result["fire ratio"], 0.05)
+        self.assertEqual(result["fire flicker"], 0.0)
+        self.assertFalse(result["is fire"])
+
+    def test_flicker_is_fire_once_history_is_full(self):
+        detector = FireDetector(history=8)
+        results = [detector.analyze(self.frame(i % 2 == 0)) for i in range(9)]
+        self.assertFalse(any(result["is fire"] for result in results[:8]))
+        # Frame 8 is lit and its history holds the whole patch toggling every frame
+        self.assertTrue(results[8]["is fire"])
+        self.assertEqual(results[8]["fire flicker"], 1.0)
+
+    def test_flicker_only_counts_inside_the_window(self):
+        detector = FireDetector(history=8)
+        for i in range(8):
+            detector.analyze(self.frame(i % 2 == 0))
+        results = [detector.analyze(self.frame(True)) for _ in range(8)]
+        self.assertTrue(results[1]["is fire"])
+        self.assertFalse(results[7]["is fire"])
+
+    def test_resolution_change_starts_over(self):
+        detector = FireDetector(history=4)
+        for i in range(4):
+            detector.analyze(self.frame(i % 2 == 0))
+        result = detector.analyze(self.frame(True, size=32))
+        self.assertFalse(result["is fire"])
+        self.assertEqual(detector._filled, 1)
+
+
+class ZoneTests(SimpleTestCase):
+    zones = [
+        {"id": "yard", "polygon": [[0, 0], [0.5, 0], [0.5, 1], [0, 1]]},
+        {"id": "door", "polygon": [[0.5, 0], [1, 0], [1, 0.5], [0.5, 0.5]], "severity": "critical", "min_dwell": 2},
+    ]
+
+    def test_people_are_placed_by_their_footpoint(self):
+        zones = ZoneMap(self.zones)
+        # Frame is 200 wide, 100 high; footpoints (40, 90), (150, 30), (150, 90) and one clipped off-frame
+        boxes = [[30, 10, 50, 90], [140, 0, 160, 30], [140, 20, 160, 90], [-50, -50, -10, -20]]
+        self.assertEqual(zones.occupancy(boxes, (100, 200, 3)).tolist(), [2, 1])
+        self.assertEqual(zones.breaches(boxes[1:3], (100, 200, 3)), {"door": 1})
+        self.assertEqual(zones.breaches(np.zeros((0, 4)), (100, 200, 3)), {})
+
+    def test_too_many_zones_are_refused(self):
+        with self.assertRaises(ValueError):
+            ZoneMap([{"id": i, "polygon": [[0, 0], [1, 0], [1, 1]]} for i in range(65)])
+
+    def test_dwell_waits_for_min_dwell_and_survives_short_misses(self):
+        dwell = ZoneDwell(self.zones, grace=2.0)
+        dwell.update({"door": 1}, now=0.0)
+        self.assertEqual(dwell.active(1.0), [])
+        dwell.update({}, now=1.5)
+        self.assertEqual(dwell.active(2.5), [{"zone": "door", "persons": 0, "dwell": 2.5, "severity": "critical"}])
+        dwell.update({}, now=2.5)
+        self.assertEqual(dwell.active(2.5), [])
+
+
+class ThermalTests(SimpleTestCase):
+    def test_hot_blobs_are_counted_per_sensor(self):
+        frames = np.full((2, 8, 8), 22.0, dtype=np.float32)
+        frames[1, 1:3, 1:3] = 70.0
+        frames[1, 6, 6] = 40.0  # Above ambient + delta, below the absolute limit
+        quiet, hot = ThermalAnalyzer(2, (8, 8)).analyze(frames, t=0.0)
+        self.assertEqual((quiet["is hotspot"], quiet["hot pixels"]), (False, 0))
+        self.assertEqual((hot["is hotspot"], hot["hotspots"], hot["hot pixels"]), (True, 2, 5))
+        self.assertEqual((hot["max temp"], hot["ambient"]), (70.0, 22.0))
+
+    def test_rise_rate_is_taken_over_warm_pixels(self):
+        analyzer = ThermalAnalyzer(1, (4, 4), history=4)
+        for t in range(5):
+            frame = np.full((1, 4, 4), 20.0, dtype=np.float32)
+            frame[0, 0, :] += 0.5 * t  # A slowly warming wall, never warm enough to count
+            frame[0, 2, 2] = 35.0 + 3.0 * t
+            result = analyzer.analyze(frame, t=float(t))[0]
+        self.assertAlmostEqual(result["rise rate"], 3.0, places=2)
+        self.assertTrue(result["is rising"])
+
+    def test_file_source_plays_a_directory_in_name_order(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        np.save(f"{directory}/b.npy", np.ones((2, 3)))
+        np.savetxt(f"{directory}/a.csv", np.zeros((2, 3)), delimiter=",")
+        source = ThermalFileSource(directory, loop=False)
+        self.assertEqual(source.shape, (2, 3))
+        self.assertEqual([float(source.read()[0, 0]) for _ in range(2)], [0.0, 1.0])
+        self.assertIsNone(source.read())
+
+
+class VibrationTests(SimpleTestCase):
+    def test_shaking_exceeds_its_band_but_rest_does_not(self):
+        t = np.arange(500) / 500.0
+        windows = np.zeros((2, 500, 3), dtype=np.float32)
+        windows[:, :, 2] = 1.0  # Gravity is removed with the mean
+        windows[1, :, 0] = 0.4 * np.sin(2 * np.pi * 30.0 * t)
+        rest, shaking = VibrationAnalyzer(500.0, 500).analyze(windows)
+        self.assertEqual((rest["is exceeding"], rest["rms"]), (False, 0.0))
+        self.assertTrue(shaking["is exceeding"])
+        self.assertEqual(shaking["exceeded bands"], ["footfall"])
+        # A sine's mean square is amplitude² / 2, in the band that holds its frequency
+        self.assertAlmostEqual(shaking["bands"]["footfall"], 0.08, places=2)
+        self.assertAlmostEqual(shaking["rms"], 0.4 / np.sqrt(2), places=3)
+
+    def test_rms_limit_alone_trips_an_exceedance(self):
+        windows = np.random.default_rng(0).normal(0.0, 0.5, (1, 500)).astype(np.float32)
+        [result] = VibrationAnalyzer(500.0, 500, rms_limit=0.3, bands=()).analyze(windows)
+        self.assertTrue(result["is exceeding"])
+        self.assertEqual(result["exceeded bands"], [])
+
+    def test_file_source_loops_whole_windows(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        np.save(f"{directory}/accel.npy", np.arange(5, dtype=np.float32))
+        source = VibrationFileSource(f"{directory}/accel.npy")
+        self.assertEqual(source.axes, 1)
+        self.assertEqual([source.read(2)[:, 0].tolist() for _ in range(3)], [[0, 1], [2, 3], [0, 1]])
+        self.assertIsNone(source.read(6))
+
+
+class DetectionLogTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        # Inside one UTC hour, so every record lands in the same segment
+        self.t0 = (time.time() // 3600 - 1) * 3600
+
+    def write(self, seqs, classes=lambda seq: {"person": 1}):
+        log = DetectionLog(self.directory, "cam", block=16)
+        for seq in seqs:
+            log.append(self.t0 + seq * 0.1, {"detected objects": classes(seq), "total persons": 1},
+                       boxes=np.array([[seq, 0, seq + 10, 20]]), seq=seq)
+        log.close()
+
+    def test_scan_returns_records_in_range(self):
+        self.write(range(100))
+        records = DetectionLogReader(self.directory, "cam").scan(self.t0 + 2.0, self.t0 + 5.0)
+        self.assertEqual(records["seq"].tolist(), list(range(20, 50)))
+        self.assertEqual(records["boxes"][0, 0].tolist(), [20, 0, 30, 20])
+
+    def test_scan_stops_at_limit(self):
+        self.write(range(100))
+        records = DetectionLogReader(self.directory, "cam").scan(self.t0, self.t0 + 3600, limit=30)
+        self.assertEqual(records["seq"].tolist(), list(range(30)))
+
+    def test_resumed_segment_keeps_every_record_once(self):
+        self.write(range(30))
+        self.write(range(30, 90))
+        records = DetectionLogReader(self.directory, "cam").scan(self.t0, self.t0 + 3600)
+        self.assertEqual(records["seq"].tolist(), list(range(90)))
+
+    def test_class_scan_finds_classes_from_before_a_restart(self):
+        # Frame 20 is in the block left unfinished by the first writer
+        knife = lambda seq: {"person": 1, "knife": 1} if seq == 20 else {"person": 1}
+        self.write(range(25), knife)
+        self.write(range(25, 90), knife)
+        self.write(range(90, 91), knife)
+        reader = DetectionLogReader(self.directory, "cam")
+        self.assertEqual(reader.scan(self.t0, self.t0 + 3600, ["knife"])["seq"].tolist(), [20])
+        self.assertEqual(len(reader.scan(self.t0, self.t0 + 3600, ["scissors"])), 0)
+
+    def test_records_round_trip_to_results(self):
+        log = DetectionLog(self.directory, "cam")
+        log.append(self.t0, {"detected objects": {"person": 2}, "total persons": 2, "is crowded": True,
+                             "zone breaches": {"door": 2}}, frequency=440.0, seq=7)
+        log.close()
+        reader = DetectionLogReader(self.directory, "cam")
+        data = reader.to_dict(reader.scan(self.t0, self.t0 + 1)[0])
+        self.assertEqual(data["seq"], 7)
+        self.assertEqual(data["audio frequency"], 440.0)
+        self.assertEqual(data["detection"]["detected objects"], {"person": 2})
+        self.assertTrue(data["detection"]["is crowded"])
+        self.assertEqual(data["detection"]["zone breaches"], {"door": 1})
+
+    def test_writer_thread_flushes_without_close(self):
+        log = DetectionLog(self.directory, "cam", flush_every=0.05)
+        self.addCleanup(log.close)
+        log.append(self.t0, {"detected objects": {"person": 1}, "total persons": 1}, seq=1)
+        reader = DetectionLogReader(self.directory, "cam")
+        deadline = time.monotonic() + 2.0
+        while not len(reader.scan(self.t0, self.t0 + 1)) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(reader.scan(self.t0, self.t0 + 1)["seq"].tolist(), [1])
+
+    def test_records_across_an_hour_go_to_their_segments(self):
+        log = DetectionLog(self.directory, "cam", flush_every=60)
+        for seq, t in enumerate((self.t0 + 3599.5, self.t0 + 3600.0, self.t0 + 3600.5)):
+            log.append(t, {"detected objects": {"person": 1}}, seq=seq)
+        log.close()
+        reader = DetectionLogReader(self.directory, "cam")
+        self.assertEqual(len(reader.segments(self.t0, self.t0 + 7200)), 2)
+        self.assertEqual(reader.scan(self.t0 + 3600.0, self.t0 + 7200)["seq"].tolist(), [1, 2])
+
+
+class QueueLoggingTests(SimpleTestCase):
+    def emit(self, log):
+        stream = io.StringIO()
+        handler = make_queue_handler(stream=stream)
+        logger = logging.getLogger("Channel.tests.queue")
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        log(logger)
+        deadline = time.monotonic() + 2.0
+        while not stream.getvalue() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return json.loads(stream.getvalue())
+
+    def test_records_are_queued_unformatted(self):
+        handler = make_queue_handler(stream=io.StringIO())
+        record = logging.LogRecord("x", logging.INFO, __file__, 1, "camera %s lost", ("0",), None)
+        queued = handler.prepare(record)
+        self.assertEqual((queued.msg, queued.args), ("camera %s lost", ("0",)))
+
+    def test_listener_formats_message_and_extra_fields(self):
+        entry = self.emit(lambda logger: logger.warning("camera %s lost", "0", extra={"camera": "0"}))
+        self.assertEqual(entry["message"], "camera 0 lost")
+        self.assertEqual(entry["camera"], "0")
+
+    def test_exceptions_keep_their_own_field(self):
+        def log(logger):
+            try:
+                raise RuntimeError("boom")
+            except RuntimeError:
+                logger.exception("failed")
+        entry = self.emit(log)
+        self.assertEqual(entry["message"], "failed")
+        self.assertIn("RuntimeError: boom", entry["exc"])
+
+
+class LoadTestTests(SimpleTestCase):
+    def test_socket_mode_needs_the_server_pid(self):
+        with self.assertRaises(ValueError):
+            IngestLoadTest(mode="socket")
+        self.assertEqual(sampled_pid("socket", 1234), 1234)
+        self.assertEqual(sampled_pid("inprocess", None), os.getpid())
+
+
+class MetricsTests(SimpleTestCase):
+    def test_concurrent_increments_are_not_lost(self):
+        counter = Counter("test_total", "Test.")
+        gauge = Gauge("test_depth", "Test.")
+
+        def work():
+            for _ in range(20000):
+                counter.inc()
+                gauge.inc(2)
+                gauge.dec()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.labels().value, 80000)
+        self.assertEqual(gauge.labels().value, 80000)
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram("test_seconds", "Test.", ["stage"], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.labels("capture").observe(value)
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{stage="capture",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="capture",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{stage="capture"} 3', lines)
+
+    def test_label_values_are_escaped(self):
+        gauge = Gauge("test_gauge", "Test.", ["camera"])
+        gauge.labels('gate "a"').set(1.5)
+        self.assertEqual(gauge.render()[-1], 'test_gauge{camera="gate \\"a\\""} 1.5')
+
+    def test_latency_summary_is_in_milliseconds(self):
+        summary = summarize_latencies([0.001, 0.002, 0.003])
+        self.assertEqual((summary["count"], summary["mean"], summary["max"]), (3, 2.0, 3.0))
+        self.assertEqual(summarize_latencies([]), {"count": 0})
+
+
+class ScriptedSource(VideoSource):
+    """Opens and grabs according to scripts. A None frame, or running out of them, loses the stream."""
+
+    def __init__(self, opens, frames, **kwargs):
+        super().__init__(name="scripted", reconnect=True, reconnect_delay=0.01, **kwargs)
+        self.opens = list(opens)
+        self.frames = list(frames)
+        self.open_calls = 0
+        self.is_open = False
+
+    def _open(self):
+        self.open_calls += 1
+        self.is_open = self.opens.pop(0) if self.opens else False
+        return self.is_open
+
+    def _grab(self):
+        if not self.is_open:
+            raise RuntimeError("grab on a source that is not open")
+        frame = self.frames.pop(0) if self.frames else None
+        return frame is not None, frame
+
+    def _close(self):
+        self.is_open = False
+
+
+class VideoSourceTests(SimpleTestCase):
+    def read_all(self, source, count):
+        frames = []
+        deadline = time.monotonic() + 2.0
+        while len(frames) < count and time.monotonic() < deadline:
+            ok, frame = source.read(timeout=0.05)
+            if ok:
+                frames.append(frame)
+        return frames
+
+    def test_failed_reopen_is_retried(self):
+        source = ScriptedSource(opens=[True, False, False, True], frames=[1, None, 2], drop_frames=False)
+        with self.assertLogs("Channel.video") as logs:
+            self.assertTrue(source.start())
+            self.addCleanup(source.release)
+            self.assertEqual(self.read_all(source, 2), [1, 2])
+        output = "\n".join(logs.output)
+        self.assertEqual(output.count("Video source scripted reconnected"), 1)
+        self.assertNotIn("decode error", output)
+
+    def test_backoff_is_capped_and_release_interrupts_it(self):
+        source = ScriptedSource(opens=[True], frames=[], max_reconnect_delay=0.04)
+        with self.assertLogs("Channel.video", "WARNING"):
+            source.start()
+            time.sleep(0.5)
+            started = time.monotonic()
+            source.release()
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertFalse(source._thread.is_alive())
+        # Waits of 0.01, 0.02, then 0.04 each; doubling without the cap would reopen only 5 times in 0.5s
+        self.assertGreater(source.open_calls, 8)
+
+
+class SchedulerTests(SimpleTestCase):
+    def gauge(self, name, setting):
+        return SCHEDULER_SETTING.labels(name, setting).value
+
+    def test_one_scheduler_per_camera_publishes(self):
+        first = AdaptiveScheduler(name="sched-test", fps=10.0)
+        second = AdaptiveScheduler(name="sched-test", fps=4.0)
+        self.addCleanup(second.close)
+        self.assertEqual(self.gauge("sched-test", "fps"), 10.0)
+        second._publish()
+        self.assertEqual(self.gauge("sched-test", "fps"), 10.0)
+        first.close()
+        second._publish()
+        self.assertEqual(self.gauge("sched-test", "fps"), 4.0)
+
+    def test_overload_sheds_audio_before_fps(self):
+        scheduler = AdaptiveScheduler(name="sched-overload", slo=1.0, fps=10.0, audio_hop=(0.5, 1.0))
+        self.addCleanup(scheduler.close)
+        scheduler.observe("inference", 0.8)
+        scheduler._adjust()
+        self.assertEqual((scheduler.audio_interval(), scheduler.fps, scheduler.imgsz), (1.0, 10.0, 512))
+        scheduler._adjust()
+        self.assertEqual((scheduler.fps, scheduler.imgsz), (7.5, 416))
+        self.assertFalse(scheduler.upload_allowed(False))
+        self.assertTrue(scheduler.upload_allowed(True))
+
+
+class DetectionPoolTests(SimpleTestCase):
+    def test_exited_process_is_respawned(self):
+        pool = DetectionPool({}, workers=0)
+        pool._ctx = mp.get_context("fork")
+        pool._running = True
+        first = pool._spawn(os._exit, "pool-test", 3)
+        first.join(timeout=5)
+        with self.assertLogs("Channel.workers", level="ERROR") as logs:
+            pool._check_processes()
+        self.assertIn("exited with code 3", logs.output[0])
+        replacement = pool._processes[0]
+        self.assertIsNot(replacement, first)
+        self.assertEqual(replacement.name, "pool-test")
+        replacement.join(timeout=5)
+        pool._running = False
+        pool._check_processes()
+        self.assertIs(pool._processes[0], replacement)
+
+
+class DetectionProfileTests(SimpleTestCase):
+    names = {0: "person", 2: "car", 5: "bus"}
+
+    def test_unknown_classes_are_rejected(self):
+        with self.assertRaises(ValueError):
+            DetectionProfile(self.names, classes=["person", "tank"])
+        with self.assertRaises(ValueError):
+            DetectionProfile(self.names, class_conf={"tank": 0.3})
+
+    def test_predict_kwargs_use_class_subset_and_lowest_threshold(self):
+        profile = DetectionProfile(self.names, classes=["bus", "person"], conf=0.5, class_conf={"bus": 0.3}, imgsz=480)
+        self.assertEqual(profile.predict_kwargs(),
+                         {"conf": 0.3, "imgsz": 480, "verbose": False, "classes": [0, 5]})
+        self.assertNotIn("classes", DetectionProfile(self.names).predict_kwargs(imgsz=320))
+        np.testing.assert_allclose(profile.thresholds, [0.5, 0.5, 0.5, 0.5, 0.5, 0.3])
+
+    def test_counts_apply_each_class_threshold(self):
+        profile = DetectionProfile(self.names, conf=0.5, class_conf={"car": 0.4})
+        boxes = SimpleNamespace(
+            cls=torch.tensor([0.0, 0.0, 2.0, 2.0, 5.0]),
+            conf=torch.tensor([0.9, 0.3, 0.6, 0.45, 0.4]),
+            xyxy=torch.tensor([[1, 2, 3, 4], [5, 6, 7, 8], [0, 0, 1, 1], [0, 0, 2, 2], [0, 0, 3, 3]]),
+        )
+        detected, persons, person_boxes = profile.filter_counts(boxes)
+        self.assertEqual(detected, {"person": 1, "car": 2})
+        self.assertEqual(persons, 1)
+        self.assertEqual(person_boxes.tolist(), [[1, 2, 3, 4]])
+
+
+class PreviewHubTests(SimpleTestCase):
+    def test_no_viewers_wants_nothing(self):
+        hub = PreviewHub()
+        self.assertFalse(hub.wants("cam"))
+        with hub.viewer("cam"):
+            self.assertTrue(hub.wants("cam"))
+        self.assertFalse(hub.wants("cam"))
+
+    def test_viewers_share_one_encode_and_skip_to_the_newest_frame(self):
+        hub = PreviewHub(width=32)
+        encode = hub.encode
+        encoded = []
+        hub.encode = lambda image: encoded.append(image.shape) or encode(image)
+
+        async def run():
+            fast, slow = hub.frames("cam"), hub.frames("cam")
+            first = [asyncio.ensure_future(viewer.__anext__()) for viewer in (fast, slow)]
+            await asyncio.sleep(0)
+            hub.publish("cam", np.zeros((48, 64, 3), dtype=np.uint8))
+            shared = await asyncio.gather(*first)
+            for i in range(1, 4):
+                hub.publish_jpeg("cam", bytes([i]))
+            newest = await slow.__anext__()
+            await fast.aclose()
+            await slow.aclose()
+            return shared, newest
+
+        (fast_jpeg, slow_jpeg), newest = asyncio.run(run())
+        self.assertEqual(len(encoded), 1)
+        self.assertIs(fast_jpeg, slow_jpeg)
+        self.assertEqual(newest, bytes([3]))
+        self.assertFalse(hub.wants("cam"))
+
+    @override_settings(PREVIEW_ENABLED=True, SENSOR_PIPELINE="service")
+    def test_service_mode_points_to_run_sensors(self):
+        response = asyncio.run(preview_view(RequestFactory().get("/preview/0"), "0"))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("--http-port", json.loads(response.content)["error"])
+
+
+class WeatherWeightingTests(SimpleTestCase):
+    def test_descriptions_match_whole_words(self):
+        cases = {
+            "Light Rain": "Rainy", "Haze": "Smoke", "Partly cloudy": "Cloudy", "Thunderstorm with rain": "Stormy",
+            "Sunny": "Clear", "foggy": "Foggy", "Flash flood": "Rainy", "Sandstorm": "Smoke",
+            "Thousand islands": None, "Sunday": None, "": None,
+        }
+        for description, condition in cases.items():
+            with self.subTest(description=description):
+                self.assertEqual(normalize_condition(description), condition)
+
+    def test_override_wins_until_cleared(self):
+        weighting = WeatherWeighting()
+        weighting.update_from_feed({"data": {"current_weather": "Light rain", "temp": "21 °C"}})
+        table = weighting.set_override("smoke")
+        self.assertEqual((table.condition, table.source, table.temp), ("Smoke", "override", 21.0))
+        weighting.update_from_feed({"data": {"current_weather": "Fog"}})
+        self.assertEqual(weighting.current.condition, "Smoke")
+        self.assertEqual(weighting.set_override(None).condition, "Foggy")
+
+    def test_unknown_override_is_rejected(self):
+        weighting = WeatherWeighting()
+        with self.assertRaises(ValueError):
+            weighting.set_override("Volcanic")
+        self.assertEqual(weighting.current.condition, "Clear")
+
+
+class TracingTests(SimpleTestCase):
+    def test_disabled_spans_are_shared_no_ops(self):
+        tracer = Tracer()
+        tracer.disable()
+        with tracer.span("inference", frame="a") as span:
+            pass
+        self.assertIs(span, tracer.span("upload"))
+        self.assertEqual(tracer.recent(), [])
+
+    def test_enable_for_seconds_expires(self):
+        tracer = Tracer()
+        tracer.enable(0.05)
+        with tracer.span("inference", frame="a"):
+            pass
+        self.assertTrue(tracer.enabled)
+        time.sleep(0.1)
+        self.assertFalse(tracer.enabled)
+        tracer.record("upload", 0.01, alert="b")
+        self.assertEqual([span["span"] for span in tracer.recent()], ["inference"])
+
+    def test_recent_filters_by_frame_or_alert(self):
+        tracer = Tracer()
+        tracer.enable()
+        tracer.record("capture", 0.001, frame="f1")
+        tracer.record("capture", 0.001, frame="f2")
+        tracer.record("scoring", 0.002, alert="a1", frame="f1")
+        self.assertEqual([span["span"] for span in tracer.recent("f1")], ["capture", "scoring"])
+        self.assertEqual([span["span"] for span in tracer.recent("a1")], ["scoring"])
+        self.assertEqual(len(tracer.recent(limit=2)), 2)
+
+    @override_settings(SENSOR_PIPELINE="service")
+    def test_service_mode_get_points_to_run_sensors(self):
+        request = RequestFactory().get("/debug/tracing")
+        request.user = SimpleNamespace(is_active=True, is_staff=True)
+        body = json.loads(tracing_view(request).content)
+        self.assertIn("run_sensors", body["note"])
+
+
+class ProfilingTests(SimpleTestCase):
+    def test_profile_writes_folded_stacks_and_memory_snapshot(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        worker = threading.Thread(target=time.sleep, args=(0.3,), name="busy")
+        worker.start()
+        paths = take_profile(profile_paths(directory), seconds=0.1, interval=0.01)
+        worker.join()
+
+        with open(paths["cpu"], encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertTrue(any(line.startswith("busy;") for line in lines))
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+        self.assertGreater(os.path.getsize(paths["memory"]), 0)
+        self.assertTrue(os.path.exists(paths["memory_top"]))
+
+
+class ChannelGroupTests(SimpleTestCase):
+    def test_membership_outlives_group_expiry(self):
+        async def run():
+            # The in-memory layer expires on whole seconds
+            layer = InMemoryChannelLayer(group_expiry=1)
+            kept, lapsed = await layer.new_channel(), await layer.new_channel()
+            await layer.group_add("alerts", kept)
+            await layer.group_add("alerts", lapsed)
+            task = asyncio.create_task(stay_in_group(layer, "alerts", kept))
+            await asyncio.sleep(2.2)
+            await layer.group_send("alerts", {"type": "sensor.alert", "text": "{}"})
+            task.cancel()
+            message = await asyncio.wait_for(layer.receive(kept), 1.0)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(lapsed), 0.1)
+            return message
+
+        self.assertEqual(asyncio.run(run())["text"], "{}")
+
+
+class SensorServiceTests(SimpleTestCase):
+    def test_bad_control_message_does_not_stop_the_loop(self):
+        async def run():
+            layer = InMemoryChannelLayer()
+            channel = await layer.new_channel()
+            task = asyncio.create_task(RunSensorsCommand().handle_control(layer, channel))
+            await layer.send(channel, {"type": "sensor.readings"})
+            await layer.send(channel, {"type": "sensor.readings",
+                                       "summary": {"service-test": {"thermal": [1, 90.0, time.time()]}}})
+            deadline = time.monotonic() + 2.0
+            while not external_sensors.snapshot(time.time(), "service-test") and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        with self.assertLogs("Channel.management.commands.run_sensors", "ERROR") as logs:
+            asyncio.run(run())
+        self.assertIn("KeyError", logs.output[0])
+        self.assertEqual(external_sensors.snapshot(time.time(), "service-test")["thermal"]["max"], 90.0)
+
+
+class AlertRollupTests(TestCase):
+    def alert(self, types=("crowd",), persons=2, frequency=None):
+        return {"location": "Gate", "type": list(types), "severity": "high",
+                "sensorData": {"video": {"detection": {"total persons": persons}}, "audio": {"frequency": frequency}}}
+
+    def test_flushed_buckets_are_read_back(self):
+        rollup = AlertRollup(flush_interval=60)
+        rollup.record(self.alert(), sent=True, now=120.0)
+        rollup.record(self.alert(types=("none",), persons=4, frequency=440), now=130.0)
+        self.assertEqual(rollup.query("1m"), {})
+        rollup.flush(now=130.0)
+        [bucket] = rollup.query("1m", location="Gate", since=0)["Gate"]
+        self.assertEqual((bucket["start"], bucket["assessments"], bucket["sent"]), (120, 2, 1))
+        self.assertEqual(bucket["alerts"], {"crowd": 1})
+        self.assertEqual((bucket["avgPersons"], bucket["peakFrequency"]), (3.0, 440.0))
+
+    def test_flushes_from_several_recorders_add_up(self):
+        first, second = AlertRollup(flush_interval=60), AlertRollup(flush_interval=60)
+        first.record(self.alert(), sent=True, now=120.0)
+        first.flush(now=120.0)
+        first.record(self.alert(), now=125.0)
+        second.record(self.alert(types=("weapon",)), now=126.0)
+        first.flush(now=126.0)
+        second.flush(now=126.0)
+        [bucket] = AlertRollup().query("1m", location="Gate")["Gate"]
+        self.assertEqual((bucket["assessments"], bucket["sent"]), (3, 1))
+        self.assertEqual(bucket["alerts"], {"crowd": 2, "weapon": 1})
+
+    def test_limit_is_clamped(self):
+        rollup = AlertRollup(flush_interval=60)
+        for minute in range(5):
+            rollup.record(self.alert(), now=minute * 60.0)
+        rollup.flush(now=240.0)
+        self.assertEqual([b["start"] for b in rollup.query("1m", limit=2)["Gate"]], [180, 240])
+        self.assertEqual(len(rollup.query("1m", limit=-3)["Gate"]), 1)
+        self.assertEqual(len(rollup.query("1m", limit=10 ** 6)["Gate"]), 5)
+        with self.assertRaises(ValueError):
+            rollup.query("5m")
+
+    def test_buckets_past_retention_are_dropped(self):
+        rollup = AlertRollup(resolutions={"1m": (60, 2)}, flush_interval=60)
+        rollup.record(self.alert(), now=0.0)
+        rollup.record(self.alert(), now=300.0)
+        rollup.flush(now=300.0)
+        self.assertEqual([b["start"] for b in rollup.query("1m")["Gate"]], [300])
@@ -0,0 +1,202 @@
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+class ThermalFileSource:
+    """
+    Radiometric frames (°C) played back from disk.
+
+    `path` is a .npy file holding a T x H x W stack, or a directory of .npy
+    or .csv frames read in name order. Frames are loaded once, so each
+    `read()` is an index into memory.
+    """
+
+    def __init__(self, path, loop=True):
+        path = Path(path)
+        if path.is_dir():
+            files = sorted(p for p in path.iterdir() if p.suffix in (".npy", ".csv"))
+            if not files:
+                raise ValueError(f"No .npy or .csv thermal frames in {path}")
+            frames = np.stack([np.load(p) if p.suffix == ".npy" else np.loadtxt(p, delimiter=",") for p in files])
+        else:
+            frames = np.load(path)
+            if frames.ndim == 2:
+                frames = frames[None]
+        if frames.ndim != 3:
+            raise ValueError(f"Thermal frames must be H x W or T x H x W, got shape {frames.shape}")
+        self.frames = frames.astype(np.float32)
+        self.shape = self.frames.shape[1:]
+        self.loop = loop
+        self.position = 0
+
+    def read(self):
+        """Return the next frame, or None at the end of a non-looping source."""
+        if self.position >= len(self.frames):
+            if not self.loop:
+                return None
+            self.position = 0
+        frame = self.frames[self.position]
+        self.position += 1
+        return frame
+
+
+class SyntheticThermal:
+    """
+    Stand-in thermal camera: ambient temperature with sensor noise and, now and
+    then, a hot spot that heats up for a while and cools down again.
+    """
+
+    def __init__(self, shape=(24, 32), ambient=22.0, noise=0.3, event_every=60.0, seed=None):
+        self.shape = tuple(shape)
+        self.ambient = ambient
+        self.noise = noise
+        self.event_every = event_every
+        self.rng = np.random.default_rng(seed)
+        yy, xx = np.mgrid[:shape[0], :shape[1]]
+        self._grid = (yy, xx)
+        self._event = None
+
+    def read(self):
+        now = time.monotonic()
+        frame = self.ambient + self.rng.normal(0.0, self.noise, self.shape).astype(np.float32)
+        if self._event is None and self.rng.random() < 1.0 / max(1.0, self.event_every * 4):
+            y, x = self.rng.integers(0, self.shape[0]), self.rng.integers(0, self.shape[1])
+            self._event = (now, y, x)
+        if self._event is not None:
+            started, y, x = self._event
+            elapsed = now - started
+            if elapsed > 40.0:
+                self._event = None
+            else:
+                # Heats at 5 °C/s for 15 s, holds, then cools
+                heat = min(elapsed, 15.0) * 5.0 - max(0.0, elapsed - 25.0) * 5.0
+                yy, xx = self._grid
+                frame += heat * np.exp(-((yy - y) ** 2 + (xx - x) ** 2) / 4.0).astype(np.float32)
+        return frame
+
+
+def open_thermal_source(source, loop=True):
+    if source == "synthetic":
+        return SyntheticThermal()
+    return ThermalFileSource(source, loop=loop)
+
+
+class ThermalAnalyzer:
+    """
+    Hot spots and temperature rise rate for a stack of same-size thermal frames.
+
+    All sensors of one resolution are analysed together as an S x H x W
+    array. A pixel is hot above `hot` °C, or `delta` °C above its frame's
+    median (the ambient). The rise rate is the least-squares slope of every
+    pixel over the last `history` frames, computed in one tensordot, and is
+    taken over the pixels that are already warm, so a slowly warming wall
+    does not count. Hot pixels are grouped into blobs only for sensors that
+    have any, which is rare.
+    """
+
+    def __init__(self, count, shape, hot=60.0, delta=15.0, rise_rate=2.0, history=8, min_pixels=1):
+        self.count = count
+        self.shape = tuple(shape)
+        self.hot = hot
+        self.delta = delta
+        self.rise_rate = rise_rate
+        self.min_pixels = min_pixels
+        self.frames = np.zeros((history, count) + self.shape, dtype=np.float32)
+        self.times = np.zeros(history, dtype=np.float64)
+        self.filled = 0
+        self.index = 0
+
+    def reset(self):
+        self.filled = 0
+        self.index = 0
+
+    def rise(self):
+        """Per-pixel rise rate in °C/s over the frames held, S x H x W (zeros until three frames)."""
+        n = self.filled
+        if n < 3:
+            return np.zeros((self.count,) + self.shape, dtype=np.float32)
+        times = self.times[:n] - self.times[:n].mean()
+        spread = float(times @ times)
+        if spread <= 0:
+            return np.zeros((self.count,) + self.shape, dtype=np.float32)
+        frames = self.frames[:n]
+        # Order in the ring does not matter for a least-squares slope
+        return (np.tensordot(times.astype(np.float32), frames - frames.mean(axis=0), axes=1) / spread).astype(np.float32)
+
+    def analyze(self, frames, t):
+        """Analyse one S x H x W stack captured at `t` (seconds); return one result dict per sensor."""
+        frames = np.asarray(frames, dtype=np.float32)
+        self.frames[self.index] = frames
+        self.times[self.index] = t
+        self.index = (self.index + 1) % len(self.times)
+        self.filled = min(self.filled + 1, len(self.times))
+
+        flat = frames.reshape(self.count, -1)
+        ambient = np.median(flat, axis=1)
+        peak = flat.max(axis=1)
+        hot = (frames >= self.hot) | (frames >= (ambient + self.delta)[:, None, None])
+        warm = frames >= (ambient + self.delta / 2)[:, None, None]
+        hot_pixels = hot.reshape(self.count, -1).sum(axis=1)
+        rise = np.where(warm, self.rise(), -np.inf).reshape(self.count, -1).max(axis=1)
+        rise = np.where(np.isfinite(rise), rise, 0.0)
+
+        results = []
+        for i in range(self.count):
+            hotspots = 0
+            if hot_pixels[i] >= self.min_pixels:
+                # Label 0 is the background
+                hotspots = cv2.connectedComponents(hot[i].astype(np.uint8), connectivity=8)[0] - 1
+            results.append({
+                "is hotspot": bool(hotspots),
+                "is rising": bool(rise[i] >= self.rise_rate),
+                "hotspots": int(hotspots),
+                "hot pixels": int(hot_pixels[i]),
+                "max temp": round(float(peak[i]), 1),
+                "ambient": round(float(ambient[i]), 1),
+                "rise rate": round(float(rise[i]), 2),
+            })
+        return results
+
+
+class ThermalStage:
+    """
+    Every configured thermal sensor, read and analysed together.
+
+    `sensors` maps a sensor id to {"source", "loop"}. Sensors are grouped by
+    resolution and each group shares one ThermalAnalyzer, so a poll is a few
+    array operations however many sensors there are.
+    """
+
+    def __init__(self, sensors, hot=60.0, rise_rate=2.0, fps=4.0):
+        self.interval = 1.0 / fps
+        self.sources = {sensor_id: open_thermal_source(config["source"], loop=config.get("loop", True))
+                        for sensor_id, config in sensors.items()}
+        groups = {}
+        for sensor_id, source in self.sources.items():
+            groups.setdefault(tuple(source.shape), []).append(sensor_id)
+        self.groups = [(ids, ThermalAnalyzer(len(ids), shape, hot=hot, rise_rate=rise_rate))
+                       for shape, ids in groups.items()]
+
+    def poll(self, t=None):
+        """Read one frame per sensor and return {sensor id: result}."""
+        if t is None:
+            t = time.time()
+        results = {}
+        for ids, analyzer in self.groups:
+            frames = [self.sources[sensor_id].read() for sensor_id in ids]
+            if any(frame is None for frame in frames):
+                # A finished file source stops its whole group, the others keep going
+                continue
+            for sensor_id, result in zip(ids, analyzer.analyze(np.stack(frames), t)):
+                results[sensor_id] = result
+        return results
+
+
+def thermal_stage_from_settings():
+    from django.conf import settings
+
+    return ThermalStage(settings.THERMAL_SENSORS, hot=settings.THERMAL_HOT,
+                        rise_rate=settings.THERMAL_RISE_RATE, fps=settings.THERMAL_FPS)
@@ -0,0 +1,103 @@
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "ids", "start")
+
+    def __init__(self, tracer, name, ids):
+        self.tracer = tracer
+        self.name = name
+        self.ids = ids
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, time.perf_counter() - self.start, **self.ids)
+        return False
+
+
+class Tracer:
+    """
+    Opt-in spans for the pipeline stages, tagged with frame and alert ids.
+
+    While disabled, `span()` returns a shared no-op context manager and
+    `enabled` is one comparison, so the hooks can stay in the hot paths.
+    While enabled, every span is kept in a ring of the last `capacity` spans
+    and logged as a "span" record. A frame is followed from capture through
+    inference, and an alert from scoring through upload, serialisation and
+    send, by filtering on its id. Tracing starts as TRACING_ENABLED says and
+    can be switched on for a limited time with `enable(seconds)`.
+    """
+
+    def __init__(self, capacity=10000):
+        self.spans = deque(maxlen=capacity)
+        self._until = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        if self._until is None:
+            from django.conf import settings
+
+            self._until = math.inf if getattr(settings, "TRACING_ENABLED", False) else 0.0
+        return self._until > time.monotonic()
+
+    def enable(self, seconds=None):
+        """Trace for `seconds`, or until disabled."""
+        self._until = math.inf if seconds is None else time.monotonic() + seconds
+
+    def disable(self):
+        self._until = 0.0
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex[:16]
+
+    def span(self, name, **ids):
+        """Time the block as one span of stage `name`."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, ids)
+
+    def record(self, name, seconds, **ids):
+        """Record a span measured elsewhere, e.g. inference timed in a worker process."""
+        if not self.enabled:
+            return
+        end = time.time()
+        entry = {"span": name, "start": round(end - seconds, 6), "ms": round(seconds * 1000, 3), **ids}
+        with self._lock:
+            self.spans.append(entry)
+        logger.info("span", extra=entry)
+
+    def recent(self, trace_id=None, limit=500):
+        """Return the newest spans, optionally only those with `trace_id` as their frame or alert id."""
+        with self._lock:
+            spans = list(self.spans)
+        if trace_id:
+            spans = [s for s in spans if trace_id in (s.get("frame"), s.get("alert"))]
+        return spans[-limit:]
+
+
+tracer = Tracer()
@@ -1,4 +1,5 @@
 
+import logging
 import cloudinary
 from cloudinary import CloudinaryImage
 from cloudinary.uploader import upload
@@ -8,6 +9,10 @@ from PIL import Image
 import io
 import cv2
 import numpy as np
+import time
+from .metrics import UPLOAD_LATENCY
+
+logger = logging.getLogger(__name__)
 
 cloudinary.config(
     cloud_name='dxfeoomxq',
@@ -18,24 +23,25 @@ cloudinary.config(
 def uploadImage(image_data, name):
     try:
         if image_data is None:
-            print("Error: image_data is None")
+            logger.error("image_data is None")
             return None
             
         success, encoded_image = cv2.imencode('.jpg', image_data)
         
         if not success:
-            print("Error encoding image to JPEG format")
+            logger.error("Error encoding image to JPEG format")
             return None
         
         image_data_bytes = np.array(encoded_image).tobytes()
-        print(f"Uploading image {name}, size: {len(image_data_bytes)} bytes")
+        logger.info("Uploading image %s, size: %d bytes", name, len(image_data_bytes))
         
+        start = time.perf_counter()
         upload_result = upload(image_data_bytes, public_id=name, unique_filename=False, overwrite=True)
+        UPLOAD_LATENCY.observe(time.perf_counter() - start)
 
-        print("Image uploaded successfully!")
-        print("Image URL:", upload_result['secure_url'])
+        logger.info("Image uploaded: %s", upload_result['secure_url'])
 
         return upload_result['secure_url']
     except Exception as e:
-        print(f"Error uploading image: {str(e)}")
+        logger.error("Error uploading image: %s", e)
         return None
@@ -4,5 +4,7 @@ from . import consumers
 
 websocket_urlpatterns = [
     
-    re_path(r'^ws/$', consumers.RandomConsumer.as_asgi())
+    re_path(r'^ws/$', consumers.RandomConsumer.as_asgi()),
+    re_path(r'^ws/preview/(?P<camera_id>[^/]+)/$', consumers.PreviewConsumer.as_asgi()),
+    re_path(r'^ws/ingest/$', consumers.IngestConsumer.as_asgi()),
 ]
\ No newline at end of file
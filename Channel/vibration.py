@@ -0,0 +1,166 @@
+import time
+
+import numpy as np
+
+# Frequency bands watched for exceedances: (name, low Hz, high Hz, mean-square limit in g²)
+BANDS = (
+    ("structural", 1.0, 10.0, 0.02),   # sway, heavy impacts on the structure
+    ("footfall", 10.0, 50.0, 0.01),    # people, machinery, forced entry
+    ("impact", 50.0, 250.0, 0.005),    # tools, breaking glass, drilling
+)
+
+
+class VibrationFileSource:
+    """
+    Accelerometer samples (g) played back from a .npy or .csv file.
+
+    The file holds N samples, one column per axis. Samples are loaded once
+    and `read(n)` returns the next n x axes window.
+    """
+
+    def __init__(self, path, loop=True):
+        if str(path).endswith(".csv"):
+            samples = np.loadtxt(path, delimiter=",")
+        else:
+            samples = np.load(path)
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim == 1:
+            samples = samples[:, None]
+        self.samples = samples
+        self.axes = samples.shape[1]
+        self.loop = loop
+        self.position = 0
+
+    def read(self, n):
+        """Return the next n samples, or None at the end of a non-looping source."""
+        end = self.position + n
+        if end > len(self.samples):
+            if not self.loop or n > len(self.samples):
+                return None
+            self.position, end = 0, n
+        window = self.samples[self.position:end]
+        self.position = end
+        return window
+
+
+class SyntheticVibration:
+    """
+    Stand-in three-axis accelerometer at rest (1 g on z) with sensor noise
+    and, now and then, a few seconds of 30 Hz shaking.
+    """
+
+    def __init__(self, rate=500.0, noise=0.01, event_every=60.0, seed=None):
+        self.rate = rate
+        self.noise = noise
+        self.event_every = event_every
+        self.axes = 3
+        self.rng = np.random.default_rng(seed)
+        self._event_until = 0.0
+        self._t = 0.0
+
+    def read(self, n):
+        now = time.monotonic()
+        samples = self.rng.normal(0.0, self.noise, (n, 3)).astype(np.float32)
+        samples[:, 2] += 1.0
+        if now >= self._event_until and self.rng.random() < n / self.rate / self.event_every:
+            self._event_until = now + 5.0
+        if now < self._event_until:
+            t = self._t + np.arange(n) / self.rate
+            samples[:, 0] += (0.4 * np.sin(2 * np.pi * 30.0 * t)).astype(np.float32)
+        self._t += n / self.rate
+        return samples
+
+
+def open_vibration_source(source, rate, loop=True):
+    if source == "synthetic":
+        return SyntheticVibration(rate=rate)
+    return VibrationFileSource(source, loop=loop)
+
+
+class VibrationAnalyzer:
+    """
+    RMS and band energy of accelerometer windows, for all sensors in one pass.
+
+    `analyze` takes an S x N x axes array of N samples per sensor at `rate`
+    Hz. The mean of each axis (gravity and offset) is removed, then a windowed
+    rFFT along the sample axis and one matrix product with the band masks
+    give every sensor's mean-square energy per band. By Parseval this is on
+    the same g² scale as the RMS. A sensor exceeds when its RMS is above
+    `rms_limit` or any band is above that band's limit.
+    """
+
+    def __init__(self, rate, samples, rms_limit=0.3, bands=BANDS):
+        self.rate = rate
+        self.samples = samples
+        self.rms_limit = rms_limit
+        self.band_names = [name for name, _, _, _ in bands]
+        self.band_limits = np.array([limit for _, _, _, limit in bands], dtype=np.float64)
+        freqs = np.fft.rfftfreq(samples, 1.0 / rate)
+        self.band_masks = np.array([(freqs >= low) & (freqs < high) for _, low, high, _ in bands],
+                                   dtype=np.float64).reshape(len(bands), len(freqs))
+        self.taper = np.hanning(samples).astype(np.float32)
+        # One-sided spectrum to mean square, corrected for the window's energy
+        self.scale = 2.0 / (samples * samples * float(np.mean(self.taper ** 2)))
+
+    def analyze(self, windows):
+        """Return one result dict per sensor for an S x N (x axes) array of samples."""
+        x = np.asarray(windows, dtype=np.float32)
+        if x.ndim == 2:
+            x = x[:, :, None]
+        x = x - x.mean(axis=1, keepdims=True)
+        rms = np.sqrt((x * x).sum(axis=2).mean(axis=1))
+        spectrum = np.fft.rfft(x * self.taper[None, :, None], axis=1)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis=2) * self.scale
+        energy = power @ self.band_masks.T
+        exceeded = energy > self.band_limits
+
+        results = []
+        for i in range(len(x)):
+            bands = [name for name, hit in zip(self.band_names, exceeded[i]) if hit]
+            results.append({
+                "is exceeding": bool(rms[i] > self.rms_limit or bands),
+                "rms": round(float(rms[i]), 4),
+                "bands": {name: round(float(e), 5) for name, e in zip(self.band_names, energy[i])},
+                "exceeded bands": bands,
+            })
+        return results
+
+
+class VibrationStage:
+    """
+    Every configured accelerometer, read and analysed together.
+
+    `sensors` maps a sensor id to {"source", "rate", "loop"}. Sensors with the
+    same sample rate and axis count share one VibrationAnalyzer over
+    `window`-second windows.
+    """
+
+    def __init__(self, sensors, window=1.0, rms_limit=0.3):
+        self.interval = window
+        self.sources = {}
+        groups = {}
+        for sensor_id, config in sensors.items():
+            rate = float(config.get("rate", 500.0))
+            source = open_vibration_source(config["source"], rate, loop=config.get("loop", True))
+            self.sources[sensor_id] = source
+            groups.setdefault((rate, source.axes), []).append(sensor_id)
+        self.groups = [(ids, VibrationAnalyzer(rate, int(rate * window), rms_limit=rms_limit))
+                       for (rate, _), ids in groups.items()]
+
+    def poll(self):
+        """Read one window per sensor and return {sensor id: result}."""
+        results = {}
+        for ids, analyzer in self.groups:
+            windows = [self.sources[sensor_id].read(analyzer.samples) for sensor_id in ids]
+            if any(window is None for window in windows):
+                continue
+            for sensor_id, result in zip(ids, analyzer.analyze(np.stack(windows))):
+                results[sensor_id] = result
+        return results
+
+
+def vibration_stage_from_settings():
+    from django.conf import settings
+
+    return VibrationStage(settings.VIBRATION_SENSORS, window=settings.VIBRATION_WINDOW,
+                          rms_limit=settings.VIBRATION_RMS_LIMIT)
@@ -0,0 +1,262 @@
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import cv2
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+
+
+class VideoSource:
+    """
+    Base class for frame sources decoded on a background thread.
+
+    The decode thread keeps only the newest frame. With `drop_frames=True`
+    (live cameras, streams, real-time file playback) an unread frame is
+    simply replaced, so a slow consumer never builds a backlog and always
+    gets the freshest frame. With `drop_frames=False` (files played as fast
+    as possible) the decoder waits until each frame has been taken, so no
+    frame is lost and decoding still overlaps with inference.
+
+    Sources with `reconnect=True` (network streams) are reopened when they
+    drop, waiting `reconnect_delay` seconds and doubling the wait after each
+    failed attempt up to `max_reconnect_delay`.
+
+    Exposes the subset of the cv2.VideoCapture API the pipeline uses:
+    `isOpened()`, `read()` and `release()`.
+    """
+
+    def __init__(self, name="0", drop_frames=True, reconnect=False, reconnect_delay=2.0, max_reconnect_delay=30.0):
+        self.name = name
+        self.drop_frames = drop_frames
+        self.reconnect = reconnect
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._read_seq = 0
+        self._opened = False
+        self._finished = False
+        self._stopping = False
+        self._thread = None
+        self._dropped = metrics.FRAMES_DROPPED.labels(name)
+
+    # Subclasses implement these three
+    def _open(self):
+        raise NotImplementedError
+
+    def _grab(self):
+        """Return (ok, frame). A falsy ok means end of stream or a read error."""
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def start(self):
+        """Open the source and start decoding. Returns whether the source opened."""
+        try:
+            self._opened = bool(self._open())
+        except Exception as e:
+            logger.error("Could not open video source %s: %s", self.name, e)
+            self._opened = False
+        if self._opened:
+            self._thread = threading.Thread(target=self._run, name=f"video-{self.name}", daemon=True)
+            self._thread.start()
+        return self._opened
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                ok, frame = self._grab()
+            except Exception as e:
+                logger.error("Video source %s decode error: %s", self.name, e)
+                ok, frame = False, None
+
+            if not ok:
+                if self._stopping or not self.reconnect or not self._reconnect():
+                    break
+                continue
+
+            with self._cond:
+                if not self.drop_frames:
+                    while self._seq != self._read_seq and not self._stopping:
+                        self._cond.wait()
+                elif self._seq != self._read_seq:
+                    # Latest frame wins, the unread one is discarded
+                    self._dropped.inc()
+                self._frame = frame
+                self._seq += 1
+                self._cond.notify_all()
+
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+
+    def _reconnect(self):
+        """Reopen the source with exponential backoff. Returns False if released meanwhile."""
+        delay = self.reconnect_delay
+        while True:
+            self._close()
+            logger.warning("Video source %s lost, reconnecting in %.1fs", self.name, delay)
+            # Waits on the condition so release() does not have to sit out the backoff
+            with self._cond:
+                if self._cond.wait_for(lambda: self._stopping, delay):
+                    return False
+            try:
+                if self._open():
+                    logger.info("Video source %s reconnected", self.name)
+                    return True
+            except Exception as e:
+                logger.error("Could not reopen video source %s: %s", self.name, e)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def isOpened(self):
+        return self._opened and not (self._finished and self._seq == self._read_seq)
+
+    def read(self, timeout=1.0):
+        """Return (True, frame) with a frame newer than the last one read, or (False, None) on timeout/end."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq != self._read_seq or self._finished, timeout):
+                return False, None
+            if self._seq == self._read_seq:
+                return False, None
+            self._read_seq = self._seq
+            frame = self._frame
+            self._cond.notify_all()
+            return True, frame
+
+    def release(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._close()
+        self._opened = False
+
+
+class CaptureSource(VideoSource):
+    """Device indexes, RTSP/HTTP streams and video files read through cv2.VideoCapture."""
+
+    def __init__(self, target, api_preference=cv2.CAP_ANY, pace=False, loop=False, **kwargs):
+        super().__init__(**kwargs)
+        self.target = target
+        self.api_preference = api_preference
+        self.pace = pace
+        self.loop = loop
+        self._cap = None
+        self._interval = 0.0
+        self._next_at = 0.0
+
+    def _open(self):
+        self._cap = cv2.VideoCapture(self.target, self.api_preference)
+        if not self._cap.isOpened():
+            return False
+        # Keep the driver-side queue to a single frame on live sources
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        fps = self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self._interval = 1.0 / fps if self.pace else 0.0
+        self._next_at = time.monotonic()
+        return True
+
+    def _grab(self):
+        ok, frame = self._cap.read()
+        if not ok and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._cap.read()
+        if ok and self._interval:
+            # Real-time file playback: decode no faster than the recorded frame rate
+            self._next_at += self._interval
+            delay = self._next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self._next_at = time.monotonic()
+        return ok, frame
+
+    def _close(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+class ImageDirectorySource(VideoSource):
+    """Play back the images in a directory, in name order, at a fixed rate."""
+
+    def __init__(self, directory, fps=10.0, pace=True, loop=False, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = Path(directory)
+        self.interval = 1.0 / fps if pace and fps else 0.0
+        self.loop = loop
+        self._paths = []
+        self._index = 0
+        self._next_at = 0.0
+
+    def _open(self):
+        self._paths = sorted(p for p in self.directory.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        self._index = 0
+        self._next_at = time.monotonic()
+        return bool(self._paths)
+
+    def _grab(self):
+        if self._index >= len(self._paths):
+            if not self.loop:
+                return False, None
+            self._index = 0
+        frame = cv2.imread(str(self._paths[self._index]))
+        self._index += 1
+        if self.interval:
+            self._next_at += self.interval
+            delay = self._next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return frame is not None, frame
+
+
+def device_backend():
+    """Native capture backend for local cameras on this platform."""
+    if sys.platform.startswith("win"):
+        return cv2.CAP_DSHOW
+    if sys.platform.startswith("linux"):
+        return cv2.CAP_V4L2
+    return cv2.CAP_ANY
+
+
+def open_video_source(spec, name=None, pacing="realtime", fps=10.0, loop=False):
+    """
+    Build and start a video source from a spec:
+
+    - an int or digit string, or /dev/videoN: a local camera (V4L2 on Linux, DirectShow on Windows)
+    - rtsp://, rtmp://, http(s)://: a network stream, reconnected when it drops
+    - a directory: the images in it, played at `fps`
+    - anything else: a video file
+
+    `pacing` applies to files and directories: "realtime" plays at the
+    recorded rate dropping frames a slow consumer misses, "fast" decodes as
+    fast as the consumer reads without dropping any.
+    """
+    spec = str(spec)
+    name = name or spec
+    realtime = pacing != "fast"
+
+    if spec.isdigit() or spec.startswith("/dev/video"):
+        index = int(spec) if spec.isdigit() else int(spec[len("/dev/video"):])
+        source = CaptureSource(index, api_preference=device_backend(), name=name)
+    elif "://" in spec:
+        source = CaptureSource(spec, api_preference=cv2.CAP_FFMPEG, name=name, reconnect=True)
+    elif os.path.isdir(spec):
+        source = ImageDirectorySource(spec, fps=fps, pace=realtime, loop=loop, name=name, drop_frames=realtime)
+    else:
+        source = CaptureSource(spec, pace=realtime, loop=loop, name=name, drop_frames=realtime)
+
+    source.start()
+    return source
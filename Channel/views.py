@@ -1,3 +1,120 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods, require_POST
+from .ingest import IngestError, get_ingest_service
+from .metrics import REGISTRY
+from .preview import BOUNDARY, SERVICE_PREVIEW_MOVED, get_preview_hub, mjpeg_part
+from .profiling import start_profile
+from .tracing import tracer
 
-# Create your views here.
+
+def metrics_view(request):
+    """Expose pipeline metrics in the Prometheus text format."""
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+async def preview_view(request, camera_id):
+    """Stream a camera's annotated live preview as MJPEG, viewable in an <img> tag."""
+    if not settings.PREVIEW_ENABLED or camera_id not in settings.CAMERAS:
+        raise Http404("No preview for this camera")
+    if settings.SENSOR_PIPELINE == "service":
+        # Frames are drawn in run_sensors, this process never gets any
+        return JsonResponse({"error": SERVICE_PREVIEW_MOVED.format(camera_id=camera_id)}, status=404)
+
+    async def stream():
+        async for jpeg in get_preview_hub().frames(camera_id):
+            yield mjpeg_part(jpeg)
+
+    response = StreamingHttpResponse(stream(), content_type=f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+    response["Cache-Control"] = "no-cache, no-store"
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def ingest_view(request):
+    """Accept a batch of third-party sensor readings as NDJSON or MessagePack."""
+    service = get_ingest_service()
+    if not service.token:
+        return JsonResponse({"error": "Ingest is disabled until INGEST_TOKEN is set"}, status=503)
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if not service.authorised(token if scheme.lower() == "bearer" else ""):
+        return JsonResponse({"error": "Missing or invalid ingest token"}, status=401)
+
+    try:
+        ack = await service.submit(request.body, request.content_type)
+    except IngestError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+
+    # Only a batch that was refused outright is an error, partial acceptance is reported in the body
+    status = 429 if ack["rate_limited"] and not ack["accepted"] else 200
+    return JsonResponse(ack, status=status)
+
+
+def _send_control(message):
+    """Hand a control message to the run_sensors service."""
+    # Imported here so loading the URLconf does not load the detection model
+    from .pipeline import CONTROL_GROUP
+
+    async_to_sync(get_channel_layer().group_send)(CONTROL_GROUP, message)
+
+
+def _seconds(request, default, maximum):
+    params = request.POST or request.GET
+    return max(0.1, min(float(params.get("seconds", default)), maximum))
+
+
+@staff_member_required
+@require_POST
+def profile_view(request):
+    """Take a time-boxed CPU profile and tracemalloc snapshot of the process running the pipelines."""
+    try:
+        seconds = _seconds(request, 30, settings.PROFILE_MAX_SECONDS)
+    except ValueError:
+        return JsonResponse({"error": "seconds must be a number"}, status=400)
+
+    if settings.SENSOR_PIPELINE == "service":
+        # The pipelines run in run_sensors, it profiles itself and writes to its own PROFILE_DIR
+        _send_control({"type": "debug.profile", "seconds": seconds})
+        return JsonResponse({"seconds": seconds, "process": "run_sensors", "directory": settings.PROFILE_DIR}, status=202)
+
+    try:
+        paths = start_profile(settings.PROFILE_DIR, seconds)
+    except RuntimeError as e:
+        return JsonResponse({"error": str(e)}, status=409)
+    return JsonResponse({"seconds": seconds, "files": paths}, status=202)
+
+
+@staff_member_required
+@require_http_methods(["GET", "POST"])
+def tracing_view(request):
+    """GET the spans traced in this process (?trace=<frame or alert id>); POST to switch tracing on or off."""
+    if request.method == "GET":
+        try:
+            limit = int(request.GET.get("limit", 500))
+        except ValueError:
+            return JsonResponse({"error": "limit must be an integer"}, status=400)
+        body = {"enabled": tracer.enabled, "spans": tracer.recent(request.GET.get("trace"), limit)}
+        if settings.SENSOR_PIPELINE == "service":
+            # Only POST is forwarded; the pipeline spans stay in run_sensors' own ring
+            body["note"] = "Pipeline spans are recorded by run_sensors, GET /tracing on its --http-port for them"
+        return JsonResponse(body)
+
+    params = request.POST or request.GET
+    enabled = params.get("enabled", "1").lower() not in ("0", "false", "off")
+    try:
+        seconds = _seconds(request, 300, settings.TRACING_MAX_SECONDS) if enabled else None
+    except ValueError:
+        return JsonResponse({"error": "seconds must be a number"}, status=400)
+    if enabled:
+        tracer.enable(seconds)
+    else:
+        tracer.disable()
+    if settings.SENSOR_PIPELINE == "service":
+        _send_control({"type": "debug.tracing", "enabled": enabled, "seconds": seconds})
+    return JsonResponse({"enabled": enabled, "seconds": seconds})
@@ -0,0 +1,123 @@
+import re
+import threading
+
+# Sensors whose contribution to the threat score is weighted
+SENSORS = ("weapon", "fire", "crowd", "zone", "bof", "audio", "vibration", "thermal")
+
+# How much each sensor can be trusted under a given weather condition.
+# Cameras lose reliability in fog/smoke/rain, microphones in rain and storms,
+# while thermal and fibre (BOF) sensing are mostly unaffected or gain importance.
+CONDITION_WEIGHTS = {
+    "Clear":  {"weapon": 1.0, "fire": 1.0, "crowd": 1.0, "zone": 1.0, "bof": 1.0, "audio": 1.0, "vibration": 1.0, "thermal": 1.0},
+    "Cloudy": {"weapon": 0.95, "fire": 1.0, "crowd": 0.95, "zone": 0.95, "bof": 1.0, "audio": 1.0, "vibration": 1.0, "thermal": 1.0},
+    "Foggy":  {"weapon": 0.6, "fire": 0.8, "crowd": 0.7, "zone": 0.7, "bof": 1.2, "audio": 1.2, "vibration": 1.1, "thermal": 1.3},
+    "Rainy":  {"weapon": 0.8, "fire": 0.7, "crowd": 0.8, "zone": 0.8, "bof": 1.1, "audio": 0.7, "vibration": 0.9, "thermal": 1.1},
+    "Smoke":  {"weapon": 0.5, "fire": 1.5, "crowd": 0.6, "zone": 0.6, "bof": 1.1, "audio": 1.1, "vibration": 1.0, "thermal": 1.4},
+    "Stormy": {"weapon": 0.7, "fire": 0.8, "crowd": 0.8, "zone": 0.8, "bof": 0.8, "audio": 0.5, "vibration": 0.6, "thermal": 1.0},
+}
+
+DEFAULT_CONDITION = "Clear"
+
+# Words in upstream weather descriptions mapped to our conditions, checked in order.
+# Whole words only, so "Flash flood" is not smoke and "Sunday" is not sun.
+_CONDITION_KEYWORDS = [
+    ("Stormy", {"storm", "storms", "stormy", "thunder", "thunderstorm", "thunderstorms", "thundery",
+                "squall", "squalls", "tornado", "cyclone"}),
+    ("Smoke", {"smoke", "smoky", "haze", "hazy", "dust", "dusty", "sand", "sandstorm", "ash"}),
+    ("Rainy", {"rain", "rains", "rainy", "raining", "drizzle", "drizzly", "shower", "showers", "sleet",
+               "snow", "snowy", "snowing", "snowfall", "flood", "floods"}),
+    ("Foggy", {"fog", "foggy", "mist", "misty"}),
+    ("Cloudy", {"cloud", "clouds", "cloudy", "overcast"}),
+    ("Clear", {"clear", "sun", "sunny", "fair"}),
+]
+
+
+class WeightTable:
+    """Immutable per-sensor weights for one weather condition."""
+    __slots__ = ("condition", "weights", "temp", "source")
+
+    def __init__(self, condition, temp=None, source="default"):
+        self.condition = condition
+        self.weights = CONDITION_WEIGHTS[condition]
+        self.temp = temp
+        self.source = source
+
+    def __getitem__(self, sensor):
+        return self.weights[sensor]
+
+    def to_dict(self):
+        return {"conditions": self.condition, "temp": self.temp, "source": self.source, "weights": dict(self.weights)}
+
+
+def normalize_condition(description):
+    """Map a free-form weather description (e.g. "Light Rain", "Haze") to a known condition."""
+    if not description:
+        return None
+    text = str(description).strip()
+    for condition in CONDITION_WEIGHTS:
+        if text.lower() == condition.lower():
+            return condition
+    words = set(re.findall(r"[a-z]+", text.lower()))
+    for condition, keywords in _CONDITION_KEYWORDS:
+        if words & keywords:
+            return condition
+    return None
+
+
+class WeatherWeighting:
+    """
+    Process-wide holder of the active weight table.
+
+    Tables are built once per condition. Switching conditions swaps a single
+    reference, so every pipeline picks up the new table on its next read and
+    never sees a half-updated set of weights. A frontend override takes
+    precedence over the weather feed until it is cleared.
+    """
+
+    def __init__(self):
+        self._tables = {condition: WeightTable(condition) for condition in CONDITION_WEIGHTS}
+        self._lock = threading.Lock()
+        self._feed = self._tables[DEFAULT_CONDITION]
+        self._override = None
+        self.current = self._feed
+
+    def _table(self, condition, temp, source):
+        table = self._tables[condition]
+        if table.temp == temp and table.source == source:
+            return table
+        return WeightTable(condition, temp=temp, source=source)
+
+    def update_from_feed(self, payload):
+        """Update the feed condition from a weather API payload. Returns the active table."""
+        data = payload.get("data", payload) if isinstance(payload, dict) else {}
+        condition = normalize_condition(data.get("current_weather") or data.get("conditions"))
+        if condition is None:
+            return self.current
+        try:
+            temp = float(str(data.get("temp", "")).split()[0].rstrip("°CF"))
+        except (ValueError, IndexError):
+            temp = None
+
+        with self._lock:
+            self._feed = self._table(condition, temp, "feed")
+            if self._override is None:
+                self.current = self._feed
+            return self.current
+
+    def set_override(self, condition):
+        """Force a condition from the frontend, or clear the override with None."""
+        with self._lock:
+            if condition is None:
+                self._override = None
+                self.current = self._feed
+                return self.current
+
+            normalized = normalize_condition(condition)
+            if normalized is None:
+                raise ValueError(f"Unknown weather condition '{condition}', expected one of {list(CONDITION_WEIGHTS)}")
+            self._override = self._table(normalized, self._feed.temp, "override")
+            self.current = self._override
+            return self.current
+
+
+weighting = WeatherWeighting()
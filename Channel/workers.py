@@ -0,0 +1,400 @@
+import atexit
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from . import metrics
+from .preview import get_preview_hub
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Slot states in a camera's shared-memory header
+FREE = 0
+BUSY = 1
+
+
+class FrameRing:
+    """
+    Fixed slots of frame memory for one camera in a single shared-memory block.
+
+    Layout: an int64 header of `slots` slot states followed by a dropped-frame
+    counter, then `slots` frame buffers of `slot_bytes` each. A slot is
+    written by the capture process only while FREE, marked BUSY, and freed
+    again by the parent once a newer detection result has replaced it, so a
+    frame is never overwritten while a detector or the parent is reading it.
+    """
+
+    def __init__(self, slots, slot_bytes, name=None, create=False):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.header_bytes = 8 * (slots + 1)
+        size = self.header_bytes + slots * slot_bytes
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.header = np.ndarray((slots + 1,), dtype=np.int64, buffer=self.shm.buf)
+        if create:
+            self.header[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def dropped(self):
+        return int(self.header[self.slots])
+
+    def acquire(self):
+        """Return the index of a free slot, or None if every slot is in use."""
+        free = np.flatnonzero(self.header[:self.slots] == FREE)
+        return int(free[0]) if len(free) else None
+
+    def write(self, slot, frame):
+        view = self.view(slot, frame.shape)
+        view[...] = frame
+        self.header[slot] = BUSY
+
+    def view(self, slot, shape):
+        offset = self.header_bytes + slot * self.slot_bytes
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+
+    def release(self, slot):
+        self.header[slot] = FREE
+
+    def count_drop(self):
+        self.header[self.slots] += 1
+
+    def close(self):
+        # Drop numpy views before closing or the buffer stays exported
+        self.header = None
+        self.shm.close()
+
+
+def fit_frame(frame, max_bytes):
+    """Downscale a frame, keeping its aspect ratio, until it fits in a slot."""
+    if frame.nbytes <= max_bytes:
+        return frame
+    scale = (max_bytes / frame.nbytes) ** 0.5
+    h, w = frame.shape[:2]
+    return cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def init_process():
+    """
+    Set up a spawned capture or detector process.
+
+    Spawned children start from a fresh interpreter: Django is set up again
+    so settings-based logging (the queue handler) works in them too.
+    """
+    import django
+    from django.core.exceptions import ImproperlyConfigured
+
+    try:
+        django.setup()
+    except ImproperlyConfigured:
+        # Settings were configured in code by the parent, not via DJANGO_SETTINGS_MODULE
+        logging.basicConfig(level=logging.INFO)
+
+
+def capture_main(camera_id, config, ring_name, slots, slot_bytes, tasks, stop, fire=None):
+    """
+    Capture process: decode frames into free slots and queue their descriptors.
+
+    Fire and smoke detection tracks flicker and a background over consecutive
+    frames, so it runs here on every captured frame, in order, rather than in
+    the detectors, which each see an interleaved share of the camera's frames.
+    `fire` holds the FireDetector arguments, or None when it is off.
+    """
+    init_process()
+    from .fire import FireDetector
+    from .video import open_video_source
+
+    ring = FrameRing(slots, slot_bytes, name=ring_name)
+    fire_detector = FireDetector(**fire) if fire is not None else None
+    source = None
+    seq = 0
+    try:
+        while not stop.is_set():
+            if source is None or not source.isOpened():
+                if source is not None:
+                    source.release()
+                    source = None
+                    time.sleep(2)
+                try:
+                    source = open_video_source(config["source"], name=camera_id,
+                                               pacing=config.get("pacing", "realtime"),
+                                               fps=config.get("fps", 10.0), loop=config.get("loop", False))
+                except Exception:
+                    logger.exception("Failed to open video source", extra={"camera": camera_id})
+                    time.sleep(2)
+                continue
+
+            ok, frame = source.read(timeout=1.0)
+            if not ok:
+                continue
+            captured_at = time.time()
+
+            slot = ring.acquire()
+            if slot is None:
+                # Detectors are behind, drop this frame rather than queue stale work
+                ring.count_drop()
+                continue
+
+            frame = fit_frame(frame, slot_bytes)
+            fire_result = None
+            if fire_detector is not None:
+                try:
+                    fire_result = fire_detector.analyze(frame)
+                except Exception as e:
+                    logger.error("Fire detection failed on %s: %s", camera_id, e)
+            ring.write(slot, frame)
+            seq += 1
+            try:
+                tasks.put_nowait((camera_id, slot, seq, frame.shape, captured_at, fire_result))
+            except queue.Full:
+                ring.release(slot)
+                ring.count_drop()
+    finally:
+        if source is not None:
+            source.release()
+        ring.close()
+
+
+def detector_main(worker_index, cpus, rings, preview_demand, tasks, results, stop):
+    """Detector process: run inference straight on shared-memory frames."""
+    init_process()
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    try:
+        import torch
+        torch.set_num_threads(max(1, len(cpus)))
+    except ImportError:
+        pass
+
+    from .main2 import detect_frame
+
+    attached = {camera_id: FrameRing(*spec) for camera_id, spec in rings.items()}
+    camera_index = {camera_id: i for i, camera_id in enumerate(rings)}
+    hub = get_preview_hub()
+    try:
+        while not stop.is_set():
+            try:
+                camera_id, slot, seq, shape, captured_at, fire = tasks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            frame = attached[camera_id].view(slot, shape)
+            # Preview viewers live in the parent, which flags the cameras being watched
+            annotate = bool(preview_demand[camera_index[camera_id]])
+            start = time.perf_counter()
+            try:
+                result = detect_frame(frame, camera_id, annotate=annotate, fire=False)
+                if fire is not None:
+                    result.update(fire)
+            except Exception as e:
+                logger.error("Detector %d failed on %s#%d: %s", worker_index, camera_id, seq, e)
+                result = None
+            elapsed = time.perf_counter() - start
+            del frame
+            jpeg = hub.take(camera_id) if annotate else None
+            # The parent owns the slot from here on and frees it once superseded
+            results.put((camera_id, slot, seq, shape, captured_at, elapsed, result, jpeg))
+    finally:
+        for ring in attached.values():
+            ring.close()
+
+
+class DetectionPool:
+    """
+    Capture and detection spread over processes, sharing frames through shared memory.
+
+    One capture process per camera writes frames into that camera's
+    FrameRing. `workers` detector processes, each pinned to its own share of
+    the CPUs, pull (camera, slot, seq, shape) descriptors from a bounded
+    queue, run detect_frame on the shared frame and return only the result
+    dict. Fire and smoke detection, which needs a camera's frames in order,
+    runs in its capture process instead and travels with the descriptor. A
+    reader thread in the parent keeps the latest result and frame slot per
+    camera for the consumers; frames are never pickled.
+    """
+
+    def __init__(self, cameras, workers=2, slots=4, max_frame=(1080, 1920), fire=None):
+        self.cameras = cameras
+        self.fire = fire  # FireDetector arguments for the capture processes, None when off
+        self.workers = workers
+        self.slots = max(slots, workers + 2)
+        self.slot_bytes = max_frame[0] * max_frame[1] * 3
+
+        self._ctx = mp.get_context("spawn")
+        self._stop = self._ctx.Event()
+        self._tasks = self._ctx.Queue(maxsize=self.slots * len(cameras))
+        self._results = self._ctx.Queue()
+        self._preview_demand = self._ctx.Array("b", len(cameras), lock=False)
+        self._rings = {}
+        self._processes = []
+        self._specs = {}  # process name -> (target, args), to respawn a process that died
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._dropped_seen = {}
+        self._reader = None
+        self._running = False
+
+    def start(self):
+        for camera_id in self.cameras:
+            self._rings[camera_id] = FrameRing(self.slots, self.slot_bytes, create=True)
+            self._dropped_seen[camera_id] = 0
+
+        ring_specs = {camera_id: (self.slots, self.slot_bytes, ring.name) for camera_id, ring in self._rings.items()}
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        for i in range(self.workers):
+            worker_cpus = cpus[i::self.workers] if len(cpus) >= self.workers else []
+            self._spawn(detector_main, f"detector-{i}", i, worker_cpus, ring_specs, self._preview_demand,
+                        self._tasks, self._results, self._stop)
+        for camera_id, config in self.cameras.items():
+            self._spawn(capture_main, f"capture-{camera_id}", camera_id, config, self._rings[camera_id].name,
+                        self.slots, self.slot_bytes, self._tasks, self._stop, self.fire)
+
+        self._running = True
+        self._reader = threading.Thread(target=self._read_results, name="detection-results", daemon=True)
+        self._reader.start()
+        atexit.register(self.stop)
+        logger.info("Detection pool started", extra={"workers": self.workers, "cameras": list(self.cameras)})
+
+    def _spawn(self, target, name, *args):
+        process = self._ctx.Process(target=target, name=name, args=args, daemon=True)
+        process.start()
+        self._processes.append(process)
+        self._specs[name] = (target, args)
+        return process
+
+    def _check_processes(self):
+        """Respawn capture or detector processes that exited while the pool is running."""
+        for i, process in enumerate(self._processes):
+            if process.is_alive() or not self._running:
+                continue
+            logger.error("Pool process %s exited with code %s, respawning", process.name, process.exitcode,
+                         extra={"worker": process.name, "exitcode": process.exitcode})
+            target, args = self._specs[process.name]
+            replacement = self._ctx.Process(target=target, name=process.name, args=args, daemon=True)
+            replacement.start()
+            self._processes[i] = replacement
+
+    def _read_results(self):
+        fps_windows = {camera_id: [time.perf_counter(), 0] for camera_id in self.cameras}
+        task_depth = metrics.QUEUE_DEPTH.labels("detection_tasks")
+        result_depth = metrics.QUEUE_DEPTH.labels("detection_results")
+        hub = get_preview_hub()
+        camera_ids = list(self.cameras)
+        checked_at = time.monotonic()
+
+        while self._running:
+            if time.monotonic() - checked_at >= 1.0:
+                self._check_processes()
+                checked_at = time.monotonic()
+            for i, camera_id in enumerate(camera_ids):
+                self._preview_demand[i] = hub.wants(camera_id)
+            try:
+                camera_id, slot, seq, shape, captured_at, elapsed, result, jpeg = self._results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            ring = self._rings[camera_id]
+            if jpeg is not None:
+                hub.publish_jpeg(camera_id, jpeg)
+            metrics.INFERENCE_LATENCY.observe(elapsed)
+            # Timed in the detector process; "queued" is how long the frame waited in the task and result queues
+            tracer.record("inference", elapsed, frame=f"{camera_id}-{seq}", camera=camera_id,
+                          queued=round(time.time() - captured_at - elapsed, 4))
+            metrics.FRAMES_PROCESSED.labels(camera_id).inc()
+
+            with self._lock:
+                previous = self._latest.get(camera_id)
+                if result is None or (previous is not None and previous[0] > seq):
+                    # Failed or out of order (a faster detector already returned a newer frame)
+                    ring.release(slot)
+                else:
+                    self._latest[camera_id] = (seq, slot, shape, captured_at, result)
+                    if previous is not None:
+                        ring.release(previous[1])
+
+            dropped = ring.dropped
+            if dropped > self._dropped_seen[camera_id]:
+                metrics.FRAMES_DROPPED.labels(camera_id).inc(dropped - self._dropped_seen[camera_id])
+                self._dropped_seen[camera_id] = dropped
+
+            window = fps_windows[camera_id]
+            window[1] += 1
+            now = time.perf_counter()
+            if now - window[0] >= 1.0:
+                metrics.CAMERA_FPS.labels(camera_id).set(round(window[1] / (now - window[0]), 2))
+                fps_windows[camera_id] = [now, 0]
+                try:
+                    task_depth.set(self._tasks.qsize())
+                    result_depth.set(self._results.qsize())
+                except NotImplementedError:
+                    pass
+
+    def latest(self, camera_id):
+        """Return (seq, captured_at, result) of the newest detection for a camera, or None."""
+        entry = self._latest.get(camera_id)
+        if entry is None:
+            return None
+        seq, _, _, captured_at, result = entry
+        return seq, captured_at, result
+
+    def snapshot(self, camera_id):
+        """Copy the frame behind the newest detection out of shared memory, or None. Up to a few MB, call only to upload."""
+        with self._lock:
+            entry = self._latest.get(camera_id)
+            if entry is None:
+                return None
+            _, slot, shape, _, _ = entry
+            return self._rings[camera_id].view(slot, shape).copy()
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if self._reader is not None:
+            self._reader.join(timeout=2)
+        for ring in self._rings.values():
+            ring.close()
+            ring.shm.unlink()
+        self._rings.clear()
+        self._processes.clear()
+        self._specs.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_detection_pool():
+    """Return the process-wide detection pool, started from Django settings on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from django.conf import settings
+
+            width, height = (int(v) for v in settings.DETECTION_MAX_FRAME.lower().split("x"))
+            fire = None
+            if getattr(settings, "FIRE_DETECTION", True):
+                fire = {"history": getattr(settings, "FIRE_HISTORY", 8),
+                        "confirm_model": getattr(settings, "FIRE_MODEL", "") or None}
+            _pool = DetectionPool(settings.CAMERAS, workers=settings.DETECTION_WORKERS,
+                                  slots=settings.DETECTION_WORKER_SLOTS, max_frame=(height, width), fire=fire)
+            _pool.start()
+        return _pool
@@ -0,0 +1,105 @@
+import cv2
+import numpy as np
+
+# One bit per zone in the rasterised mask
+MAX_ZONES = 64
+
+
+class ZoneMap:
+    """
+    Restricted-zone polygons of one camera, rasterised into a bitmask image.
+
+    `zones` is a list of {"id", "polygon", "severity", "min_dwell"} dicts with
+    polygon points in normalised (0-1) image coordinates. Bit i of a mask
+    pixel is set when the pixel lies in zone i. Masks are built once per frame
+    size at 1/`scale` resolution, after which testing every person against
+    every zone is a single gather plus a bit expansion.
+    """
+
+    def __init__(self, zones, scale=4):
+        if len(zones) > MAX_ZONES:
+            raise ValueError(f"At most {MAX_ZONES} zones per camera, got {len(zones)}")
+        self.zones = zones
+        self.ids = [str(zone["id"]) for zone in zones]
+        self.scale = scale
+        self._shifts = np.arange(len(zones), dtype=np.uint64)
+        self._masks = {}
+
+    def mask(self, shape):
+        """Return the zone bitmask for frames of `shape`, rasterising it on first use."""
+        h, w = shape[:2]
+        mask = self._masks.get((h, w))
+        if mask is None:
+            mh, mw = -(-h // self.scale), -(-w // self.scale)
+            mask = np.zeros((mh, mw), dtype=np.uint64)
+            layer = np.zeros((mh, mw), dtype=np.uint8)
+            for i, zone in enumerate(self.zones):
+                points = np.asarray(zone["polygon"], dtype=np.float64) * (mw, mh)
+                layer[:] = 0
+                cv2.fillPoly(layer, [np.round(points).astype(np.int32)], 1)
+                mask |= layer.astype(np.uint64) << np.uint64(i)
+            mask = self._masks[(h, w)] = mask
+        return mask
+
+    def occupancy(self, boxes, shape):
+        """Count the person boxes (N x 4 xyxy, frame pixels) whose footpoint is in each zone."""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if not len(boxes) or not self.zones:
+            return np.zeros(len(self.zones), dtype=np.int64)
+        mask = self.mask(shape)
+        # Footpoint: bottom centre of the box, where the person stands
+        xs = ((boxes[:, 0] + boxes[:, 2]) / (2 * self.scale)).astype(np.int64).clip(0, mask.shape[1] - 1)
+        ys = (boxes[:, 3] / self.scale).astype(np.int64).clip(0, mask.shape[0] - 1)
+        bits = mask[ys, xs]
+        inside = (bits[:, None] >> self._shifts) & np.uint64(1)
+        return inside.sum(axis=0).astype(np.int64)
+
+    def breaches(self, boxes, shape):
+        """Return {zone id: persons} for the zones with at least one person inside."""
+        counts = self.occupancy(boxes, shape)
+        return {self.ids[i]: int(counts[i]) for i in np.flatnonzero(counts)}
+
+
+class ZoneDwell:
+    """
+    Track how long each zone has been continuously occupied.
+
+    Detection misses a person now and then, so a zone only counts as cleared
+    after `grace` seconds without anyone in it.
+    """
+
+    def __init__(self, zones, grace=2.0):
+        self.zones = {str(zone["id"]): zone for zone in zones}
+        self.grace = grace
+        self._since = {}
+        self._last_seen = {}
+        self._persons = {}
+
+    def update(self, breaches, now):
+        for zone_id, persons in breaches.items():
+            if zone_id not in self._since:
+                self._since[zone_id] = now
+            self._last_seen[zone_id] = now
+            self._persons[zone_id] = persons
+        for zone_id in list(self._since):
+            if zone_id not in breaches:
+                if now - self._last_seen[zone_id] > self.grace:
+                    del self._since[zone_id], self._last_seen[zone_id], self._persons[zone_id]
+                else:
+                    self._persons[zone_id] = 0
+
+    def active(self, now):
+        """Return the breaches to report: zone id, persons, dwell seconds and severity."""
+        active = []
+        for zone_id, since in self._since.items():
+            zone = self.zones.get(zone_id, {})
+            dwell = now - since
+            if dwell < zone.get("min_dwell", 0):
+                continue
+            active.append({
+                "zone": zone_id,
+                "persons": self._persons[zone_id],
+                "dwell": round(dwell, 1),
+                "severity": zone.get("severity", "high"),
+            })
+        return active
@@ -43,7 +43,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'rest_framework'
+    'rest_framework',
+    'Channel'
 ]
 
 MIDDLEWARE = [
@@ -128,3 +129,210 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Weather service
+# "rapidapi" talks to the-weather-api and needs WEATHER_API_KEY set in the
+# environment, "stub" serves deterministic offline data
+
+WEATHER_PROVIDER = env('WEATHER_PROVIDER', default='rapidapi')
+WEATHER_API_KEY = env('WEATHER_API_KEY') if WEATHER_PROVIDER == 'rapidapi' else env('WEATHER_API_KEY', default='')
+WEATHER_DEFAULT_LOCATION = env('WEATHER_DEFAULT_LOCATION', default='mumbai')
+WEATHER_CACHE_TTL = env.int('WEATHER_CACHE_TTL', default=600)
+WEATHER_STALE_TTL = env.int('WEATHER_STALE_TTL', default=3600)
+WEATHER_CACHE_SIZE = env.int('WEATHER_CACHE_SIZE', default=1024)
+WEATHER_REFRESH_INTERVAL = env.int('WEATHER_REFRESH_INTERVAL', default=60)
+
+# Sensor pipeline
+# "embedded" runs a pipeline inside every WebSocket consumer, "service" makes
+# consumers only forward alerts published by `manage.py run_sensors`.
+# "live" opens the camera/microphone, "synthetic" emits stand-in readings at
+# SYNTHETIC_ALERT_RATE alerts per second for load testing
+
+SENSOR_PIPELINE = env('SENSOR_PIPELINE', default='embedded')
+SENSOR_SOURCE = env('SENSOR_SOURCE', default='live')
+SYNTHETIC_ALERT_RATE = env.float('SYNTHETIC_ALERT_RATE', default=1.0)
+
+# Channel layer carrying alerts from the sensor service to the web workers.
+# In-memory only reaches consumers in the same process (tests, embedded mode);
+# set REDIS_URL (needs channels_redis) to run run_sensors as its own process.
+
+REDIS_URL = env('REDIS_URL', default='')
+
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+# Cameras, keyed by camera id. "source" is a device index or /dev/videoN, an
+# rtsp:// or http:// stream URL, a video file or a directory of images.
+# "pacing" is "realtime" or "fast" for files and image directories, "location"
+# is reported on the camera's alerts. "zones" are restricted areas given as
+# CAMERA_ZONES='[{"id": "gate", "polygon": [[0.1, 0.5], [0.4, 0.5], [0.4, 1], [0.1, 1]],
+# "severity": "high", "min_dwell": 0}]' with points as fractions of the frame size.
+# "detection" is the camera's detection profile, e.g. CAMERA_DETECTION=
+# '{"classes": ["person", "knife", "scissors"], "conf": 0.5,
+# "class_conf": {"knife": 0.35}, "imgsz": 640}'; the default detects every class.
+
+CAMERAS = {
+    env('CAMERA_ID', default='0'): {
+        'source': env('CAMERA_SOURCE', default='0'),
+        'pacing': env('CAMERA_PACING', default='realtime'),
+        'fps': env.float('CAMERA_FPS', default=10.0),
+        'loop': env.bool('CAMERA_LOOP', default=False),
+        'location': env('CAMERA_LOCATION', default='West Gate'),
+        'zones': env.json('CAMERA_ZONES', default=[]),
+        'detection': env.json('CAMERA_DETECTION', default={}),
+    },
+}
+
+# Detection worker pool
+# With DETECTION_WORKERS > 0 every camera gets a capture process and that many
+# detector processes, pinned to separate cores, run inference on frames shared
+# through multiprocessing.shared_memory. 0 keeps detection in the consumer.
+
+DETECTION_WORKERS = env.int('DETECTION_WORKERS', default=0)
+DETECTION_WORKER_SLOTS = env.int('DETECTION_WORKER_SLOTS', default=4)
+DETECTION_MAX_FRAME = env('DETECTION_MAX_FRAME', default='1920x1080')
+
+# Fire/smoke detection
+# Colour masks plus flicker over the last FIRE_HISTORY frames of each camera.
+# FIRE_MODEL optionally names YOLO weights with fire/smoke classes used to
+# confirm candidates before "is fire" is reported.
+
+FIRE_DETECTION = env.bool('FIRE_DETECTION', default=True)
+FIRE_HISTORY = env.int('FIRE_HISTORY', default=8)
+FIRE_MODEL = env('FIRE_MODEL', default='')
+
+# Thermal and vibration sensors
+# THERMAL_SENSORS='{"roof": {"source": "/data/roof.npy"}}' maps sensor ids to
+# radiometric frames in °C: a .npy stack (T x H x W), a directory of .npy/.csv
+# frames, or "synthetic". Pixels above THERMAL_HOT, or well above ambient, are
+# hot spots; heating faster than THERMAL_RISE_RATE °C/s is flagged as rising.
+# VIBRATION_SENSORS='{"fence": {"source": "/data/fence.npy", "rate": 500}}' maps
+# sensor ids to accelerometer samples in g (.npy/.csv, one column per axis) or
+# "synthetic", checked for RMS and band energy over VIBRATION_WINDOW seconds.
+
+THERMAL_SENSORS = env.json('THERMAL_SENSORS', default={})
+THERMAL_FPS = env.float('THERMAL_FPS', default=4.0)
+THERMAL_HOT = env.float('THERMAL_HOT', default=60.0)
+THERMAL_RISE_RATE = env.float('THERMAL_RISE_RATE', default=2.0)
+VIBRATION_SENSORS = env.json('VIBRATION_SENSORS', default={})
+VIBRATION_WINDOW = env.float('VIBRATION_WINDOW', default=1.0)
+VIBRATION_RMS_LIMIT = env.float('VIBRATION_RMS_LIMIT', default=0.3)
+
+# Live preview
+# Annotated frames at /preview/<camera> (MJPEG) and ws/preview/<camera>/
+# (binary JPEG messages), and on run_sensors' --http-port (localhost only
+# unless --http-host says otherwise). Frames are drawn and encoded once for
+# all viewers, and not at all while nobody watches. With
+# SENSOR_PIPELINE=service only run_sensors has frames; the web process answers
+# preview requests with a pointer to its port.
+
+PREVIEW_ENABLED = env.bool('PREVIEW_ENABLED', default=False)
+PREVIEW_WIDTH = env.int('PREVIEW_WIDTH', default=640)
+PREVIEW_QUALITY = env.int('PREVIEW_QUALITY', default=70)
+
+# Adaptive scheduling
+# Camera fps, inference input size, audio hop and assessment interval adapt to
+# measured stage cost and host CPU so detections reach alerts within
+# SCHEDULER_LATENCY_SLO seconds. Critical threats keep priority under load.
+# SCHEDULER_ENABLED=false keeps fixed rates.
+
+SCHEDULER_ENABLED = env.bool('SCHEDULER_ENABLED', default=True)
+SCHEDULER_LATENCY_SLO = env.float('SCHEDULER_LATENCY_SLO', default=1.0)
+SCHEDULER_CPU_HIGH = env.float('SCHEDULER_CPU_HIGH', default=85.0)
+SCHEDULER_CPU_LOW = env.float('SCHEDULER_CPU_LOW', default=50.0)
+SCHEDULER_MIN_FPS = env.float('SCHEDULER_MIN_FPS', default=2.0)
+SCHEDULER_MAX_FPS = env.float('SCHEDULER_MAX_FPS', default=15.0)
+
+# Rollups
+# Threat assessments are counted per location in 1m/1h/1d buckets, one
+# pipeline per camera recording, and merged into the database every
+# ROLLUP_FLUSH_INTERVAL seconds. /api/rollups/ reads them from there, so it
+# works from any process and lags by up to one interval.
+
+ROLLUP_FLUSH_INTERVAL = env.float('ROLLUP_FLUSH_INTERVAL', default=10.0)
+
+# Sensor ingest
+# Third-party sensors push batches of readings to /ingest over HTTP POST
+# (NDJSON, or MessagePack with the msgpack package) or to ws/ingest/ as NDJSON
+# text or MessagePack binary messages. INGEST_TOKEN must be sent as
+# "Authorization: Bearer <token>", or ?token= on the WebSocket. Ingest refuses
+# every request until INGEST_TOKEN is set. Each device
+# may send INGEST_RATE_LIMIT readings per second with bursts of INGEST_BURST;
+# a rate of 0 disables the limit.
+
+INGEST_TOKEN = env('INGEST_TOKEN', default='')
+INGEST_RATE_LIMIT = env.float('INGEST_RATE_LIMIT', default=100.0)
+INGEST_BURST = env.int('INGEST_BURST', default=500)
+INGEST_MAX_BATCH = env.int('INGEST_MAX_BATCH', default=10000)
+
+# Tracing and profiling
+# TRACING_ENABLED records per-stage spans (capture, inference, audio_dsp,
+# scoring, upload, serialise, send) tagged with frame and alert ids, logged as
+# "span" records and listed at /debug/tracing?trace=<id>. Staff users can POST
+# /debug/tracing?seconds=300 to trace for a while without a restart, and POST
+# /debug/profile?seconds=30 to write a sampled CPU profile (folded stacks for
+# flame graphs) and a tracemalloc snapshot to PROFILE_DIR. With
+# SENSOR_PIPELINE=service both apply to the run_sensors process, whose spans
+# are listed at /tracing on its --http-port.
+
+TRACING_ENABLED = env.bool('TRACING_ENABLED', default=False)
+TRACING_MAX_SECONDS = env.int('TRACING_MAX_SECONDS', default=3600)
+PROFILE_DIR = env('PROFILE_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILE_MAX_SECONDS = env.int('PROFILE_MAX_SECONDS', default=120)
+
+# Detection log
+# Off by default. When enabled, every frame's detections (class counts, person
+# boxes, crowd/fire/smoke flags, zone breaches and the audio frequency at the
+# time) are appended as fixed-size records to DETECTION_LOG_DIR/<camera>/, one
+# segment file per UTC hour with a sparse time and class index, by a writer
+# thread off the event loop. Query them at /api/detections/?camera=... and
+# re-score recorded incidents with `manage.py replay_detections`. Segments
+# older than DETECTION_LOG_RETENTION_HOURS are deleted (0 keeps everything).
+# The endpoint is staff-only and serves at most DETECTION_QUERY_MAX_LIMIT
+# records from the last DETECTION_QUERY_MAX_HOURS before `until` per request.
+
+DETECTION_LOG_ENABLED = env.bool('DETECTION_LOG_ENABLED', default=False)
+DETECTION_LOG_DIR = env('DETECTION_LOG_DIR', default=str(BASE_DIR / 'detections'))
+DETECTION_LOG_RETENTION_HOURS = env.int('DETECTION_LOG_RETENTION_HOURS', default=168)
+DETECTION_QUERY_MAX_LIMIT = env.int('DETECTION_QUERY_MAX_LIMIT', default=10000)
+DETECTION_QUERY_MAX_HOURS = env.int('DETECTION_QUERY_MAX_HOURS', default=24)
+
+# Logging
+# Records go through a queue to a background writer thread, so logging from the
+# event loop never blocks on stdout. Set LOG_LEVEL=DEBUG for per-frame detail.
+
+LOG_LEVEL = env('LOG_LEVEL', default='INFO')
+LOG_FORMAT = env('LOG_FORMAT', default='json')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'queue': {
+            '()': 'Channel.logs.make_queue_handler',
+            'json_output': LOG_FORMAT == 'json',
+        },
+    },
+    'root': {
+        'handlers': ['queue'],
+        'level': LOG_LEVEL,
+    },
+    'loggers': {
+        'django': {
+            'handlers': ['queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
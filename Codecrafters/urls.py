@@ -16,8 +16,14 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path,include
+from Channel.views import ingest_view, metrics_view, preview_view, profile_view, tracing_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/',include("api.urls"))
+    path('api/',include("api.urls")),
+    path('metrics',metrics_view),
+    path('preview/<str:camera_id>',preview_view),
+    path('ingest',ingest_view),
+    path('debug/profile',profile_view),
+    path('debug/tracing',tracing_view)
 ]
@@ -1,3 +1,126 @@
-from django.test import TestCase
+import asyncio
+import json
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from Channel.detlog import DetectionLog
+from .views import detections
+from .weather import RapidApiWeatherProvider, WeatherService
+
+
+class RecordingProvider:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.fetched = []
+
+    def fetch(self, location):
+        self.fetched.append(location)
+        time.sleep(self.delay)
+        return {"data": {"city": location, "fetch": len(self.fetched)}}
+
+
+class WeatherServiceTests(SimpleTestCase):
+    def test_least_recently_used_location_is_evicted(self):
+        provider = RecordingProvider()
+        service = WeatherService(provider, max_entries=2)
+
+        async def run():
+            await service.get("a")
+            await service.get("b")
+            await service.get("a")
+            await service.get("c")
+            return [await service.get(location) for location in ("a", "b")]
+
+        (_, a_status, _), (_, b_status, _) = asyncio.run(run())
+        self.assertEqual((a_status, b_status), ("HIT", "MISS"))
+        self.assertIsNone(service.peek("c"))
+        self.assertEqual(provider.fetched, ["a", "b", "c", "b"])
+
+    def test_stale_entry_is_served_while_one_refresh_runs(self):
+        provider = RecordingProvider(delay=0.05)
+        service = WeatherService(provider, ttl=0, stale_ttl=60)
+
+        async def run():
+            await service.get("a")
+            stale = [await service.get("a") for _ in range(3)]
+            await asyncio.gather(*service._inflight.values())
+            fetched = list(provider.fetched)
+            return stale, fetched, service.peek("a")
+
+        stale, fetched, refreshed = asyncio.run(run())
+        self.assertEqual([(data["data"]["fetch"], status) for data, status, _ in stale], [(1, "STALE")] * 3)
+        self.assertEqual(fetched, ["a", "a"])
+        self.assertEqual(refreshed["data"]["fetch"], 2)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        provider = RecordingProvider(delay=0.05)
+        service = WeatherService(provider)
+
+        async def run():
+            return await asyncio.gather(*(service.get("Mumbai ") for _ in range(5)), service.get("pune"))
+
+        results = asyncio.run(run())
+        self.assertEqual({status for _, status, _ in results}, {"MISS"})
+        self.assertEqual(len({id(data) for data, _, _ in results[:5]}), 1)
+        self.assertEqual(sorted(provider.fetched), ["mumbai", "pune"])
+
+    def test_location_is_one_quoted_path_segment(self):
+        requested = []
+
+        class Response:
+            status, will_close = 200, True
+
+            def read(self):
+                return json.dumps({"data": {}}).encode()
+
+        class Connection:
+            def request(self, method, path, headers):
+                requested.append(path)
+
+            def getresponse(self):
+                return Response()
+
+            def close(self):
+                pass
+
+        provider = RapidApiWeatherProvider("key")
+        provider._acquire = Connection
+        provider.fetch("new york/../admin?x=1")
+        self.assertEqual(requested, ["/api/weather/new%20york%2F..%2Fadmin%3Fx%3D1"])
+
+
+class DetectionsViewTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.t0 = (time.time() // 3600 - 1) * 3600
+        log = DetectionLog(self.directory, "cam")
+        for seq in range(50):
+            log.append(self.t0 + seq, {"detected objects": {"person": 1}, "total persons": 1}, seq=seq)
+        log.close()
+
+    def get(self, staff=True, **params):
+        request = RequestFactory().get("/api/detections/", {"camera": "cam", **params})
+        request.user = SimpleNamespace(is_active=True, is_staff=staff)
+        with override_settings(CAMERAS={"cam": {}}, DETECTION_LOG_DIR=self.directory,
+                               DETECTION_QUERY_MAX_LIMIT=20, DETECTION_QUERY_MAX_HOURS=1):
+            return detections(request)
+
+    def test_non_staff_is_redirected_to_login(self):
+        self.assertEqual(self.get(staff=False).status_code, 302)
+
+    def test_limit_is_clamped(self):
+        body = json.loads(self.get(since=self.t0, until=self.t0 + 3600, limit=500).content)
+        self.assertEqual((body["count"], body["truncated"]), (20, True))
+        self.assertEqual([record["seq"] for record in body["records"]], list(range(20)))
+        body = json.loads(self.get(since=self.t0, until=self.t0 + 3600, limit=0).content)
+        self.assertEqual(body["count"], 1)
+
+    def test_span_is_capped(self):
+        body = json.loads(self.get(since=self.t0 - 86400, until=self.t0 + 10).content)
+        self.assertEqual(body["since"], self.t0 + 10 - 3600)
+        self.assertEqual((body["count"], body["truncated"]), (10, False))
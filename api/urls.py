@@ -3,5 +3,8 @@ from .views import *
 
 urlpatterns = [
     path('',Home),
-    path('weather/',hit_weather)
+    path('weather/',hit_weather),
+    path('weather/<str:location>/',hit_weather),
+    path('rollups/',alert_rollups),
+    path('detections/',detections)
 ]
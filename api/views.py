@@ -1,24 +1,74 @@
+import time
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
 from django.http import HttpResponse
 from django.http import JsonResponse
+from Channel.detlog import DetectionLogReader
+from Channel.rollups import rollups
+from .weather import WeatherUnavailable, get_weather_service
 
 
 def Home(request):
     return HttpResponse("heloooo")
 
-def hit_weather(request):
-    import http.client
+async def hit_weather(request, location=None):
+    """Serve weather for a location from the shared cache, refreshing upstream as needed."""
+    location = location or request.GET.get("location", settings.WEATHER_DEFAULT_LOCATION)
+
+    try:
+        data, cache_status, age = await get_weather_service().get(location)
+    except WeatherUnavailable as e:
+        return JsonResponse({"error": str(e)}, status=502)
+
+    response = JsonResponse(data, safe=False)
+    response["X-Cache"] = cache_status
+    response["Age"] = str(int(age))
+    return response
 
-    conn = http.client.HTTPSConnection("the-weather-api.p.rapidapi.com")
+def alert_rollups(request):
+    """Serve pre-aggregated alert/sensor buckets at 1m, 1h or 1d resolution."""
+    resolution = request.GET.get("resolution", "1m")
+    location = request.GET.get("location")
+    try:
+        since = int(request.GET["since"]) if "since" in request.GET else None
+        limit = int(request.GET["limit"]) if "limit" in request.GET else None
+        buckets = rollups.query(resolution, location=location, since=since, limit=limit)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-    headers = {
-        'x-rapidapi-key': "42047b4750msh234436c97fc8894p1a2e84jsn3df40fb61052",
-        'x-rapidapi-host': "the-weather-api.p.rapidapi.com"
-    }
+    return JsonResponse({"resolution": resolution, "locations": buckets})
 
-    conn.request("GET", "/api/weather/mumbai", headers=headers)
+@staff_member_required
+def detections(request):
+    """
+    Serve one camera's logged detections between since and until (epoch seconds), optionally only some classes.
 
-    res = conn.getresponse()
-    data = res.read()
+    The span is cut to the last DETECTION_QUERY_MAX_HOURS before `until` and
+    the oldest `limit` records (at most DETECTION_QUERY_MAX_LIMIT) are returned.
+    """
+    camera = request.GET.get("camera") or next(iter(settings.CAMERAS))
+    if camera not in settings.CAMERAS:
+        return JsonResponse({"error": f"Unknown camera {camera}"}, status=404)
+    try:
+        until = float(request.GET["until"]) if "until" in request.GET else time.time()
+        since = float(request.GET["since"]) if "since" in request.GET else until - 3600
+        limit = int(request.GET.get("limit", 1000))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    since = max(since, until - settings.DETECTION_QUERY_MAX_HOURS * 3600)
+    limit = max(1, min(limit, settings.DETECTION_QUERY_MAX_LIMIT))
+    classes = [name for name in request.GET.get("class", "").split(",") if name]
 
-    return JsonResponse(data.decode("utf-8"),safe=False)
+    reader = DetectionLogReader(settings.DETECTION_LOG_DIR, camera)
+    # One record past the limit tells whether there are more to page through
+    records = reader.scan(since, until, classes or None, limit=limit + 1)
+    return JsonResponse({
+        "camera": camera,
+        "since": since,
+        "until": until,
+        "count": min(len(records), limit),
+        "truncated": len(records) > limit,
+        "records": [reader.to_dict(record) for record in records[:limit]],
+    })
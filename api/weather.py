@@ -0,0 +1,197 @@
+import asyncio
+import collections
+import hashlib
+import http.client
+import json
+import logging
+import queue
+import time
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+
+class WeatherUnavailable(Exception):
+    """Raised when no fresh or stale weather data can be served for a location."""
+
+
+class RapidApiWeatherProvider:
+    """
+    Blocking client for the-weather-api on RapidAPI.
+
+    Keeps a small pool of keep-alive HTTPS connections so consecutive
+    refreshes skip the TCP/TLS handshake.
+    """
+    host = "the-weather-api.p.rapidapi.com"
+
+    def __init__(self, api_key, timeout=10, pool_size=4):
+        self.headers = {
+            'x-rapidapi-key': api_key,
+            'x-rapidapi-host': self.host
+        }
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return http.client.HTTPSConnection(self.host, timeout=self.timeout)
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def fetch(self, location):
+        # Locations come from clients, keep them to one path segment
+        path = f"/api/weather/{urllib.parse.quote(location, safe='')}"
+        # A pooled connection may have been closed by the server, retry once on a fresh one
+        for attempt in range(2):
+            conn = self._acquire()
+            try:
+                conn.request("GET", path, headers=self.headers)
+                res = conn.getresponse()
+                data = res.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+
+            if res.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+
+            if res.status != 200:
+                raise WeatherUnavailable(f"Weather API returned {res.status} for {location}")
+            return json.loads(data)
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class StubWeatherProvider:
+    """Offline provider returning deterministic readings shaped like the RapidAPI payload."""
+    conditions = ["Clear", "Rainy", "Smoke", "Stormy"]
+
+    def fetch(self, location):
+        seed = int(hashlib.md5(location.encode("utf-8")).hexdigest(), 16)
+        return {
+            "data": {
+                "city": location.title(),
+                "current_weather": self.conditions[seed % len(self.conditions)],
+                "temp": str(10 + seed % 25),
+                "humidity": f"{30 + seed % 60}%",
+                "wind": f"{seed % 40} km/h",
+                "aqi": str(20 + seed % 200),
+            }
+        }
+
+    def close(self):
+        pass
+
+
+class _CacheEntry:
+    __slots__ = ("data", "fetched")
+
+    def __init__(self, data, fetched):
+        self.data = data
+        self.fetched = fetched
+
+
+class WeatherService:
+    """
+    Async, cached front for a blocking weather provider.
+
+    - Entries younger than `ttl` are served straight from memory.
+    - Entries younger than `ttl + stale_ttl` are served immediately while a
+      single background refresh runs (stale-while-revalidate).
+    - Concurrent misses for the same location share one upstream request.
+    - At most `max_entries` locations are kept, least recently used go first.
+    """
+
+    def __init__(self, provider, ttl=600, stale_ttl=3600, max_entries=1024):
+        self.provider = provider
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._cache = collections.OrderedDict()
+        self._inflight = {}
+
+    async def get(self, location):
+        """Return `(data, cache_status, age_seconds)` for a location."""
+        key = location.strip().lower()
+        entry = self._cache.get(key)
+        now = time.monotonic()
+
+        if entry is not None:
+            self._cache.move_to_end(key)
+            age = now - entry.fetched
+            if age < self.ttl:
+                return entry.data, "HIT", age
+            if age < self.ttl + self.stale_ttl:
+                self._refresh(key)
+                return entry.data, "STALE", age
+
+        try:
+            entry = await asyncio.shield(self._refresh(key))
+        except Exception as e:
+            # Upstream failed, fall back to whatever we still have
+            if key in self._cache:
+                entry = self._cache[key]
+                return entry.data, "STALE", now - entry.fetched
+            raise WeatherUnavailable(str(e)) from e
+        return entry.data, "MISS", 0.0
+
+    def _refresh(self, key):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._refresh_done(key, t))
+        return task
+
+    def _refresh_done(self, key, task):
+        self._inflight.pop(key, None)
+        # Background refreshes are never awaited, so retrieve the exception here
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Weather refresh failed for %s: %s", key, task.exception())
+
+    async def _fetch(self, key):
+        data = await asyncio.to_thread(self.provider.fetch, key)
+        entry = _CacheEntry(data, time.monotonic())
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return entry
+
+    def peek(self, location):
+        """Return cached data for a location without touching the network, or None."""
+        entry = self._cache.get(location.strip().lower())
+        return entry.data if entry is not None else None
+
+
+_service = None
+
+
+def get_weather_service():
+    """Return the process-wide weather service, built from Django settings on first use."""
+    global _service
+    if _service is None:
+        from django.conf import settings
+
+        if settings.WEATHER_PROVIDER == "stub":
+            provider = StubWeatherProvider()
+        else:
+            provider = RapidApiWeatherProvider(settings.WEATHER_API_KEY)
+        _service = WeatherService(provider, ttl=settings.WEATHER_CACHE_TTL, stale_ttl=settings.WEATHER_STALE_TTL,
+                                  max_entries=settings.WEATHER_CACHE_SIZE)
+    return _service